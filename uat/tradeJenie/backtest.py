@@ -0,0 +1,389 @@
+"""
+Offline replay of live_trading over stored candles.
+
+Backtester feeds the candles through the strategy registry's batch function
+(the same code live_trading runs) and steps the live state machine once per
+closed bar:
+
+    1. intraday configs stop for the day once flat at/after 15:15
+    2. signal flip: exit the open leg(s) (SIGNAL_GENERATED), enter the new side
+    3. intraday square-off at/after 15:15
+    4. target: premium <= TARGET_EXIT_RATIO x entry -> exit (TARGET_HIT) and
+       re-enter the same side on a fresh strike (ROLLOVER), rolling the hedge
+       per HEDGE_ROLLOVER_TYPE (SEMI on expiry change, FULL always)
+
+Option premiums come from a pluggable OptionPriceSource, so the same run works
+on recorded option candles or on a pricing model. Strikes are picked with the
+live rules (walk away from ATM until the premium stops getting closer to
+NEAREST_LTP; H-P10 / H-M100 / H-M200 hedges). Every closed trade is a dict with
+the keys live_trading passes to record_trade; completed_trades_frame() turns
+them into completed_trades rows.
+
+Differences from live, by construction: checks happen at bar closes (live
+polls the premium every few seconds inside the bar), fills are at the source's
+premium, and a leg still open at its expiry is settled at intrinsic value
+(EXPIRY) - live_trading has no expiry handling.
+"""
+import datetime
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from optionchain import OptionChainIndex, ExpiryCalendar
+from strategies import get_strategy
+from commonFunction import _parse_interval_to_minutes
+from config import TARGET_EXIT_RATIO, HEDGE_NEAREST_LTP, OPTION_LADDER_DEPTH
+
+INTRADAY_CUTOFF = datetime.time(15, 15)
+SESSION_END = datetime.time(15, 30)
+
+# completed_trades columns in record_trade's order, with the trade dict key each comes from
+COMPLETED_TRADES_COLUMNS = [
+    ("signal", "Signal"), ("spot_entry", "SpotEntry"), ("option_symbol", "OptionSymbol"), ("strike", "Strike"),
+    ("expiry", "Expiry"), ("option_sell_price", "OptionSellPrice"), ("entry_time", "EntryTime"),
+    ("spot_exit", "SpotExit"), ("option_buy_price", "OptionBuyPrice"), ("exit_time", "ExitTime"), ("pnl", "PnL"),
+    ("qty", "qty"), ("interval", "interval"), ("real_trade", "real_trade"), ("entry_reason", "EntryReason"),
+    ("exit_reason", "ExitReason"), ("expiry_type", "ExpiryType"), ("strategy", "Strategy"), ("key", "Key"),
+    ("user_id", None), ("hedge_option_symbol", "hedge_option_symbol"), ("hedge_strike", "hedge_strike"),
+    ("hedge_option_buy_price", "hedge_option_buy_price"), ("hedge_qty", "hedge_qty"),
+    ("hedge_entry_time", "hedge_entry_time"), ("hedge_exit_time", "hedge_exit_time"),
+    ("hedge_option_sell_price", "hedge_option_sell_price"), ("hedge_pnl", "hedge_pnl"), ("total_pnl", "total_pnl"),
+]
+
+
+class OptionPriceSource(ABC):
+    """
+    Option contracts and premiums as of a point in time. Implementations:
+    RecordedOptionPriceSource (recorded option candles) here, model and
+    recorded-chain sources elsewhere. A source missing any abstract method
+    fails when it is created, not in the middle of a backtest.
+    """
+
+    @abstractmethod
+    def expiry(self, expiry_type, as_of):
+        """Concrete expiry (datetime.date) a config EXPIRY type resolves to on as_of (a date)."""
+
+    @abstractmethod
+    def symbol(self, opt_type, expiry, strike):
+        """Tradingsymbol of the contract, or None if it is not listed."""
+
+    @abstractmethod
+    def quote(self, symbol, ts):
+        """Premium of `symbol` at datetime ts, or None if unknown."""
+
+    def quotes(self, symbols, ts):
+        """Premiums of several symbols at ts (the batched get_quotes_batch call of the live ladder)."""
+        return [self.quote(symbol, ts) for symbol in symbols]
+
+    @abstractmethod
+    def lot_size(self, expiry):
+        """Lot size of contracts expiring on expiry."""
+
+
+class InstrumentsPriceSource(OptionPriceSource):
+    """Contract/expiry lookups from an instruments dump (expired contracts included) via OptionChainIndex."""
+
+    def __init__(self, instruments_df):
+        self.index = OptionChainIndex(instruments_df)
+        self.calendar = ExpiryCalendar(self.index)
+
+    def expiry(self, expiry_type, as_of):
+        return self.calendar.resolve(expiry_type, as_of)
+
+    def symbol(self, opt_type, expiry, strike):
+        contract = self.index.get(opt_type, expiry, strike)
+        return contract.tradingsymbol if contract else None
+
+    def lot_size(self, expiry):
+        return self.index.lot_sizes.get(expiry)
+
+
+class RecordedOptionPriceSource(InstrumentsPriceSource):
+    """
+    Premiums from recorded option candles: {tradingsymbol: DataFrame(date, close)}.
+    A quote at ts is the close of the last candle that had closed by ts.
+    """
+
+    def __init__(self, instruments_df, candles, interval="minute"):
+        super().__init__(instruments_df)
+        step = np.int64(_parse_interval_to_minutes(interval) * 60 * 10**9)
+        self._series = {}   # tradingsymbol -> (close times as int64 ns, closes)
+        for symbol, df in candles.items():
+            if df is None or df.empty:
+                continue
+            dates = pd.to_datetime(df['date'])
+            if dates.dt.tz is not None:
+                dates = dates.dt.tz_localize(None)
+            order = np.argsort(dates.to_numpy(dtype="datetime64[ns]").astype(np.int64), kind="stable")
+            ends = dates.to_numpy(dtype="datetime64[ns]").astype(np.int64)[order] + step
+            self._series[symbol] = (ends, df['close'].to_numpy(dtype=np.float64)[order])
+
+    def quote(self, symbol, ts):
+        series = self._series.get(symbol)
+        if series is None:
+            return None
+        ends, closes = series
+        pos = int(np.searchsorted(ends, pd.Timestamp(ts).value, side="right"))
+        return float(closes[pos - 1]) if pos else None
+
+
+@lru_cache(maxsize=None)
+def _expiry_date(expiry):
+    return datetime.datetime.strptime(expiry, '%Y-%m-%d').date()
+
+
+def _intrinsic(opt_type, strike, spot):
+    return max(float(strike) - spot, 0.0) if opt_type == "PE" else max(spot - float(strike), 0.0)
+
+
+class Backtester:
+    """
+    One trade config replayed over candles. `config` is a trade_config dict
+    (STRATEGY, INTERVAL, NEAREST_LTP, INTRADAY, NEW_TRADE, EXPIRY, HEDGE_TYPE,
+    HEDGE_ROLLOVER_TYPE, LOT; QTY optional). `params` override the strategy's
+    default parameters; target_ratio and hedge_nearest_ltp default to the
+    live settings.
+    """
+
+    def __init__(self, config, source, key="BACKTEST", params=None, target_ratio=TARGET_EXIT_RATIO,
+                 hedge_nearest_ltp=HEDGE_NEAREST_LTP):
+        self.config = config
+        self.source = source
+        self.key = key
+        self.spec = get_strategy(config['STRATEGY'])
+        self.params = dict(params or {})
+        self.target_ratio = target_ratio
+        self.hedge_nearest_ltp = hedge_nearest_ltp
+        self.minutes = _parse_interval_to_minutes(config['INTERVAL'])
+        self.hedged = config.get('HEDGE_TYPE', "NH") != "NH"
+
+    # ---------- inputs ----------
+    def signals(self, candles):
+        """Strategy output arrays for the candles (reusable across runs with the same params)."""
+        return self.spec.batch_arrays({c: candles[c].to_numpy() for c in self.spec.columns}, **self.params)
+
+    def close_times(self, candles):
+        """Naive local close time of each bar (start + interval, the last bar cut at 15:30)."""
+        dates = pd.to_datetime(candles['date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        ends = dates + pd.Timedelta(minutes=self.minutes)
+        session_end = dates.dt.normalize() + pd.Timedelta(hours=15, minutes=30)
+        return np.array(ends.where(ends <= session_end, session_end).dt.to_pydatetime(), dtype=object)
+
+    # ---------- option selection (live rules) ----------
+    def _walk(self, signal, spot, expiry, target):
+        """
+        get_optimal_option: walk away from ATM while |premium - target| keeps
+        shrinking, quoting the ladder OPTION_LADDER_DEPTH strikes at a time.
+        """
+        opt_type, step = ("PE", -100) if signal == "BUY" else ("CE", 100)
+        strike = int(round(spot / 100.0) * 100)
+        best, best_diff = None, float('inf')
+        while True:
+            ladder = []
+            for _ in range(OPTION_LADDER_DEPTH):
+                strike += step
+                symbol = self.source.symbol(opt_type, expiry, strike)
+                if symbol is None:
+                    break
+                ladder.append((strike, symbol))
+            for (k, symbol), ltp in zip(ladder, self.source.quotes([s for _, s in ladder], self._now)):
+                ltp = ltp or 0.0
+                diff = abs(ltp - target)
+                if diff >= best_diff:
+                    return best
+                best, best_diff = (symbol, k, expiry.strftime('%Y-%m-%d'), ltp), diff
+            if len(ladder) < OPTION_LADDER_DEPTH:
+                return best
+
+    def _option_with_hedge(self, signal, spot):
+        """(result, hedge_result) like get_option_with_hedge; None where nothing qualifies."""
+        expiry = self.source.expiry(self.config['EXPIRY'], self._now.date())
+        result = self._walk(signal, spot, expiry, float(self.config['NEAREST_LTP']))
+        hedge_type = self.config.get('HEDGE_TYPE', "NH")
+        hedge = None
+        if hedge_type == "H-P10":
+            hedge = self._walk(signal, spot, expiry, self.hedge_nearest_ltp)
+        elif hedge_type in ("H-M100", "H-M200") and result is not None:
+            opt_type = "PE" if signal == "BUY" else "CE"
+            diff = 200 if hedge_type == "H-M200" else 100
+            hedge_strike = result[1] - diff if signal == "BUY" else result[1] + diff
+            symbol = self.source.symbol(opt_type, expiry, hedge_strike)
+            if symbol is not None:
+                hedge = (symbol, hedge_strike, expiry.strftime('%Y-%m-%d'), self.source.quote(symbol, self._now) or 0.0)
+        return result, hedge
+
+    def _price(self, symbol, strike, signal, spot):
+        quote = self.source.quote(symbol, self._now)
+        return quote if quote is not None else _intrinsic("PE" if signal == "BUY" else "CE", strike, spot)
+
+    # ---------- legs ----------
+    def _entry(self, signal, spot, result, hedge, reason):
+        opt_symbol, strike, expiry, ltp = result
+        now = self._stamp()
+        trade = {
+            "Signal": signal, "SpotEntry": spot, "OptionSymbol": opt_symbol, "Strike": strike, "Expiry": expiry,
+            "OptionSellPrice": ltp, "EntryTime": now, "qty": self.qty, "interval": self.config['INTERVAL'],
+            "real_trade": "no", "EntryReason": reason, "ExpiryType": self.config['EXPIRY'],
+            "Strategy": self.spec.name, "Key": self.key,
+        }
+        if self.hedged:
+            hedge_symbol, hedge_strike, _, hedge_ltp = hedge
+            trade.update({"hedge_option_symbol": hedge_symbol, "hedge_strike": hedge_strike,
+                          "hedge_option_buy_price": hedge_ltp, "hedge_qty": self.qty, "hedge_entry_time": now})
+        else:
+            trade.update({"hedge_option_symbol": "-", "hedge_strike": "-", "hedge_option_buy_price": 0.0,
+                          "hedge_qty": "-", "hedge_entry_time": "-"})
+        return trade
+
+    def _exit(self, trade, spot, reason, price=None, hedge_price=None):
+        """Close the trade dict like live_trading does; returns the hedge exit price (None for NH)."""
+        now = self._stamp()
+        if price is None:
+            price = self._price(trade["OptionSymbol"], trade["Strike"], trade["Signal"], spot)
+        trade.update({"SpotExit": spot, "OptionBuyPrice": price, "ExitTime": now,
+                      "PnL": trade["OptionSellPrice"] - price, "ExitReason": reason})
+        if self.hedged:
+            if hedge_price is None:
+                hedge_price = self._price(trade["hedge_option_symbol"], trade["hedge_strike"], trade["Signal"], spot)
+            hedge_pnl = hedge_price - trade["hedge_option_buy_price"]
+            trade.update({"hedge_option_sell_price": hedge_price, "hedge_exit_time": now, "hedge_pnl": hedge_pnl,
+                          "total_pnl": trade["PnL"] + hedge_pnl})
+        else:
+            trade.update({"hedge_option_sell_price": 0.0, "hedge_exit_time": "-", "hedge_pnl": 0.0,
+                          "total_pnl": trade["PnL"]})
+        self.trades.append(trade)
+        return hedge_price
+
+    def _stamp(self):
+        return self._now.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _expired(self, trade, spot):
+        expiry = _expiry_date(trade["Expiry"])
+        today = self._now.date()
+        if today < expiry or (today == expiry and self._now.time() < SESSION_END):
+            return False
+        opt_type = "PE" if trade["Signal"] == "BUY" else "CE"
+        settle = _intrinsic(opt_type, trade["Strike"], spot) if today == expiry else None
+        hedge_settle = None
+        if self.hedged and today == expiry and trade["hedge_option_symbol"] != "-":
+            hedge_settle = _intrinsic(opt_type, trade["hedge_strike"], spot)
+        self._exit(trade, spot, "EXPIRY", settle, hedge_settle)
+        return True
+
+    def _target(self, trade, spot):
+        """Target exit + rollover re-entry. Returns (trade, position, stop)."""
+        current = self.source.quote(trade["OptionSymbol"], self._now)
+        entry = trade["OptionSellPrice"]
+        if current is None or not entry or current > self.target_ratio * entry:
+            return trade, trade["Signal"], False
+        hedge = None
+        if self.hedged:
+            hedge = {k: trade[k] for k in ("hedge_option_symbol", "hedge_strike", "hedge_qty")}
+        hedge_price = self._exit(trade, spot, "TARGET_HIT", price=current)
+        last_expiry, signal = trade["Expiry"], trade["Signal"]
+        if self.config['NEW_TRADE'].lower() == "no":
+            return None, None, True
+        result, rollover_hedge = self._option_with_hedge(signal, spot)
+        if result is None:
+            return None, None, False
+        if self.hedged:
+            # The hedge stays on, marked at the exit price, unless the rollover type replaces it
+            roll = self.config.get('HEDGE_ROLLOVER_TYPE')
+            if roll == 'FULL' or (roll == 'SEMI' and result[2] != last_expiry):
+                if rollover_hedge is None:
+                    return None, None, False
+                hedge = {"hedge_option_symbol": rollover_hedge[0], "hedge_strike": rollover_hedge[1],
+                         "hedge_qty": self.qty}
+                hedge_price = rollover_hedge[3]
+            hedge_carried = (hedge["hedge_option_symbol"], hedge["hedge_strike"], None, hedge_price)
+        else:
+            hedge_carried = None
+        return self._entry(signal, spot, result, hedge_carried, "ROLLOVER"), signal, False
+
+    # ---------- replay ----------
+    def run(self, candles, signals=None, qty=None, times=None, close_at_end=False):
+        """
+        Replay `candles` (date/open/high/low/close, oldest first). `signals` are
+        precomputed strategy arrays (see signals()) and `times` precomputed
+        close_times(), to skip those passes when replaying the same candles often.
+        close_at_end closes a trade still open after the last bar (END_OF_DATA).
+        Returns the list of closed trade dicts (PnL per unit, like live).
+        """
+        if signals is None:
+            signals = self.signals(candles)
+        if times is None:
+            times = self.close_times(candles)
+        buy = np.asarray(signals['buySignal'], dtype=bool)
+        sell = np.asarray(signals['sellSignal'], dtype=bool)
+        close = candles['close'].to_numpy(dtype=np.float64)
+        intraday = str(self.config.get('INTRADAY', "no")).lower() == "yes"
+
+        self.trades = []
+        self.qty = qty or self.config.get('QTY')
+        trade, position, stopped_day = None, None, None
+        for i in range(len(close)):
+            self._now = now = times[i]
+            day = now.date()
+            if day == stopped_day:
+                continue
+            spot = close[i]
+            if self.qty is None:
+                self.qty = (self.source.lot_size(self.source.expiry(self.config['EXPIRY'], day)) or 1) \
+                    * int(self.config.get('LOT', 1))
+            if trade is not None and self._expired(trade, spot):
+                trade, position = None, None
+            if intraday and trade is None and now.time() >= INTRADAY_CUTOFF:
+                stopped_day = day
+                continue
+
+            signal = "BUY" if buy[i] else "SELL" if sell[i] else None
+            if signal and position != signal:
+                if trade is not None:
+                    self._exit(trade, spot, "SIGNAL_GENERATED")
+                    trade, position = None, None
+                if self.config['NEW_TRADE'].lower() == "no":
+                    break
+                result, hedge = self._option_with_hedge(signal, spot)
+                if result is not None and (not self.hedged or hedge is not None):
+                    trade, position = self._entry(signal, spot, result, hedge, "SIGNAL_GENERATED"), signal
+
+            if trade is not None and intraday and now.time() >= INTRADAY_CUTOFF:
+                self._exit(trade, spot, "SIGNAL_GENERATED")
+                trade, position, stopped_day = None, None, day
+                continue
+            if trade is not None:
+                trade, position, stop = self._target(trade, spot)
+                if stop:
+                    break
+        if trade is not None and close_at_end:
+            self._exit(trade, spot, "END_OF_DATA")
+            trade = None
+        self.open_trade = trade
+        return self.trades
+
+
+def completed_trades_frame(trades, user_id=0):
+    """Trade dicts as completed_trades rows (column names and order of record_trade's INSERT)."""
+    return pd.DataFrame([[user_id if key is None else trade.get(key) for _, key in COMPLETED_TRADES_COLUMNS]
+                         for trade in trades], columns=[col for col, _ in COMPLETED_TRADES_COLUMNS])
+
+
+def trade_metrics(trades):
+    """PnL (total_pnl x qty), max drawdown of the cumulative PnL, trade count and win rate."""
+    pnl = np.array([t["total_pnl"] * t["qty"] for t in trades], dtype=np.float64)
+    equity = np.cumsum(pnl)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:]
+    return {
+        "pnl": float(equity[-1]) if len(pnl) else 0.0,
+        "max_drawdown": float((peak - equity).max()) if len(pnl) else 0.0,
+        "trades": len(pnl),
+        "win_rate": float((pnl > 0).mean()) if len(pnl) else 0.0,
+        "target_hits": sum(t["ExitReason"] == "TARGET_HIT" for t in trades),
+    }
+
+
+def run_backtest(config, candles, source, key="BACKTEST", **kwargs):
+    """Completed_trades rows for one config replayed over `candles`."""
+    return completed_trades_frame(Backtester(config, source, key=key, **kwargs).run(candles))
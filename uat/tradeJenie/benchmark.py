@@ -0,0 +1,84 @@
+"""
+Micro-benchmark for the vectorized signal functions.
+Each case times the current implementation and its *_old loop version on the
+same synthetic candles. The incremental indicator engine is timed replaying
+the same candles and taking one new candle, against a batch recompute.
+Equivalence checks live in tests/test_signals.py and tests/test_indicatorengine.py.
+
+Usage: python benchmark.py [rows ...]      (default: 1000 100000 1000000)
+"""
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from commonFunction import generate_god_signals, generate_god_signals_old, convertIntoHeikinashi, convertIntoHeikinashi_old
+from indicatorengine import IndicatorEngine
+from strategies import STRATEGIES
+
+
+def synthetic_candles(rows, seed=7):
+    """Random-walk NIFTY-like 5 minute candles."""
+    rng = np.random.default_rng(seed)
+    close = 25000 + np.cumsum(rng.normal(0, 12, rows)).round(2)
+    open_ = close.copy()
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0, 8, rows))
+    return pd.DataFrame({
+        "date": pd.date_range("2020-01-01 09:15", periods=rows, freq="5min"),
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": 0,
+    })
+
+
+def timed(fn, df):
+    started = time.perf_counter()
+    out = fn(df.copy())
+    return out, time.perf_counter() - started
+
+
+def bench(name, new_fn, old_fn, rows):
+    df = synthetic_candles(rows)
+    _, t_new = timed(new_fn, df)
+    _, t_old = timed(old_fn, df)
+    print(f"{name:<24} {rows:>9} rows | old {t_old * 1000:>10.1f} ms | new {t_new * 1000:>8.1f} ms | x{t_old / max(t_new, 1e-9):>7.1f}")
+
+
+CASES = [
+    ("generate_god_signals", generate_god_signals, generate_god_signals_old),
+    ("convertIntoHeikinashi", convertIntoHeikinashi, convertIntoHeikinashi_old),
+]
+
+
+def bench_incremental(spec, rows, state_dir):
+    """Incremental engine vs the strategy's batch function, as live_trading calls them."""
+    strategy, batch_fn = spec.name, spec.batch
+    df2 = synthetic_candles(rows + 1)
+    df = df2.iloc[:-1]
+    engine = IndicatorEngine(strategy, rows, "bench", spec.incremental, state_dir=state_dir, history=rows)
+    started = time.perf_counter()
+    engine.sync(df)
+    t_replay = time.perf_counter() - started
+    # Next candle on a live-sized engine: one commit + one peek against a full batch recompute
+    _, t_batch2 = timed(batch_fn, df2)
+    live = IndicatorEngine(strategy, -rows, "bench", spec.incremental, state_dir=state_dir)
+    live.sync(df)
+    started = time.perf_counter()
+    live.sync(df2)
+    t_step = time.perf_counter() - started
+    print(f"incremental {strategy:<12} {rows:>9} rows | replay {t_replay * 1000:>9.1f} ms | "
+          f"next bar {t_step * 1000:>6.2f} ms vs batch {t_batch2 * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 100000, 1000000]
+    for rows in sizes:
+        for name, new_fn, old_fn in CASES:
+            bench(name, new_fn, old_fn, rows)
+    with tempfile.TemporaryDirectory() as state_dir:
+        for rows in sizes[:2]:
+            for spec in STRATEGIES.values():
+                bench_incremental(spec, rows, state_dir)
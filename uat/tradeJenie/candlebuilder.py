@@ -0,0 +1,190 @@
+import time
+import datetime
+import threading
+import logging
+import pandas as pd
+from kitefunction import candle_store
+from tickerstream import get_ticker_stream
+from commonFunction import _parse_interval_to_minutes
+from config import LOG_FILE, SYMBOL, CANDLE_RECONCILE_BARS, CANDLE_CLOSE_WAIT
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+def bucket_bounds(ts, minutes):
+    """(start, end) of the bar containing ts, aligned to the 09:15 session anchor and clamped to 15:30."""
+    anchor = ts.replace(hour=9, minute=15, second=0, microsecond=0)
+    session_end = ts.replace(hour=15, minute=30, second=0, microsecond=0)
+    if ts < anchor or ts >= session_end:
+        return None
+    start = anchor + datetime.timedelta(minutes=int((ts - anchor).total_seconds() // 60 // minutes) * minutes)
+    return start, min(start + datetime.timedelta(minutes=minutes), session_end)
+
+
+class CandleBuilder:
+    """
+    Builds OHLC bars for one instrument/interval from ticker ticks.
+    Bars are aligned like get_next_candle_time (09:15 anchor, last bar cut at
+    15:30). A timer closes each bar the moment its bucket ends - even if no
+    tick arrives after it - appends it to the shared candle store and wakes
+    everyone waiting in wait_closed(). REST history is only pulled every
+    CANDLE_RECONCILE_BARS bars (and on the first call, which also replaces the
+    partial bar the builder started mid-bucket) to reconcile the local bars
+    with the exchange's: every bar built since the last reconcile is re-fetched.
+    """
+
+    def __init__(self, instrument_token, interval, store=candle_store, reconcile_every=CANDLE_RECONCILE_BARS):
+        self.instrument_token = instrument_token
+        self.interval = interval
+        self.minutes = _parse_interval_to_minutes(interval)
+        self.store = store
+        self.reconcile_every = reconcile_every
+        self.stream = None
+        self._cond = threading.Condition()
+        self._bar = None            # forming bar dict
+        self._bucket = None         # (start, end) of the forming bar
+        self._timer = None
+        self._closed_until = None   # end of the last closed bucket
+        self._bars_since_reconcile = None   # None = never reconciled
+        self._listeners = []
+        self._last_tick = None      # monotonic time of the last tick
+        self._last_volume = None    # cumulative volume_traded of the previous tick
+        self.stats = {"ticks": 0, "bars": 0, "reconciles": 0}
+
+    # ---------- ticks ----------
+    def on_tick(self, tick, now=None):
+        price = tick.get("last_price")
+        if price is None:
+            return
+        now = now or datetime.datetime.now()
+        bounds = bucket_bounds(now, self.minutes)
+        if bounds is None:
+            return
+        closed = None
+        with self._cond:
+            self.stats["ticks"] += 1
+            self._last_tick = time.monotonic()
+            if self._bucket != bounds:
+                if self._bucket is not None:
+                    closed = self._close(self._bucket)
+                self._bucket = bounds
+                self._bar = {"date": bounds[0], "open": price, "high": price, "low": price, "close": price, "volume": 0}
+                self._schedule(bounds, now)
+            else:
+                bar = self._bar
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["close"] = price
+            # volume_traded is the day's cumulative volume: the bar gets the increments
+            volume = tick.get("volume_traded")
+            if volume is not None:
+                if self._last_volume is not None:
+                    self._bar["volume"] += volume - self._last_volume if volume >= self._last_volume else volume
+                self._last_volume = volume
+        if closed:
+            self._notify(closed)
+
+    def _schedule(self, bounds, now):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(0.0, (bounds[1] - now).total_seconds()), self._close_due, [bounds])
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _close_due(self, bounds):
+        closed = None
+        with self._cond:
+            if self._bucket == bounds:
+                closed = self._close(bounds)
+        if closed:
+            self._notify(closed)
+
+    def _close(self, bounds):
+        """Caller holds self._cond; returns the closed bar for _notify()."""
+        bar = self._bar
+        self._bar, self._bucket = None, None
+        self.store.append_bar(self.instrument_token, self.interval, dict(bar))
+        self._closed_until = bounds[1]
+        if self._bars_since_reconcile is not None:
+            self._bars_since_reconcile += 1
+        self.stats["bars"] += 1
+        self._cond.notify_all()
+        logging.info(f"ℹ️ {self.interval} bar closed {bar['date']:%H:%M} O {bar['open']} H {bar['high']} L {bar['low']} C {bar['close']}")
+        return bar
+
+    def _notify(self, bar):
+        for callback in list(self._listeners):
+            try:
+                callback(bar)
+            except Exception as e:
+                logging.error(f"Bar listener error: {e}")
+
+    def on_bar_closed(self, callback):
+        self._listeners.append(callback)
+
+    # ---------- consumers ----------
+    def is_live(self, max_silence=60):
+        """Ticks are flowing: stream connected and a tick seen in the last max_silence seconds."""
+        return (self.stream is not None and self.stream.is_connected() and self._last_tick is not None
+                and time.monotonic() - self._last_tick < max_silence)
+
+    def next_close(self):
+        """End of the bar forming now (None outside the session)."""
+        bounds = bucket_bounds(datetime.datetime.now(), self.minutes)
+        return bounds[1] if bounds else None
+
+    def wait_closed(self, timeout=CANDLE_CLOSE_WAIT):
+        """Block until the bar that ended most recently has been closed. Returns False on timeout."""
+        now = datetime.datetime.now()
+        bounds = bucket_bounds(now, self.minutes)
+        if bounds is None:
+            return True
+        last_end = bounds[0]
+        if last_end <= now.replace(hour=9, minute=15, second=0, microsecond=0):
+            return True   # first bar of the session, nothing closed yet
+        with self._cond:
+            return self._cond.wait_for(lambda: self._closed_until is not None and self._closed_until >= last_end, timeout)
+
+    def history(self, days, user):
+        """
+        Candles for the last `days` days in the same shape as get_historical_df:
+        closed bars plus the forming one as the last row. Served from the local
+        bars; reconciled against REST history every reconcile_every bars.
+        """
+        closed = self.wait_closed()
+        if not closed or self._bars_since_reconcile is None or self._bars_since_reconcile >= self.reconcile_every:
+            df = self.store.get(self.instrument_token, self.interval, days, user)
+            self._bars_since_reconcile = 0
+            self.stats["reconciles"] += 1
+            return df
+        df = self.store.cached(self.instrument_token, self.interval, days)
+        with self._cond:
+            bar = dict(self._bar) if self._bar else None
+        if bar and not df.empty:
+            bar = pd.DataFrame([bar])
+            tz = pd.to_datetime(df['date']).dt.tz
+            if tz is not None:
+                bar['date'] = pd.to_datetime(bar['date']).dt.tz_localize(tz)
+            if bar['date'].iloc[0] > df['date'].iloc[-1]:
+                df = pd.concat([df, bar], ignore_index=True)
+        return df
+
+
+_builders = {}
+_builders_lock = threading.Lock()
+
+
+def get_candle_builder(instrument_token, interval, user):
+    """Shared CandleBuilder for (instrument_token, interval), fed by the user's ticker stream."""
+    with _builders_lock:
+        builder = _builders.get((instrument_token, interval))
+        if builder is None:
+            builder = CandleBuilder(instrument_token, interval)
+            builder.stream = get_ticker_stream(user)
+            builder.stream.watch_token(instrument_token, f"NSE:{SYMBOL}", builder.on_tick)
+            _builders[(instrument_token, interval)] = builder
+    return builder
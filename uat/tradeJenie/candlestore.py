@@ -0,0 +1,196 @@
+import os
+import time
+import pickle
+import datetime
+import threading
+import logging
+import pandas as pd
+from config import LOG_FILE, CANDLE_CACHE_DIR, CANDLE_REFRESH_MIN_SEC, CANDLE_STORE_MAX_DAYS
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class CandleStore:
+    """
+    Local candle cache per (instrument_token, interval), shared by every
+    user/config thread. The first request backfills the history (chunked to the
+    Kite per-request limits); later requests only download candles from the
+    last stored timestamp onwards, replacing the overlapping (still forming)
+    candle. Bars appended locally (CandleBuilder) are provisional: the next
+    download starts at the oldest of them and REST wins over its whole span.
+    Concurrent requests for the same key wait on one download, and a
+    key refreshed less than CANDLE_REFRESH_MIN_SEC ago is served from memory.
+    Each key is persisted as a pickle under CANDLE_CACHE_DIR so restarts are warm.
+    """
+    # Max days per historical_data request, per Kite interval
+    MAX_DAYS_PER_REQUEST = {
+        "minute": 60, "3minute": 100, "5minute": 100, "10minute": 100,
+        "15minute": 200, "30minute": 200, "60minute": 400, "day": 2000,
+    }
+
+    def __init__(self, fetch, cache_dir=CANDLE_CACHE_DIR, min_refresh=CANDLE_REFRESH_MIN_SEC,
+                 max_days=CANDLE_STORE_MAX_DAYS):
+        self.fetch = fetch   # callable(instrument_token, from_dt, to_dt, interval, user) -> list of candle dicts
+        self.cache_dir = cache_dir
+        self.min_refresh = min_refresh
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._entries = {}   # (instrument_token, interval) -> {"df", "covered_from", "fetched_at", "local", "lock"}
+        self.stats = {"hits": 0, "backfills": 0, "incremental": 0, "requests": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key[0]}_{key[1]}.pkl")
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # local: naive dates of bars appended locally and not yet replaced by REST
+                entry = {"df": None, "covered_from": None, "fetched_at": None, "local": set(), "lock": threading.Lock()}
+                self._entries[key] = entry
+            return entry
+
+    def _load(self, key, entry):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+            entry["df"], entry["covered_from"] = saved["candles"], saved["covered_from"]
+            entry["local"] = set(saved.get("local", ()))
+            logging.info(f"ℹ️ Candle store loaded {len(entry['df'])} candles for {key} from {path}")
+        except Exception as e:
+            logging.error(f"Candle store could not read {path}: {e}")
+
+    def _save(self, key, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump({"candles": entry["df"], "covered_from": entry["covered_from"], "local": entry["local"]}, f)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            logging.error(f"Candle store could not persist {key}: {e}")
+
+    def _download(self, instrument_token, interval, start, end, user):
+        span = datetime.timedelta(days=self.MAX_DAYS_PER_REQUEST.get(interval, 60))
+        frames = []
+        while start <= end:
+            chunk_end = min(start + span, end)
+            data = self.fetch(instrument_token, start, chunk_end, interval, user)
+            self.stats["requests"] += 1
+            if data:
+                frames.append(pd.DataFrame(data))
+            start = chunk_end + datetime.timedelta(seconds=1)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _merge(old, new):
+        """new replaces old over new's date span; old rows outside it are kept."""
+        if old is None or old.empty:
+            return new.reset_index(drop=True)
+        if new.empty:
+            return old
+        keep = (old['date'] < new['date'].iloc[0]) | (old['date'] > new['date'].iloc[-1])
+        df = pd.concat([old[keep], new], ignore_index=True)
+        return df.drop_duplicates(subset='date', keep='last').sort_values('date').reset_index(drop=True)
+
+    def _reconciled(self, entry, new):
+        """Local bars covered by a REST download are now REST bars."""
+        if not new.empty:
+            last = self._naive(new['date'].iloc[-1])
+            entry["local"] = {d for d in entry["local"] if d > last}
+
+    @staticmethod
+    def _since(df, start):
+        """Rows with date >= start (naive local datetime, compared in the candles' timezone)."""
+        if df is None or df.empty:
+            return pd.DataFrame() if df is None else df.copy()
+        dates = pd.to_datetime(df['date'])
+        start = pd.Timestamp(start)
+        if dates.dt.tz is not None:
+            start = start.tz_localize(dates.dt.tz)
+        return df[dates >= start].reset_index(drop=True)
+
+    @staticmethod
+    def _naive(ts):
+        ts = pd.Timestamp(ts)
+        return (ts.tz_localize(None) if ts.tzinfo else ts).to_pydatetime()
+
+    def get(self, instrument_token, interval, days, user):
+        """Candles for the last `days` days (same window as a direct historical_data call)."""
+        key = (instrument_token, interval)
+        entry = self._entry(key)
+        now = datetime.datetime.now()
+        start = datetime.datetime.combine((now - datetime.timedelta(days=days)).date(), datetime.time())
+
+        with entry["lock"]:
+            if entry["df"] is None:
+                self._load(key, entry)
+            df = entry["df"]
+
+            if (entry["fetched_at"] is not None and time.monotonic() - entry["fetched_at"] < self.min_refresh
+                    and entry["covered_from"] <= start):
+                self.stats["hits"] += 1
+                return self._since(df, start)
+
+            if df is None or df.empty or entry["covered_from"] is None or entry["covered_from"] > start:
+                new = self._download(instrument_token, interval, start, now, user)
+                self.stats["backfills"] += 1
+                # The download covers start..now, so it replaces whatever was stored
+                df = new if not new.empty or df is None else df
+                self._reconciled(entry, new)
+                entry["covered_from"] = start
+                logging.info(f"ℹ️ Candle store backfilled {len(new)} candles for {key} since {start}")
+            else:
+                # Re-fetch from the last stored candle (it may still have been forming),
+                # or from the oldest locally built bar so REST corrects every one of them
+                since = min([self._naive(df['date'].iloc[-1])] + list(entry["local"]))
+                new = self._download(instrument_token, interval, since, now, user)
+                self.stats["incremental"] += 1
+                df = self._merge(df, new)
+                self._reconciled(entry, new)
+
+            trim = now - datetime.timedelta(days=max(self.max_days, days))
+            df = self._since(df, trim)
+            entry["df"] = df
+            entry["covered_from"] = max(entry["covered_from"], trim)
+            entry["fetched_at"] = time.monotonic()
+            self._save(key, entry)
+            return self._since(df, start)
+
+    def cached(self, instrument_token, interval, days):
+        """Candles for the last `days` days from memory only (no download)."""
+        entry = self._entry((instrument_token, interval))
+        start = datetime.datetime.combine((datetime.datetime.now() - datetime.timedelta(days=days)).date(), datetime.time())
+        with entry["lock"]:
+            return self._since(entry["df"], start)
+
+    def append_bar(self, instrument_token, interval, bar):
+        """Insert or replace one candle (dict with date/open/high/low/close/volume) built locally."""
+        key = (instrument_token, interval)
+        entry = self._entry(key)
+        with entry["lock"]:
+            if entry["df"] is None:
+                self._load(key, entry)
+            bar = pd.DataFrame([bar])
+            df = entry["df"]
+            if df is not None and not df.empty:
+                tz = pd.to_datetime(df['date']).dt.tz
+                if tz is not None:
+                    bar['date'] = pd.to_datetime(bar['date']).dt.tz_localize(tz)
+            entry["df"] = self._merge(df, bar)
+            entry["local"].add(self._naive(bar['date'].iloc[0]))
+
+    def invalidate(self, instrument_token=None, interval=None):
+        with self._lock:
+            for key, entry in self._entries.items():
+                if instrument_token in (None, key[0]) and interval in (None, key[1]):
+                    entry["fetched_at"] = None
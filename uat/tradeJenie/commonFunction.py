@@ -5,9 +5,13 @@ import numpy as np
 import pandas as pd
 import sqlite3
 import logging
-from kitefunction import  place_option_hybrid_order, get_avgprice_from_positions, get_token_for_symbol, get_quotes, get_profile
-from telegrambot import send_telegram_message
-from config import  DB_FILE, HEDGE_STRIKE_DIFF,SYMBOL,SEGMENT, CANDLE_DAYS as DAYS, REQUIRED_CANDLES, LOG_FILE,INSTRUMENTS_FILE, OPTION_SYMBOL, SERVER
+from kitefunction import  place_option_hybrid_order, place_multi_leg_order, get_avgprice_from_positions, get_token_for_symbol, get_quotes, get_quotes_batch, get_profile
+from telegrambot import send_telegram_message, send_telegram_message_async
+from optionchain import get_option_chain_index, resolve_expiry
+from dbmanager import db, SCHEMA_MIGRATIONS
+from tradejournal import TradeJournal
+from configstore import ConfigStore
+from config import  DB_FILE, HEDGE_STRIKE_DIFF, HEDGE_NEAREST_LTP, OPTION_LADDER_DEPTH,SYMBOL,SEGMENT, CANDLE_DAYS as DAYS, REQUIRED_CANDLES, LOG_FILE,INSTRUMENTS_FILE, OPTION_SYMBOL, SERVER, USE_TRADE_JOURNAL, JOURNAL_FLUSH_TIMEOUT
 import os
 
 # pd.set_option('future.no_silent_downcasting', True)
@@ -40,121 +44,12 @@ def log_instruments_file_mod_time(filename):
 
 def init_db():
     try:
-        # Connect to SQLite database (will create file if it doesn't exist)
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-
-        # Create completed_trades table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS completed_trades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                signal TEXT,
-                spot_entry REAL,
-                option_symbol TEXT,
-                strike INTEGER,
-                expiry TEXT,
-                option_sell_price REAL,
-                entry_time TEXT,
-                spot_exit REAL,
-                option_buy_price REAL,
-                exit_time TEXT,
-                pnl REAL,
-                qty INTEGER,
-                interval TEXT,
-                real_trade TEXT,
-                entry_reason TEXT,
-                exit_reason TEXT,
-                expiry_type TEXT,
-                strategy TEXT,
-                key TEXT,
-                user_id INTEGER,
-                hedge_option_symbol TEXT,
-                hedge_strike INTEGER,
-                hedge_option_buy_price REAL,
-                hedge_qty INTEGER,
-                hedge_entry_time TEXT,
-                hedge_exit_time TEXT,
-                hedge_option_sell_price REAL,
-                hedge_pnl REAL,
-                total_pnl REAL
-                
-            )
-        """)
-
-        # Create open_trades table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS open_trades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                signal TEXT,
-                spot_entry REAL,
-                option_symbol TEXT,
-                strike INTEGER,
-                expiry TEXT,
-                option_sell_price REAL,
-                entry_time TEXT,
-                qty INTEGER,
-                interval TEXT,
-                real_trade TEXT,
-                entry_reason TEXT,
-                expiry_type TEXT,
-                strategy TEXT,
-                key TEXT,
-                user_id INTEGER,
-                hedge_option_symbol TEXT,
-                hedge_strike INTEGER,
-                hedge_option_buy_price REAL,
-                hedge_qty INTEGER,
-                hedge_entry_time TEXT
-            )
-        """)
-
-        # Create user_dtls table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS user_dtls (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user TEXT,
-                kite_username TEXT,
-                kite_password TEXT,
-                kite_api_secret TEXT,
-                kite_api_key TEXT,
-                kite_totp_token TEXT,
-                telegram_chat_id TEXT,
-                telegram_token TEXT,
-                active_flag INTEGER,
-                crt_dt TEXT
-            )
-        """)
-
-        # Create trade_config table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS trade_config (
-                ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                USER_ID INTEGER,
-                KEY TEXT UNIQUE,
-                INTERVAL TEXT,
-                LOT TEXT,
-                NEAREST_LTP INTEGER,
-                INTRADAY TEXT,
-                NEW_TRADE TEXT,
-                REAL_TRADE TEXT,
-                EXPIRY TEXT,
-                STRATEGY TEXT,
-                CRT_DT TEXT,
-                LST_UPDT_DT TEXT,
-                HEDGE_TYPE TEXT,
-                HEDGE_ROLLOVER_TYPE TEXT,
-                FOREIGN KEY(USER_ID) REFERENCES user_dtls(id)
-            )
-        """)
-
-        # Commit changes and close connection
-        conn.commit()
-        print(f"Database initialized successfully at {os.path.abspath(DB_FILE)}")
+        version = db.migrate(SCHEMA_MIGRATIONS)
+        if USE_TRADE_JOURNAL:
+            trade_journal.start()   # replays events a crash left unapplied
+        print(f"Database initialized successfully at {os.path.abspath(db.path)} (schema v{version})")
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 def save_trade_config(new_config):
     """
@@ -162,15 +57,11 @@ def save_trade_config(new_config):
     Prevents duplicate KEY for the same USER_ID.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-
         # Check for duplicate (USER_ID + KEY)
-        c.execute("""
+        exists = db.fetchone("save_trade_config.exists", """
             SELECT COUNT(*) FROM trade_config 
             WHERE USER_ID = ? AND KEY = ?
-        """, (new_config.get("USER_ID"), new_config.get("KEY")))
-        exists = c.fetchone()[0]
+        """, (new_config.get("USER_ID"), new_config.get("KEY")))[0]
 
         if exists > 0:
             logging.warning(
@@ -178,7 +69,6 @@ def save_trade_config(new_config):
                 f"and KEY={new_config.get('KEY')} (skipping insert)."
             )
             print("❌ Duplicate entry. Config already exists.")
-            conn.close()
             return False
 
         # Insert new record
@@ -204,9 +94,7 @@ def save_trade_config(new_config):
             new_config.get("HEDGE_TYPE"),
             new_config.get("HEDGE_ROLLOVER_TYPE")
         )
-        c.execute(sql, params)
-        conn.commit()
-        conn.close()
+        db.execute("save_trade_config", sql, params)
         logging.info(f"✅ Trade config saved for key: {new_config.get('KEY')}")
         return True
 
@@ -215,54 +103,73 @@ def save_trade_config(new_config):
         logging.error(f"❌ Error saving trade config: {e}")
 
 
+config_store = ConfigStore(db)
+
+
 def get_trade_configs(user_id):
+    """
+    Read-only {KEY: config} for the user from the shared config store; the
+    table is only re-read after a trade_config edit. Copy a config before
+    changing it.
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)  # change to your DB
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT USER_ID, KEY, STRATEGY, INTERVAL, LOT, NEAREST_LTP, INTRADAY, NEW_TRADE,
-                REAL_TRADE, EXPIRY, HEDGE_TYPE, HEDGE_ROLLOVER_TYPE
-            FROM trade_config 
-            WHERE USER_ID = ?
-			GROUP by USER_ID, KEY, STRATEGY, INTERVAL, LOT, NEAREST_LTP, INTRADAY, NEW_TRADE,
-                REAL_TRADE, EXPIRY, HEDGE_TYPE, HEDGE_ROLLOVER_TYPE
-        """, (user_id,))
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        configs = {}
-        for row in rows:
-            (
-                USER_ID, KEY, STRATEGY, INTERVAL, LOT, NEAREST_LTP, INTRADAY, NEW_TRADE,
-                REAL_TRADE, EXPIRY, HEDGE_TYPE, HEDGE_ROLLOVER_TYPE
-            ) = row
-
-            config_dict = {
-                "INTERVAL": INTERVAL,
-                "LOT": LOT,
-                "NEAREST_LTP": NEAREST_LTP,
-                "INTRADAY": INTRADAY,
-                "NEW_TRADE": NEW_TRADE,
-                "REAL_TRADE": REAL_TRADE,
-                "EXPIRY": EXPIRY,
-                "HEDGE_TYPE": HEDGE_TYPE,
-                "HEDGE_ROLLOVER_TYPE": HEDGE_ROLLOVER_TYPE,
-                "STRATEGY": STRATEGY,
-                "KEY": KEY
-            }
-            configs[KEY] = config_dict
-        return configs
-    
-
+        return config_store.get(user_id)
     except Exception as e:
         print(f"❌ Error fetching trade configs: {e}")
         logging.error(f"❌ Error fetching trade configs: {e}")
-        return []
+        return {}
 
 
 
 def generate_god_signals(df, len1=8, len2=20):
+    """
+    Vectorized GOD EMA signals (same output as generate_god_signals_old).
+    trend is the forward-filled sign of the last EMA cross; buy/sell fire on the
+    first twoAbove/twoBelow candle of each trend leg.
+    """
+    close = df['close']
+    df['ema1'] = close.ewm(span=len1, adjust=False).mean()
+    df['ema2'] = close.ewm(span=len2, adjust=False).mean()
+    ema1 = df['ema1'].to_numpy()
+    ema2 = df['ema2'].to_numpy()
+    prev1 = df['ema1'].shift(1).to_numpy()
+    prev2 = df['ema2'].shift(1).to_numpy()
+    crossover = (ema1 > ema2) & (prev1 <= prev2)
+    crossunder = (ema1 < ema2) & (prev1 >= prev2)
+    df['crossover'] = crossover
+    df['crossunder'] = crossunder
+
+    # Index of the last cross event at or before each row -> its direction
+    n = len(df)
+    events = np.where(crossover, 1, np.where(crossunder, -1, 0))
+    last_event = np.maximum.accumulate(np.where(events != 0, np.arange(n), -1)) if n else np.zeros(0, dtype=int)
+    trend = np.where(last_event >= 0, events[np.maximum(last_event, 0)], 0)
+    df['trend'] = trend
+
+    c = close.to_numpy()
+    prev_c = close.shift(1).to_numpy()
+    two_above = (c > ema1) & (c > ema2) & (prev_c > prev1) & (prev_c > prev2)
+    two_below = (c < ema1) & (c < ema2) & (prev_c < prev1) & (prev_c < prev2)
+    df['twoAbove'] = two_above
+    df['twoBelow'] = two_below
+
+    # A trend leg starts wherever trend changes; keep the first candidate per leg
+    leg_start = np.empty(n, dtype=bool)
+    if n:
+        leg_start[0] = True
+        leg_start[1:] = trend[1:] != trend[:-1]
+    leg = np.cumsum(leg_start) - 1
+
+    def first_per_leg(candidate):
+        counts = np.cumsum(candidate)
+        before_leg = np.concatenate(([0], counts))[np.flatnonzero(leg_start)]
+        return candidate & (counts - before_leg[leg] == 1)
+
+    df['buySignal'] = first_per_leg((trend == 1) & two_above)
+    df['sellSignal'] = first_per_leg((trend == -1) & two_below)
+    return df
+
+def generate_god_signals_old(df, len1=8, len2=20):
     df['ema1'] = df['close'].ewm(span=len1, adjust=False).mean()
     df['ema2'] = df['close'].ewm(span=len2, adjust=False).mean()
     df['crossover'] = (df['ema1'] > df['ema2']) & (df['ema1'].shift(1) <= df['ema2'].shift(1))
@@ -330,53 +237,19 @@ def get_lot_size(config, instruments_df):
     Filters by OPTION_SYMBOL, SEGMENT, and expiry type.
     """
     try:
-        df = instruments_df.copy()
-        today = pd.Timestamp.today().normalize()
+        index = get_option_chain_index(instruments_df)
         
-        if config['EXPIRY'] == "NEXT_WEEK":
-            days = 7
-        elif config['EXPIRY'] == "NEXT_TO_NEXT_WEEK":
-            days = 14
-        else:
-            days = 0
-        
-        df_filtered = df[
-            (df['name'] == OPTION_SYMBOL) &
-            (df['segment'] == SEGMENT)
-        ].copy()
-        
-        if df_filtered.empty:
+        if not index.all_expiries:
             logging.warning(f"⚠️ No instruments found for {OPTION_SYMBOL}")
             return None
         
-        df_filtered['expiry'] = pd.to_datetime(df_filtered['expiry'])
-        
-        if config['EXPIRY'] == "LAST":
-            if today.day <= 15:
-                month_ref = today
-            else:
-                month_ref = (today + pd.DateOffset(months=1)).replace(day=1)
-            next_month = month_ref.replace(day=28) + timedelta(days=4)
-            last_day_of_month = next_month - timedelta(days=next_month.day)
-            last_tuesday = last_day_of_month - timedelta(days=(last_day_of_month.weekday() - 1) % 7)
-            target_expiry = last_tuesday
-        else:
-            days_until_tuesday = (1 - today.weekday() + 7) % 7
-            this_week_tuesday = today + timedelta(days=days_until_tuesday)
-            target_expiry = this_week_tuesday + timedelta(days=days)
-        
-        week_start = target_expiry - timedelta(days=target_expiry.weekday())
-        week_end = week_start + timedelta(days=6)
+        target_expiry = resolve_expiry(config['EXPIRY'], instruments_df)
         
-        target_options = df_filtered[
-            (df_filtered['expiry'] >= week_start) & (df_filtered['expiry'] <= week_end)
-        ]
-        
-        if target_options.empty:
+        if target_expiry not in index.lot_sizes:
             logging.warning(f"⚠️ No options found for expiry type {config['EXPIRY']}")
             return None
         
-        lot_size = int(target_options.iloc[0]['lot_size'])
+        lot_size = index.lot_sizes[target_expiry]
         logging.info(f"✅ Lot size retrieved: {lot_size} for expiry {config['EXPIRY']}")
         return lot_size
         
@@ -386,62 +259,51 @@ def get_lot_size(config, instruments_df):
         return None
 
 
-def get_optimal_option(signal, spot, nearest_price, instruments_df, config, user):
+def get_option_ladder(signal, spot, instruments_df, config, user, start=0, depth=OPTION_LADDER_DEPTH):
+    """
+    Candidate strikes for the resolved expiry, walking 100 points away from ATM
+    (PE below spot for BUY, CE above for SELL), priced with one batched LTP call.
+    Returns [(strike, symbol, expiry, ltp)] ordered away from ATM, skipping the
+    first `start` steps; stops at the first strike not listed for that expiry.
+    """
+    index = get_option_chain_index(instruments_df)
+    target_expiry = resolve_expiry(config['EXPIRY'], instruments_df)
+    opt_type, step = ("PE", -100) if signal == "BUY" else ("CE", 100)
+    strike = int(round(spot / 100.0) * 100) + step * start
+    contracts = []
+    for _ in range(depth):
+        strike += step
+        if not index.has_strike(opt_type, strike):
+            print(f"⚠️ No options found for strike {strike}{opt_type}")
+            break
+        opt = index.get(opt_type, target_expiry, strike)
+        if opt is None:
+            print(f"❌ No options found for expiry {target_expiry} for strike {strike}{opt_type}")
+            break
+        contracts.append(opt)
+    prices = get_quotes_batch([c.tradingsymbol for c in contracts], user)
+    return [(c.strike, c.tradingsymbol, c.expiry.strftime('%Y-%m-%d'), prices.get(c.tradingsymbol) or 0.0) for c in contracts]
+
+
+def get_optimal_option(signal, spot, nearest_price, instruments_df, config, user, ladder=None):
     
-    if config['EXPIRY'] == "NEXT_WEEK":
-        days = 7
-    elif config['EXPIRY'] == "NEXT_TO_NEXT_WEEK":
-        days = 14
-    strike = int(round(spot / 100.0) * 100)
-    print(f"Signal: {signal}, Spot: {spot}, Nearest 100 Strike: {strike}")
-    df = instruments_df.copy()
+    print(f"Signal: {signal}, Spot: {spot}, Nearest 100 Strike: {int(round(spot / 100.0) * 100)}")
+    if ladder is None:
+        ladder = get_option_ladder(signal, spot, instruments_df, config, user)
     best_option = None
     best_ltp_diff = float('inf')
+    i = 0
     while True:
-        if signal == "BUY":
-            opt_type = "PE"
-            strike -= 100
-        else:
-            opt_type = "CE"
-            strike += 100
-        df_filtered = df[
-            (df['name'] == OPTION_SYMBOL) &
-            (df['segment'] == SEGMENT) &
-            (df['strike'] == strike) &
-            (df['tradingsymbol'].str.endswith(opt_type))
-        ].copy()
-        if df_filtered.empty:
-            print(f"⚠️ No options found for strike {strike}{opt_type}")
-            break
-        df_filtered['expiry'] = pd.to_datetime(df_filtered['expiry'])
-        today = pd.Timestamp.today().normalize()
-        
-        if config['EXPIRY'] == "LAST":
-            if today.day <= 15:
-                month_ref = today
-            else:
-                month_ref = (today + pd.DateOffset(months=1)).replace(day=1)
-            next_month = month_ref.replace(day=28) + timedelta(days=4)
-            last_day_of_month = next_month - timedelta(days=next_month.day)
-            last_tuesday = last_day_of_month - timedelta(days=(last_day_of_month.weekday() - 1) % 7)
-            target_expiry = last_tuesday
-        else:
-            days_until_tuesday = (1 - today.weekday() + 7) % 7
-            this_week_tuesday = today + timedelta(days=days_until_tuesday)
-            target_expiry = this_week_tuesday + timedelta(days=days)
-
-        week_start = target_expiry - timedelta(days=target_expiry.weekday())
-        week_end = week_start + timedelta(days=6)
-        target_options = df_filtered[
-            (df_filtered['expiry'] >= week_start) & (df_filtered['expiry'] <= week_end)
-        ].sort_values('expiry')
-        if target_options.empty:
-            print(f"❌ No options found in week {week_start.date()} to {week_end.date()} for strike {strike}{opt_type}")
-            break
-        opt = target_options.iloc[0]
-        opt_symbol = opt['tradingsymbol']
-        expiry = opt['expiry'].strftime('%Y-%m-%d')
-        ltp = get_quotes(opt_symbol, user) or 0.0
+        if i == len(ladder):
+            # Premium still converging at the end of the priced ladder - price the next block
+            if i == 0 or i % OPTION_LADDER_DEPTH:
+                break
+            more = get_option_ladder(signal, spot, instruments_df, config, user, start=i)
+            if not more:
+                break
+            ladder.extend(more)
+        strike, opt_symbol, expiry, ltp = ladder[i]
+        i += 1
         diff = abs(ltp - nearest_price)
         if diff < best_ltp_diff:
             best_ltp_diff = diff
@@ -458,73 +320,81 @@ def get_optimal_option(signal, spot, nearest_price, instruments_df, config, user
         logging.info(f"{config['INTERVAL']} | No suitable option found for signal {signal}")
         return None, None, None, None
 
-def get_hedge_option(signal, spot, strike, instruments_df, config, user):
+def get_hedge_option(signal, spot, strike, instruments_df, config, user, ladder=None):
     if config['HEDGE_TYPE'] == "H-M100":
         HEDGE_STRIKE_DIFF = 100
     elif config['HEDGE_TYPE'] == "H-M200":
         HEDGE_STRIKE_DIFF = 200
     else:
         HEDGE_STRIKE_DIFF = 100  # Default value
-    if config['EXPIRY'] == "NEXT_WEEK":
-        days = 7
-    elif config['EXPIRY'] == "NEXT_TO_NEXT_WEEK":
-        days = 14
     if signal == "BUY":
         opt_type = "PE"
         hedge_strike = strike - HEDGE_STRIKE_DIFF
     else:
         opt_type = "CE"
         hedge_strike = strike + HEDGE_STRIKE_DIFF
-    df = instruments_df.copy()
-    df_filtered = df[
-        (df['name'] == OPTION_SYMBOL) &
-        (df['segment'] == SEGMENT) &
-        (df['strike'] == hedge_strike) &
-        (df['tradingsymbol'].str.endswith(opt_type))
-    ].copy()
-    if df_filtered.empty:
+    index = get_option_chain_index(instruments_df)
+    if not index.has_strike(opt_type, hedge_strike):
         print(f"❌ No hedge options found for strike {hedge_strike}{opt_type}")
         return None, None, None, None
-    df_filtered['expiry'] = pd.to_datetime(df_filtered['expiry'])
-    today = pd.Timestamp.today().normalize()
-    if config['EXPIRY'] == "LAST":
-        if today.day <= 15:
-            month_ref = today
-        else:
-            month_ref = (today + pd.DateOffset(months=1)).replace(day=1)
-        next_month = month_ref.replace(day=28) + timedelta(days=4)
-        last_day_of_month = next_month - timedelta(days=next_month.day)
-        last_tuesday = last_day_of_month - timedelta(days=(last_day_of_month.weekday() - 1) % 7)
-        target_expiry = last_tuesday
-    else:
-        days_until_tuesday = (1 - today.weekday() + 7) % 7
-        this_week_tuesday = today + timedelta(days=days_until_tuesday)
-        target_expiry = this_week_tuesday + timedelta(days=days)
-    week_start = target_expiry - timedelta(days=target_expiry.weekday())
-    week_end = week_start + timedelta(days=6)
-    target_options = df_filtered[
-        (df_filtered['expiry'] >= week_start) & (df_filtered['expiry'] <= week_end)
-    ].sort_values('expiry')
-    if target_options.empty:
-        print(f"❌ No hedge options found in week {week_start.date()} to {week_end.date()} for strike {hedge_strike}{opt_type}")
+    target_expiry = resolve_expiry(config['EXPIRY'], instruments_df)
+    opt = index.get(opt_type, target_expiry, hedge_strike)
+    if opt is None:
+        print(f"❌ No hedge options found for expiry {target_expiry} for strike {hedge_strike}{opt_type}")
         return None, None, None, None
-    opt = target_options.iloc[0]
-    opt_symbol = opt['tradingsymbol']
-    expiry = opt['expiry'].strftime('%Y-%m-%d')
-    ltp = get_quotes(opt_symbol, user) or 0.0
+    opt_symbol = opt.tradingsymbol
+    expiry = opt.expiry.strftime('%Y-%m-%d')
+    ltp = next((l[3] for l in ladder or [] if l[1] == opt_symbol), None)
+    if ltp is None:
+        ltp = get_quotes(opt_symbol, user) or 0.0
     print(f"✅ Hedge option found: {opt_symbol} | Strike: {hedge_strike} | Expiry: {expiry} | LTP: {ltp}")
     logging.info(f"Hedge option found: {opt_symbol} | Strike: {hedge_strike} | Expiry: {expiry} | LTP: {ltp}")
     return opt_symbol, hedge_strike, expiry, ltp
 
+def get_option_with_hedge(signal, spot, nearest_price, instruments_df, config, user):
+    """
+    Main option and its hedge (per config['HEDGE_TYPE']) resolved from one
+    batched strike-ladder quote. Returns (result, hedge_result); hedge_result
+    is None for NH or an unknown hedge type.
+    """
+    ladder = get_option_ladder(signal, spot, instruments_df, config, user)
+    result = get_optimal_option(signal, spot, nearest_price, instruments_df, config, user, ladder=ladder)
+    hedge_result = None
+    if config['HEDGE_TYPE'] == "H-P10":
+        hedge_result = get_optimal_option(signal, spot, HEDGE_NEAREST_LTP, instruments_df, config, user, ladder=ladder)
+    elif config['HEDGE_TYPE'] == "H-M100" or config['HEDGE_TYPE'] == "H-M200":
+        if result[1] is not None:
+            hedge_result = get_hedge_option(signal, spot, result[1], instruments_df, config, user, ladder=ladder)
+    return result, hedge_result
+
+OPEN_POSITION_INSERT_SQL = """
+    INSERT INTO open_trades (signal, spot_entry, option_symbol, strike, expiry, option_sell_price, entry_time, qty, interval, real_trade, entry_reason, expiry_type, strategy, key, user_id, hedge_option_symbol, hedge_strike, hedge_option_buy_price, hedge_qty, hedge_entry_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+OPEN_POSITION_DELETE_SQL = "DELETE FROM open_trades WHERE user_id = ? and key = ? and option_symbol = ? and interval = ? and expiry_type = ? and strategy = ?"
+COMPLETED_TRADE_INSERT_SQL = """
+    INSERT INTO completed_trades (signal, spot_entry, option_symbol, strike, expiry, option_sell_price,
+    entry_time, spot_exit, option_buy_price, exit_time, pnl, qty, interval, real_trade, entry_reason, exit_reason, expiry_type, strategy, key, user_id, hedge_option_symbol, hedge_strike, hedge_option_buy_price, hedge_qty, hedge_entry_time, hedge_exit_time, hedge_option_sell_price, hedge_pnl, total_pnl)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+trade_journal = TradeJournal(db, {
+    "save_open_position": lambda *params: db.execute("save_open_position", OPEN_POSITION_INSERT_SQL, params),
+    "delete_open_position": lambda *params: db.execute("delete_open_position", OPEN_POSITION_DELETE_SQL, params),
+    "record_trade": lambda *params: db.execute("record_trade", COMPLETED_TRADE_INSERT_SQL, params),
+})
+
+
+def _write_trade_tables(op, params):
+    """open_trades / completed_trades write: queued on the trade journal (USE_TRADE_JOURNAL) or run now."""
+    if USE_TRADE_JOURNAL:
+        trade_journal.submit(op, *params)
+    else:
+        trade_journal.handlers[op](*params)
+
 def save_open_position(trade, config, tradeGenie_id):
     try:
         logging.info(f"Saving open position: {trade['OptionSymbol']} in {config['INTERVAL']} interval")
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        sql = """
-            INSERT INTO open_trades (signal, spot_entry, option_symbol, strike, expiry, option_sell_price, entry_time, qty, interval, real_trade, entry_reason, expiry_type, strategy, key, user_id, hedge_option_symbol, hedge_strike, hedge_option_buy_price, hedge_qty, hedge_entry_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
         params = (
             trade["Signal"], trade["SpotEntry"], trade['OptionSymbol'], trade["Strike"],
             trade["Expiry"], trade["OptionSellPrice"], trade["EntryTime"], trade["qty"],
@@ -533,10 +403,7 @@ def save_open_position(trade, config, tradeGenie_id):
             tradeGenie_id, trade.get("hedge_option_symbol"), trade.get("hedge_strike"), trade.get("hedge_option_buy_price"), trade.get("hedge_qty"), 
             trade.get("hedge_entry_time")
         )
-        # print("Executing SQL:", sql, "\nWith parameters:", params)
-        c.execute(sql, params)
-        conn.commit()
-        conn.close()
+        _write_trade_tables("save_open_position", params)
         logging.info(f"✅ Open position saved successfully: {trade['OptionSymbol']} in {config['INTERVAL']} interval")
     except Exception as e:
         print(f"❌ Error saving open position: {e}")
@@ -545,33 +412,28 @@ def save_open_position(trade, config, tradeGenie_id):
 def delete_open_position(symbol, config, trade, tradeGenie_id):
     try:
         logging.info(f"Deleting open position for {symbol} in {config['INTERVAL']} interval")
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        sql = "DELETE FROM open_trades WHERE option_symbol = ? and interval = ? and expiry_type = ? and strategy = ? and key = ? and user_id = ?"
-        params = (symbol, config['INTERVAL'], trade.get("ExpiryType",config['EXPIRY']), trade.get("Strategy",config['STRATEGY']), trade.get("Key","NA"), tradeGenie_id)
-        # print("Executing SQL:", sql, "\nWith parameters:", params)
-        c.execute(sql, params)
-        conn.commit()
-        conn.close()
+        params = (tradeGenie_id, trade.get("Key","NA"), symbol, config['INTERVAL'], trade.get("ExpiryType",config['EXPIRY']), trade.get("Strategy",config['STRATEGY']))
+        _write_trade_tables("delete_open_position", params)
         logging.info(f"✅ Open position for {symbol} deleted successfully in {config['INTERVAL']} interval")
     except Exception as e:
         print(f"❌ Error deleting open position for {symbol}: {e}")
         logging.error(f"{config['INTERVAL']} | Error deleting open position for {symbol}: {e}")
 
 def load_open_position(config,key , user , tradeGenie_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    if USE_TRADE_JOURNAL:
+        # read our own queued writes; on timeout the DB may still miss the newest ones
+        if not trade_journal.flush(JOURNAL_FLUSH_TIMEOUT):
+            print(f"⚠️ Trade journal not flushed within {JOURNAL_FLUSH_TIMEOUT}s, open position for {key} may be stale")
+            logging.error(f"❌ Trade journal not flushed within {JOURNAL_FLUSH_TIMEOUT}s, open position for {key} may be stale")
     sql = """
         SELECT signal, spot_entry, option_symbol, strike, expiry, 
                option_sell_price, entry_time, qty, interval, real_trade, entry_reason, expiry_type, strategy, key, user_id, hedge_option_symbol, hedge_strike, hedge_option_buy_price, hedge_qty, hedge_entry_time
-        FROM open_trades where interval = ? and expiry_type = ? and strategy = ? and key = ? and user_id = ?
+        FROM open_trades where user_id = ? and key = ? and interval = ? and expiry_type = ? and strategy = ?
         ORDER BY id DESC LIMIT 1
     """
-    params = (config['INTERVAL'], config['EXPIRY'], config['STRATEGY'], key, tradeGenie_id)
+    params = (tradeGenie_id, key, config['INTERVAL'], config['EXPIRY'], config['STRATEGY'])
     # print("Executing SQL:", sql, "\nWith parameters:", params)
-    c.execute(sql, params)
-    row = c.fetchone()
-    conn.close()
+    row = db.fetchone("load_open_position", sql, params)
     if not row:
         return None
     position_data = {
@@ -609,13 +471,6 @@ def load_open_position(config,key , user , tradeGenie_id):
 def record_trade(trade, config, tradeGenie_id):
     print(f"✅ Recording trade: {trade}")
     logging.info(f"✅ Recording trade: {trade}")
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    sql = """
-        INSERT INTO completed_trades (signal, spot_entry, option_symbol, strike, expiry, option_sell_price,
-        entry_time, spot_exit, option_buy_price, exit_time, pnl, qty, interval, real_trade, entry_reason, exit_reason, expiry_type, strategy, key, user_id, hedge_option_symbol, hedge_strike, hedge_option_buy_price, hedge_qty, hedge_entry_time, hedge_exit_time, hedge_option_sell_price, hedge_pnl, total_pnl)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
     params = (
         trade["Signal"], trade["SpotEntry"], trade['OptionSymbol'], trade["Strike"],
         trade["Expiry"], trade["OptionSellPrice"], trade["EntryTime"],
@@ -626,62 +481,51 @@ def record_trade(trade, config, tradeGenie_id):
         trade.get("hedge_option_symbol"), trade.get("hedge_strike"), trade.get("hedge_option_buy_price"), trade.get("hedge_qty"),
         trade.get("hedge_entry_time"), trade.get("hedge_exit_time"), trade.get("hedge_option_sell_price"), trade.get("hedge_pnl"), trade.get("total_pnl")
     )
-    # print("Executing SQL:", sql, "\nWith parameters:", params)
-    c.execute(sql, params)
-    conn.commit()
-    conn.close()
+    _write_trade_tables("record_trade", params)
     print(f"📊 Trade recorded in DB.")
     logging.info(f"📊 Trade recorded in DB.")
 
 def get_next_expiry_optimal_option(signal, last_expiry, price, nearest_price, instruments_df, config, user):
     
     try:
-        df = instruments_df.copy()
+        index = get_option_chain_index(instruments_df)
         base_strike = int(round(price / 100.0) * 100)
         opt_type = "PE" if signal == "BUY" else "CE"
         today = pd.Timestamp.today().normalize()
-        last_expiry_date = pd.to_datetime(last_expiry)
+        last_expiry_date = pd.to_datetime(last_expiry).date()
         if signal == "BUY":
             strike = base_strike - 100
             strike_adjustment = -100
         else:
             strike = base_strike + 100
             strike_adjustment = 100
+        if config['EXPIRY'] == "LAST":
+            if today.day <= 15:
+                month_str = today.strftime('%b').upper()
+            else:
+                next_month = (today + pd.DateOffset(months=1))
+                month_str = next_month.strftime('%b').upper()
+        later_expiries = index.expiries_after(opt_type, last_expiry_date)
         best_option = None
         best_ltp_diff = float('inf')
         previous_strike = None
         previous_ltp = None
         previous_symbol = None
         while True:
-            df_filtered = df[
-                (df['name'] == OPTION_SYMBOL) &
-                (df['segment'] == SEGMENT) &
-                (df['strike'] == strike) &
-                (df['tradingsymbol'].str.endswith(opt_type))
-            ].copy()
-            if df_filtered.empty:
+            if not index.has_strike(opt_type, strike):
                 break
-            df_filtered['expiry'] = pd.to_datetime(df_filtered['expiry'])
-            df_next_expiry = df_filtered[df_filtered['expiry'] > last_expiry_date].copy()
-            if df_next_expiry.empty:
+            contracts = [c for c in (index.get(opt_type, e, strike) for e in later_expiries) if c]
+            if not contracts:
                 break
-            df_next_expiry = df_next_expiry.sort_values('expiry')
-            next_expiry = df_next_expiry.iloc[0]['expiry']
+            next_expiry = contracts[0].expiry
             if config['EXPIRY'] == "LAST":
-                if today.day <= 15:
-                    month_str = today.strftime('%b').upper()
-                else:
-                    next_month = (today + pd.DateOffset(months=1))
-                    month_str = next_month.strftime('%b').upper()
-                df_same_expiry = df_next_expiry[df_next_expiry['tradingsymbol'].str.contains(month_str)].copy()
-                if df_same_expiry.empty:
-                    break
+                same_expiry = [c for c in contracts if month_str in c.tradingsymbol]
             else:
-                df_same_expiry = df_next_expiry[df_next_expiry['expiry'] == next_expiry].copy()
-            if df_same_expiry.empty:
+                same_expiry = [c for c in contracts if c.expiry == next_expiry]
+            if not same_expiry:
                 break
-            option = df_same_expiry.iloc[0]
-            opt_symbol = option['tradingsymbol']
+            option = same_expiry[0]
+            opt_symbol = option.tradingsymbol
             ltp = get_quotes(opt_symbol, user) or 0.0
             if ltp == 0.0:
                 strike += strike_adjustment
@@ -757,8 +601,8 @@ def close_position_and_no_new_trade(trade, position, close, ts, config, user, ke
         print(f"📥 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
         
-        order_id ,avg_price,qty = place_option_hybrid_order(trade["OptionSymbol"], trade["qty"], "BUY", config, user)
-        hedge_order_id , hedge_avg_price, hedge_qty = place_option_hybrid_order(trade["hedge_option_symbol"], trade["qty"], "SELL", config, user)
+        (order_id, avg_price, qty), (hedge_order_id, hedge_avg_price, hedge_qty) = place_multi_leg_order(
+            [(trade["OptionSymbol"], trade["qty"], "BUY"), (trade["hedge_option_symbol"], trade["qty"], "SELL")], config, user)
 
         logging.info(f"order_id : {order_id} | opt_symbol : {trade['OptionSymbol']} avg_price : {avg_price} | qty : {qty}")
         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
@@ -781,7 +625,7 @@ def close_position_and_no_new_trade(trade, position, close, ts, config, user, ke
         })
         record_trade(trade, config, user['id'])
         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-        send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+        send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
         return {}, None
     else:
         now = datetime.datetime.now()
@@ -816,7 +660,7 @@ def close_position_and_no_new_trade(trade, position, close, ts, config, user, ke
         })
         record_trade(trade, config, user['id'])
         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-        send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+        send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
         return {}, None
 
 
@@ -850,9 +694,9 @@ def _parse_interval_to_minutes(interval_str: str) -> int:
         # e.g. "1h"
         num = int(''.join(ch for ch in s if ch.isdigit()))
         return num * 60
-    # default: numeric minutes
-    num = int(''.join(ch for ch in s if ch.isdigit()))
-    return max(1, num)
+    # default: numeric minutes ("minute" alone is Kite's 1 minute interval)
+    digits = ''.join(ch for ch in s if ch.isdigit())
+    return max(1, int(digits)) if digits else 1
 
 def get_next_candle_time(interval_str: str, from_dt=None):
     """
@@ -894,7 +738,57 @@ def get_next_candle_time_old(interval_str: str, from_dt=None):
         next_dt = next_dt + datetime.timedelta(minutes=minutes)
     return next_dt
 
+HA_BLOCK = 512  # rows per closed-form block in heikin_ashi_inplace (2^k weights stay within float64 range)
+
+def heikin_ashi_inplace(ohlc, block=HA_BLOCK):
+    """
+    Heikin-Ashi transform of a float64 (n, 4) open/high/low/close array, in place.
+    ha_open[i] = (ha_open[i-1] + ha_close[i-1]) / 2 is a first-order linear filter,
+    so inside a block starting at s it has the closed form
+    ha_open[s+j] = 0.5^j * (ha_open[s] + sum_{k=1..j} 2^(k-1) * ha_close[s+k-1]);
+    only the block start is carried from one block to the next.
+    """
+    n = ohlc.shape[0]
+    if n == 0:
+        return ohlc
+    o, h, l, c = ohlc[:, 0], ohlc[:, 1], ohlc[:, 2], ohlc[:, 3]
+    ha_close = (o + h + l + c) / 4
+    ha_open = np.empty(n)
+    ha_open[0] = o[0]
+
+    m = n - 1
+    if m:
+        nb = -(-m // block)
+        x = np.zeros(nb * block)
+        x[:m] = ha_close[:-1]
+        sums = np.cumsum(x.reshape(nb, block) * 2.0 ** np.arange(block), axis=1)
+        scale = 0.5 ** np.arange(1, block + 1)
+        starts = np.empty(nb)
+        starts[0] = ha_open[0]
+        for b in range(1, nb):
+            starts[b] = scale[-1] * (starts[b - 1] + sums[b - 1, -1])
+        ha_open[1:] = (scale * (starts[:, None] + sums)).ravel()[:m]
+
+    ohlc[:, 1] = np.fmax(np.fmax(h, ha_open), ha_close)
+    ohlc[:, 2] = np.fmin(np.fmin(l, ha_open), ha_close)
+    ohlc[:, 0] = ha_open
+    ohlc[:, 3] = ha_close
+    return ohlc
+
 def convertIntoHeikinashi(df):
+    """Heikin-Ashi candles (same output as convertIntoHeikinashi_old, computed by heikin_ashi_inplace)."""
+    ha_df = df.copy()
+    if df.empty:
+        return ha_df
+    ohlc = df[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64, copy=True)
+    heikin_ashi_inplace(ohlc)
+    ha_df['open'] = ohlc[:, 0]
+    ha_df['close'] = ohlc[:, 3]
+    ha_df['high'] = ohlc[:, 1]
+    ha_df['low'] = ohlc[:, 2]
+    return ha_df
+
+def convertIntoHeikinashi_old(df):
     ha_df = df.copy()
     ha_close = (df['open'] + df['high'] + df['low'] + df['close']) / 4
     ha_open = [df['open'].iloc[0]]
@@ -14,5 +14,58 @@ DB_FILE = "Trading.db"
 #SERVER = "LOCAL - HEDGE"
 SERVER = "GCP - UAT"  # PROD or TEST
 
+KITE_POOL_MAXSIZE = 16  # HTTP connections kept alive per user Kite session
+
+QUOTE_POLL_INTERVAL = 2  # Seconds between batched LTP refreshes of all subscribed symbols
+QUOTE_MAX_AGE = 5  # Max age (seconds) of a snapshot LTP before get_quotes falls back to REST
+QUOTE_IDLE_EXPIRY = 120  # Drop symbols from the batch if nobody read them for this many seconds
+QUOTE_BATCH_SIZE = 500  # Instruments per kite.ltp request
+
+USE_TICKER_STREAM = False  # True = monitor open positions on the KiteTicker websocket instead of REST polling
+STREAM_MONITOR_INTERVAL = 15  # Seconds between position status prints while waiting on ticks
+TARGET_EXIT_RATIO = 0.6  # Exit short option once LTP <= this fraction of the entry price
+
+CANDLE_CACHE_DIR = "candle_cache"  # Persisted candle store (one pickle per instrument token and interval)
+CANDLE_REFRESH_MIN_SEC = 5  # Serve a key from memory if it was refreshed less than this many seconds ago
+CANDLE_STORE_MAX_DAYS = 60  # Days of candles kept per key in the store
+CANDLE_RECONCILE_BARS = 6  # Streaming mode: reconcile locally built bars with REST history every N bars
+CANDLE_CLOSE_WAIT = 2  # Seconds to wait for the locally built bar to close before falling back to REST
+
+USE_INDICATOR_ENGINE = False  # True = update strategy indicators incrementally per closed candle instead of recomputing the frame
+INDICATOR_STATE_DIR = "indicator_state"  # Persisted incremental indicator state (JSON per instrument/interval/strategy)
+
+ORDER_EXECUTOR_WORKERS = 8  # Threads submitting order legs concurrently (shared by all users)
+LEG_EXECUTION_HEDGE_FIRST = True  # Send the short leg only after the hedge leg is acknowledged
+LEG_ACK_TIMEOUT = 10  # Seconds to wait for the hedge ack; after that the short leg waits for the hedge order to return an order id, or is not sent
+ORDER_FILL_TIMEOUT = 3  # Seconds to wait for a market order fill on the order-update stream before REST fallback
+ORDER_UPDATE_TTL = 60  # Seconds an order update is kept for an order this process has not (yet) placed
+
 HEDGE_NEAREST_LTP = 10  # Nearest strike price for hedge option
+OPTION_LADDER_DEPTH = 15  # Strikes away from ATM priced per batched LTP call in option selection
 HEDGE_STRIKE_DIFF = 100  # Nearest strike price for hedge option
+
+OPTION_MODEL_VOL = 0.13  # Flat annualised volatility of the synthetic option pricer when no surface is given
+OPTION_MODEL_RATE = 0.065  # Risk-free rate used by the synthetic option pricer (forward and discounting)
+OPTION_MODEL_LOT_SIZE = 75  # Lot size assumed by the synthetic option pricer when no instruments file is given
+
+RECORD_OPTION_CHAIN = False  # True = snapshot the option chain to CHAIN_STORE_DIR during market hours (backtest premium history)
+CHAIN_STORE_DIR = "chain_store"  # Recorded chain snapshots (one binary file per column, per trade date and expiry)
+CHAIN_RECORD_INTERVAL = 5  # Seconds between option-chain snapshots
+CHAIN_RECORD_EXPIRIES = 3  # Upcoming expiries recorded per snapshot
+CHAIN_RECORD_STRIKES = 30  # Strikes (100 points apart) recorded on each side of ATM, per option type and expiry
+CHAIN_DEPTH_LEVELS = 5  # Market depth levels (bid/ask price and quantity) stored per contract
+CHAIN_FLUSH_ROWS = 8192  # Rows buffered per expiry before they are appended to disk
+CHAIN_FLUSH_SECONDS = 60  # Max seconds a recorded row stays buffered in memory
+CHAIN_QUOTE_MAX_AGE = 60  # Backtests treat a recorded premium older than this many seconds as missing
+
+DB_BUSY_TIMEOUT = 5  # Seconds a DB write waits for another thread's write lock before failing
+DB_STATEMENT_CACHE = 128  # Prepared statements kept per thread's DB connection
+
+USE_TRADE_JOURNAL = True  # Persist trades through the write-behind journal instead of blocking on SQLite in the order path
+TRADE_JOURNAL_FILE = "trade_journal.jsonl"  # Append-only journal of trade DB writes, replayed into the DB on startup
+JOURNAL_BATCH_MAX = 256  # Events written (one fsync) and applied (one transaction) per journal batch
+JOURNAL_MAX_BYTES = 1_000_000  # Truncate the journal once it is fully applied and larger than this
+JOURNAL_FLUSH_TIMEOUT = 10  # Seconds shutdown waits for queued journal events to reach the DB
+TELEGRAM_QUEUE_SIZE = 1000  # Telegram messages queued for the background sender before new ones are dropped
+
+CONFIG_CHECK_INTERVAL = 5  # Seconds between checks of the trade_config change counter (configs are re-read only when it moved)
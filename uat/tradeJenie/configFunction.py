@@ -3,6 +3,7 @@ import sqlite3
 import datetime
 import logging                                  
 from config import DB_FILE
+from strategynames import STRATEGY_NAMES
 
 
 def new_trade_config():
@@ -12,7 +13,7 @@ def new_trade_config():
     KEY = input("Enter unique Strategy name: ").strip()
 
     # Strategy selection
-    strategies = ["PARALLEL_EMA", "GOD_EMA", "HDSTRATEGY"]
+    strategies = list(STRATEGY_NAMES)
     print("\nSelect STRATEGY:")
     for i, s in enumerate(strategies, 1):
         print(f"{i}. {s}")
@@ -160,7 +161,7 @@ def update_trade_config():
             print(f"{f}: {v}")                                               # print each field and its current value
 
         # --- Strategy selection with validation (Enter to keep current) ---
-        strategies = ["PARALLEL_EMA", "GOD_EMA", "HDSTRATEGY"]                # allowed strategies
+        strategies = list(STRATEGY_NAMES)                                         # allowed strategies (registry)
         print("\nSelect STRATEGY (press Enter to keep current):")             # show prompt header
         for i, s in enumerate(strategies, start=1):                          # enumerate options
             print(f"{i}. {s}")                                                # print options numbered
@@ -0,0 +1,114 @@
+import time
+import sqlite3
+import threading
+import logging
+from types import MappingProxyType
+from config import LOG_FILE, CONFIG_CHECK_INTERVAL
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+_EMPTY = MappingProxyType({})
+
+
+class ConfigStore:
+    """
+    In-memory copy of every user's trade_config rows. The whole table is read
+    once into immutable snapshots ({user_id: {KEY: config}}, all read-only
+    mappings), so strategy threads can share them without locking or copying.
+    Edits are detected through config_version, which triggers bump on every
+    insert/update/delete of trade_config from any connection; the counter is
+    polled at most every CONFIG_CHECK_INTERVAL seconds and the table is only
+    re-read when it moved. A new snapshot replaces the old one whole, so a
+    reader holding a snapshot never sees a half-applied edit.
+    """
+
+    def __init__(self, db, check_interval=CONFIG_CHECK_INTERVAL):
+        self.db = db
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None      # {user_id: {KEY: config}}
+        self._version = None       # config_version seen by the last load
+        self._checked = 0.0        # monotonic time of the last version check
+        self.stats = {"checks": 0, "loads": 0}
+
+    def _current_version(self):
+        try:
+            return self.db.fetchone("config_version", "SELECT version FROM config_version WHERE id = 1")[0]
+        except (sqlite3.OperationalError, TypeError):
+            return None            # schema not migrated yet: reload on every check
+
+    def _load(self):
+        from strategies import get_strategy   # strategies imports commonFunction, which imports this module
+
+        rows, _ = self.db.fetchall("configstore.load", """
+            SELECT USER_ID, KEY, STRATEGY, INTERVAL, LOT, NEAREST_LTP, INTRADAY, NEW_TRADE,
+                REAL_TRADE, EXPIRY, HEDGE_TYPE, HEDGE_ROLLOVER_TYPE
+            FROM trade_config
+            ORDER BY USER_ID, KEY
+        """)
+        users = {}
+        for row in rows:
+            (
+                USER_ID, KEY, STRATEGY, INTERVAL, LOT, NEAREST_LTP, INTRADAY, NEW_TRADE,
+                REAL_TRADE, EXPIRY, HEDGE_TYPE, HEDGE_ROLLOVER_TYPE
+            ) = row
+            try:
+                STRATEGY = get_strategy(STRATEGY).name
+            except ValueError as e:
+                print(f"❌ Skipping trade config {KEY}: {e}")
+                logging.error(f"❌ Skipping trade config {KEY}: {e}")
+                continue
+
+            users.setdefault(USER_ID, {})[KEY] = MappingProxyType({
+                "INTERVAL": INTERVAL,
+                "LOT": LOT,
+                "NEAREST_LTP": NEAREST_LTP,
+                "INTRADAY": INTRADAY,
+                "NEW_TRADE": NEW_TRADE,
+                "REAL_TRADE": REAL_TRADE,
+                "EXPIRY": EXPIRY,
+                "HEDGE_TYPE": HEDGE_TYPE,
+                "HEDGE_ROLLOVER_TYPE": HEDGE_ROLLOVER_TYPE,
+                "STRATEGY": STRATEGY,
+                "KEY": KEY
+            })
+        return MappingProxyType({user_id: MappingProxyType(configs) for user_id, configs in users.items()})
+
+    def refresh(self, force=False):
+        """
+        Reload if trade_config changed since the last load (checked at most
+        every check_interval seconds unless force). Returns True if reloaded.
+        """
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            if not force and self._snapshot is not None and now - self._checked < self.check_interval:
+                return False   # another thread checked while we waited
+            self.stats["checks"] += 1
+            version = self._current_version()
+            self._checked = time.monotonic()
+            if not force and self._snapshot is not None and version is not None and version == self._version:
+                return False
+            self._snapshot = self._load()
+            self._version = version
+            self.stats["loads"] += 1
+            logging.info(f"ℹ️ Trade configs loaded | version {version} | {sum(len(c) for c in self._snapshot.values())} configs")
+            return True
+
+    def snapshot(self):
+        """{user_id: {KEY: config}} as of the last change seen."""
+        self.refresh()
+        return self._snapshot
+
+    def get(self, user_id):
+        """Read-only {KEY: config} for one user (empty if it has none)."""
+        return self.snapshot().get(user_id, _EMPTY)
+
+    @property
+    def version(self):
+        return self._version
@@ -0,0 +1,282 @@
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from config import DB_FILE, LOG_FILE, DB_BUSY_TIMEOUT, DB_STATEMENT_CACHE
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+# Schema versions, applied in order by Database.migrate(); PRAGMA user_version
+# records the last one applied. Append new versions, never edit shipped ones.
+SCHEMA_MIGRATIONS = [
+    # 1: baseline tables (databases created before versioning already have them)
+    [
+        """
+            CREATE TABLE IF NOT EXISTS completed_trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                signal TEXT,
+                spot_entry REAL,
+                option_symbol TEXT,
+                strike INTEGER,
+                expiry TEXT,
+                option_sell_price REAL,
+                entry_time TEXT,
+                spot_exit REAL,
+                option_buy_price REAL,
+                exit_time TEXT,
+                pnl REAL,
+                qty INTEGER,
+                interval TEXT,
+                real_trade TEXT,
+                entry_reason TEXT,
+                exit_reason TEXT,
+                expiry_type TEXT,
+                strategy TEXT,
+                key TEXT,
+                user_id INTEGER,
+                hedge_option_symbol TEXT,
+                hedge_strike INTEGER,
+                hedge_option_buy_price REAL,
+                hedge_qty INTEGER,
+                hedge_entry_time TEXT,
+                hedge_exit_time TEXT,
+                hedge_option_sell_price REAL,
+                hedge_pnl REAL,
+                total_pnl REAL
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS open_trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                signal TEXT,
+                spot_entry REAL,
+                option_symbol TEXT,
+                strike INTEGER,
+                expiry TEXT,
+                option_sell_price REAL,
+                entry_time TEXT,
+                qty INTEGER,
+                interval TEXT,
+                real_trade TEXT,
+                entry_reason TEXT,
+                expiry_type TEXT,
+                strategy TEXT,
+                key TEXT,
+                user_id INTEGER,
+                hedge_option_symbol TEXT,
+                hedge_strike INTEGER,
+                hedge_option_buy_price REAL,
+                hedge_qty INTEGER,
+                hedge_entry_time TEXT
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS user_dtls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user TEXT,
+                kite_username TEXT,
+                kite_password TEXT,
+                kite_api_secret TEXT,
+                kite_api_key TEXT,
+                kite_totp_token TEXT,
+                telegram_chat_id TEXT,
+                telegram_token TEXT,
+                active_flag INTEGER,
+                crt_dt TEXT
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS trade_config (
+                ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                USER_ID INTEGER,
+                KEY TEXT UNIQUE,
+                INTERVAL TEXT,
+                LOT TEXT,
+                NEAREST_LTP INTEGER,
+                INTRADAY TEXT,
+                NEW_TRADE TEXT,
+                REAL_TRADE TEXT,
+                EXPIRY TEXT,
+                STRATEGY TEXT,
+                CRT_DT TEXT,
+                LST_UPDT_DT TEXT,
+                HEDGE_TYPE TEXT,
+                HEDGE_ROLLOVER_TYPE TEXT,
+                FOREIGN KEY(USER_ID) REFERENCES user_dtls(id)
+            )
+        """,
+    ],
+    # 2: lookup indexes - open positions by (user_id, key), newest first via the rowid
+    [
+        "CREATE INDEX IF NOT EXISTS idx_open_trades_user_key ON open_trades (user_id, key)",
+        "CREATE INDEX IF NOT EXISTS idx_completed_trades_user_key ON completed_trades (user_id, key, exit_time)",
+        "CREATE INDEX IF NOT EXISTS idx_trade_config_user ON trade_config (USER_ID, KEY)",
+        "CREATE INDEX IF NOT EXISTS idx_user_dtls_active ON user_dtls (active_flag)",
+    ],
+    # 3: trade journal checkpoint - last journal seq applied to the tables above
+    [
+        "CREATE TABLE IF NOT EXISTS journal_state (id INTEGER PRIMARY KEY CHECK (id = 1), applied_seq INTEGER NOT NULL)",
+    ],
+    # 4: trade_config change counter - bumped by triggers on every write from any
+    #    connection (configFunction included), polled by configstore.ConfigStore
+    [
+        "CREATE TABLE IF NOT EXISTS config_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)",
+        """
+            CREATE TRIGGER IF NOT EXISTS trade_config_version_insert AFTER INSERT ON trade_config
+            BEGIN UPDATE config_version SET version = version + 1 WHERE id = 1; END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS trade_config_version_update AFTER UPDATE ON trade_config
+            BEGIN UPDATE config_version SET version = version + 1 WHERE id = 1; END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS trade_config_version_delete AFTER DELETE ON trade_config
+            BEGIN UPDATE config_version SET version = version + 1 WHERE id = 1; END
+        """,
+    ],
+]
+
+
+class Database:
+    """
+    SQLite access for every user/config thread. Each thread keeps one
+    connection to DB_FILE, opened on first use in WAL mode with
+    synchronous=NORMAL, so readers never block the writer and a commit does
+    not wait for an fsync; concurrent writers wait up to DB_BUSY_TIMEOUT
+    seconds instead of failing with "database is locked". Callers pass
+    constant SQL strings, so sqlite3's per-connection statement cache
+    (DB_STATEMENT_CACHE entries) prepares each one once per thread. Calls run
+    in autocommit unless they are inside transaction(); every statement's
+    timing is accumulated in stats() under its name.
+    """
+
+    def __init__(self, path=DB_FILE, busy_timeout=DB_BUSY_TIMEOUT, statement_cache=DB_STATEMENT_CACHE):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {}   # statement name -> {"calls", "errors", "total_ms", "max_ms"}
+        self.connections_opened = 0
+
+    # ---------- connections ----------
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   cached_statements=self.statement_cache)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self.connections_opened += 1
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection (reopened on next use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------- statements ----------
+    def _record(self, name, started, failed):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            s = self._stats.get(name)
+            if s is None:
+                s = self._stats[name] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            s["calls"] += 1
+            s["errors"] += failed
+            s["total_ms"] += elapsed
+            s["max_ms"] = max(s["max_ms"], elapsed)
+
+    def execute(self, name, sql, params=()):
+        """Run one statement; returns the cursor (rows still to fetch)."""
+        conn = self.connection()
+        started = time.perf_counter()
+        try:
+            cursor = conn.execute(sql, params)
+        except Exception:
+            self._record(name, started, True)
+            raise
+        self._record(name, started, False)
+        return cursor
+
+    def fetchone(self, name, sql, params=()):
+        return self.execute(name, sql, params).fetchone()
+
+    def fetchall(self, name, sql, params=()):
+        """(rows, column names)."""
+        cursor = self.execute(name, sql, params)
+        return cursor.fetchall(), [d[0] for d in cursor.description]
+
+    @contextmanager
+    def transaction(self):
+        """
+        BEGIN IMMEDIATE ... COMMIT around the block (ROLLBACK on error).
+        Nested blocks join the outer transaction.
+        """
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        self.execute("BEGIN", "BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = 0
+            conn.execute("ROLLBACK")
+            raise
+        self._local.depth = 0
+        try:
+            self.execute("COMMIT", "COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def migrate(self, migrations):
+        """
+        Bring the schema up to len(migrations): each pending version's
+        statements run in one transaction together with the user_version bump.
+        Returns the schema version.
+        """
+        version = self.fetchone("user_version", "PRAGMA user_version")[0]
+        if version >= len(migrations):
+            return version
+        with self.transaction():
+            # Re-read under the write lock: another thread may have migrated meanwhile
+            version = self.fetchone("user_version", "PRAGMA user_version")[0]
+            for target in range(version + 1, len(migrations) + 1):
+                for sql in migrations[target - 1]:
+                    self.execute(f"migrate_v{target}", sql)
+                self.execute("user_version", f"PRAGMA user_version = {target}")
+                logging.info(f"ℹ️ Database {self.path} migrated to schema v{target}")
+        return len(migrations)
+
+    def stats(self):
+        """{statement name: {calls, errors, total_ms, max_ms, avg_ms}}."""
+        with self._lock:
+            return {name: dict(s, avg_ms=s["total_ms"] / s["calls"] if s["calls"] else 0.0)
+                    for name, s in self._stats.items()}
+
+
+db = Database()
+
+
+def get_db_stats():
+    return db.stats()
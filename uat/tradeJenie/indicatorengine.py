@@ -0,0 +1,305 @@
+import os
+import json
+import copy
+import threading
+import logging
+from collections import deque
+import pandas as pd
+from config import LOG_FILE, INDICATOR_STATE_DIR
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+NAN = float("nan")
+
+
+class _State:
+    """Plain attribute state that round-trips through JSON (nested states included)."""
+
+    def to_dict(self):
+        return {k: (v.to_dict() if isinstance(v, _State) else v) for k, v in vars(self).items()}
+
+    def load(self, data):
+        for k, v in data.items():
+            current = getattr(self, k, None)
+            if isinstance(current, _State):
+                current.load(v)
+            else:
+                setattr(self, k, v)
+        return self
+
+
+# ---------- indicator primitives (O(1) per bar) ----------
+class EMA(_State):
+    """ewm(span, adjust=False).mean(): y = (1 - a) * y_prev + a * x, seeded with the first value."""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+
+    def update(self, x):
+        self.value = x if self.value is None else (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+
+class SMA(_State):
+    """rolling(length).mean() over a ring buffer; NaN until `length` values are in."""
+
+    def __init__(self, length):
+        self.length = length
+        self.buf = [0.0] * length
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, x):
+        if self.count == self.length:
+            self.total -= self.buf[self.pos]
+        else:
+            self.count += 1
+        self.buf[self.pos] = x
+        self.total += x
+        self.pos = (self.pos + 1) % self.length
+        if self.pos == 0:
+            self.total = sum(self.buf[:self.count])   # re-sum once per lap so rounding can't drift
+        return self.total / self.length if self.count == self.length else NAN
+
+
+class HeikinAshi(_State):
+    """convertIntoHeikinashi one bar at a time."""
+
+    def __init__(self):
+        self.prev_open = None
+        self.prev_close = None
+
+    def update(self, bar):
+        ha_close = (bar["open"] + bar["high"] + bar["low"] + bar["close"]) / 4
+        ha_open = bar["open"] if self.prev_open is None else (self.prev_open + self.prev_close) / 2
+        self.prev_open, self.prev_close = ha_open, ha_close
+        return {"open": ha_open, "high": max(bar["high"], ha_open, ha_close),
+                "low": min(bar["low"], ha_open, ha_close), "close": ha_close}
+
+
+# ---------- strategy states (same rules as the batch functions) ----------
+class GodState(_State):
+    """Incremental generate_god_signals."""
+
+    def __init__(self, len1=8, len2=20):
+        self.ema1 = EMA(len1)
+        self.ema2 = EMA(len2)
+        self.prev = None   # (close, ema1, ema2) of the previous bar
+        self.trend = 0
+        self.buy_fired = False
+        self.sell_fired = False
+
+    def update(self, bar):
+        c = bar["close"]
+        e1, e2 = self.ema1.update(c), self.ema2.update(c)
+        crossover = crossunder = two_above = two_below = False
+        if self.prev is not None:
+            pc, p1, p2 = self.prev
+            crossover = e1 > e2 and p1 <= p2
+            crossunder = e1 < e2 and p1 >= p2
+            two_above = c > e1 and c > e2 and pc > p1 and pc > p2
+            two_below = c < e1 and c < e2 and pc < p1 and pc < p2
+        trend = 1 if crossover else -1 if crossunder else self.trend
+        if trend != self.trend:
+            self.buy_fired = self.sell_fired = False
+        buy = trend == 1 and two_above and not self.buy_fired
+        sell = trend == -1 and two_below and not self.sell_fired
+        self.buy_fired = self.buy_fired or buy
+        self.sell_fired = self.sell_fired or sell
+        self.trend = trend
+        self.prev = (c, e1, e2)
+        return {"ema1": e1, "ema2": e2, "trend": trend, "buySignal": buy, "sellSignal": sell}
+
+
+class HdState(_State):
+    """Incremental hd_strategy, on Heikin-Ashi candles as live_trading feeds it."""
+
+    def __init__(self, ma_length=50, heikin_ashi=True):
+        self.ha = HeikinAshi() if heikin_ashi else None
+        self.sma = SMA(ma_length)
+        self.prev = None   # (high, low, close, buyat, sellat) of the previous bar
+        self.buyat = NAN
+        self.sellat = NAN
+        self.trend = 0
+
+    def update(self, bar):
+        out = self.ha.update(bar) if self.ha is not None else {}
+        high = out.get("high", bar["high"])
+        low = out.get("low", bar["low"])
+        close = out.get("close", bar["close"])
+        out["sma"] = self.sma.update(close)
+        buy = sell = False
+        if self.prev is not None:
+            prev_high, prev_low, prev_close, prev_buyat, prev_sellat = self.prev
+            if prev_high > high and prev_low < low:
+                self.buyat, self.sellat = prev_high, prev_low
+            buy = close > self.buyat and prev_close <= prev_buyat
+            sell = close < self.sellat and prev_close >= prev_sellat
+        if buy:
+            sell = False
+            self.trend = 1
+        elif sell:
+            self.trend = -1
+        self.prev = (high, low, close, self.buyat, self.sellat)
+        out.update({"buyat": self.buyat, "sellat": self.sellat, "trend": self.trend,
+                    "buySignal": buy, "sellSignal": sell})
+        return out
+
+
+class RailwayState(_State):
+    """Incremental railway_track_strategy."""
+
+    def __init__(self, period=20):
+        self.ema_high = EMA(period)
+        self.ema_low = EMA(period)
+        self.prev = None   # (close, emaHigh, emaLow, buyCondRaw, sellCondRaw) of the previous bar
+        self.trend = 0
+
+    def update(self, bar):
+        c = bar["close"]
+        eh, el = self.ema_high.update(bar["high"]), self.ema_low.update(bar["low"])
+        buy_raw = sell_raw = buy = sell = False
+        if self.prev is not None:
+            pc, peh, pel, prev_buy_raw, prev_sell_raw = self.prev
+            buy_raw = pc > peh and c > eh
+            sell_raw = pc < pel and c < el
+            buy = buy_raw and not prev_buy_raw
+            sell = sell_raw and not prev_sell_raw
+        self.trend = 1 if buy else -1 if sell else self.trend
+        self.prev = (c, eh, el, buy_raw, sell_raw)
+        return {"emaHigh": eh, "emaLow": el, "trend": self.trend, "buySignal": buy, "sellSignal": sell}
+
+
+class IndicatorEngine:
+    """
+    Strategy indicator state for one (instrument, interval, strategy).
+    sync(df) commits the closed candles it has not seen yet (O(1) each), then
+    evaluates the forming last candle on a copy of the state, and returns the
+    recent rows in the shape live_trading reads (date, OHLC, indicator columns,
+    trend, buySignal, sellSignal). If the candles no longer contain the last
+    committed bar (gap, first run) the state is reseeded from the whole frame.
+    State is saved as JSON under INDICATOR_STATE_DIR after every commit, so a
+    restart resumes without a full recompute. The batch functions in
+    commonFunction stay the reference (see tests/test_indicatorengine.py).
+    """
+
+    def __init__(self, strategy, instrument_token, interval, state_factory, state_dir=INDICATOR_STATE_DIR, history=5):
+        self.strategy = strategy
+        self.state_factory = state_factory   # the strategy's incremental state class (strategies registry)
+        self.instrument_token = instrument_token
+        self.interval = interval
+        self.state_dir = state_dir
+        self.history = history
+        self._lock = threading.Lock()
+        self.stats = {"commits": 0, "reseeds": 0}
+        self._reset()
+        self._load()
+
+    @property
+    def path(self):
+        return os.path.join(self.state_dir, f"{self.strategy}_{self.instrument_token}_{self.interval}.json")
+
+    def _reset(self):
+        self.state = self.state_factory()
+        self.last_date = None
+        self.recent = deque(maxlen=self.history)
+
+    # ---------- persistence ----------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            self.state.load(saved["state"])
+            self.last_date = pd.Timestamp(saved["last_date"])
+            for row in saved["recent"]:
+                row["date"] = pd.Timestamp(row["date"])
+                self.recent.append(row)
+            logging.info(f"ℹ️ Indicator state {self.strategy} {self.interval} resumed at {self.last_date}")
+        except Exception as e:
+            logging.error(f"Indicator state {self.path} unreadable, will reseed: {e}")
+            self._reset()
+
+    def _save(self):
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            recent = [dict(row, date=row["date"].isoformat()) for row in self.recent]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"last_date": self.last_date.isoformat(), "state": self.state.to_dict(), "recent": recent}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.error(f"Could not save indicator state {self.path}: {e}")
+
+    # ---------- bars ----------
+    @staticmethod
+    def _bar(row):
+        volume = row.get("volume")
+        return {"date": pd.Timestamp(row["date"]), "open": float(row["open"]), "high": float(row["high"]),
+                "low": float(row["low"]), "close": float(row["close"]),
+                "volume": 0.0 if volume is None or pd.isna(volume) else float(volume)}
+
+    def commit(self, row):
+        """Apply one closed candle to the state."""
+        bar = self._bar(row)
+        out = dict(bar, **self.state.update(bar))
+        self.recent.append(out)
+        self.last_date = bar["date"]
+        self.stats["commits"] += 1
+        return out
+
+    def peek(self, row):
+        """Indicator row for a forming candle without changing the state."""
+        bar = self._bar(row)
+        return dict(bar, **copy.deepcopy(self.state).update(bar))
+
+    def sync(self, df):
+        with self._lock:
+            closed = df.iloc[:-1]
+            dates = closed["date"]
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                dates = pd.to_datetime(dates)
+            start = 0
+            if self.last_date is not None and len(dates):
+                last = self.last_date
+                if dates.dt.tz is not None and last.tzinfo is None:
+                    last = last.tz_localize(dates.dt.tz)
+                pos = int(dates.searchsorted(last, side="right"))
+                if pos > 0 and dates.iloc[pos - 1] == last:
+                    start = pos
+                else:
+                    start = None
+            if self.last_date is None or start is None:
+                self._reset()
+                self.stats["reseeds"] += 1
+                start = 0
+                logging.info(f"ℹ️ Indicator state {self.strategy} {self.interval} reseeded from {len(closed)} candles")
+            for row in closed.iloc[start:].to_dict("records"):
+                self.commit(row)
+            if start < len(closed):
+                self._save()
+            rows = list(self.recent)
+            if len(df):
+                rows.append(self.peek(df.iloc[-1].to_dict()))
+            return pd.DataFrame(rows)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_indicator_engine(instrument_token, interval, strategy, state_factory):
+    key = (instrument_token, interval, strategy)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = IndicatorEngine(strategy, instrument_token, interval, state_factory)
+            _engines[key] = engine
+    return engine
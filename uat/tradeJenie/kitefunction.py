@@ -3,8 +3,13 @@ import pandas as pd
 import datetime, time
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from kiteconnect import KiteConnect
-from config import ACCESS_TOKEN_FILE, INSTRUMENTS_FILE, LOG_FILE
+from quotehub import QuoteHub
+from ordertracker import order_tracker, fill_from_update
+from candlestore import CandleStore
+from config import ACCESS_TOKEN_FILE, INSTRUMENTS_FILE, LOG_FILE, KITE_POOL_MAXSIZE, QUOTE_BATCH_SIZE, ORDER_EXECUTOR_WORKERS, LEG_EXECUTION_HEDGE_FIRST, LEG_ACK_TIMEOUT, ORDER_FILL_TIMEOUT
 
 
 logging.basicConfig(
@@ -16,18 +21,76 @@ logging.basicConfig(
 instruments_df = pd.read_csv(INSTRUMENTS_FILE)
 
 
+class KiteClientRegistry:
+    """
+    Process-wide, thread-safe cache of KiteConnect clients keyed by user.
+    Each user keeps one KiteConnect (and so one pooled HTTP session); the
+    token file is re-read only when its mtime changes.
+    """
+
+    def __init__(self, pool_size=KITE_POOL_MAXSIZE):
+        self._lock = threading.Lock()
+        self._clients = {}   # user -> (kite, token_file_mtime)
+        self._pool = {
+            "pool_connections": pool_size,
+            "pool_maxsize": pool_size,
+            "max_retries": 0,
+            "pool_block": False,
+        }
+        self.stats = {"hits": 0, "misses": 0, "reconnects": 0}
+
+    def get(self, user):
+        FILE = user['user'] + "_" + ACCESS_TOKEN_FILE
+        mtime = os.path.getmtime(FILE)
+        with self._lock:
+            cached = self._clients.get(user['user'])
+            if cached and cached[1] == mtime:
+                self.stats["hits"] += 1
+                return cached[0]
+
+            with open(FILE, "r") as f:
+                token_data = json.load(f)
+
+            if cached and cached[0].api_key == token_data["api_key"]:
+                # Token refreshed (fresh login) - keep the pooled session, swap the token
+                kite = cached[0]
+                self.stats["reconnects"] += 1
+                logging.info(f"🔄 {user['user']} | Access token file changed, reusing Kite session with new token")
+            else:
+                kite = KiteConnect(api_key=token_data["api_key"], pool=self._pool)
+                self.stats["misses"] += 1
+            kite.set_access_token(token_data["access_token"])
+            self._clients[user['user']] = (kite, mtime)
+            return kite
+
+    def invalidate(self, user=None):
+        with self._lock:
+            if user is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(user['user'], None)
+
+
+kite_clients = KiteClientRegistry()
+
+
 def get_kite_client(user):
     try:
-        FILE = user['user'] + "_" + ACCESS_TOKEN_FILE
-        with open(FILE, "r") as f:
-            token_data = json.load(f)
-        kite = KiteConnect(api_key=token_data["api_key"])
-        kite.set_access_token(token_data["access_token"])
-        return kite
+        return kite_clients.get(user)
     except Exception as e:
         print("❌ Could not load access token:", e)
         logging.error(f"Error loading access token: {e}")
         return None
+
+
+def get_kite_client_stats():
+    return dict(kite_clients.stats)
+
+
+quote_hub = QuoteHub(client_provider=get_kite_client)
+
+# Shared pool for concurrent order legs across all user/config threads
+_order_executor = ThreadPoolExecutor(max_workers=ORDER_EXECUTOR_WORKERS, thread_name_prefix="OrderLeg")
     
 
 def get_profile(user):
@@ -59,7 +122,21 @@ def get_token_for_symbol(symbol):
 
 
 
+def fetch_historical_candles(instrument_token, from_date, to_date, interval, user):
+    kite = get_kite_client(user)
+    return kite.historical_data(instrument_token, from_date, to_date, interval)
+
+
+candle_store = CandleStore(fetch=fetch_historical_candles)
+
+
 def get_historical_df(instrument_token, interval, days, user):
+    """Last `days` days of candles, served from the shared incremental candle store."""
+    return candle_store.get(instrument_token, interval, days, user)
+
+
+def get_historical_df_raw(instrument_token, interval, days, user):
+    """Full historical_data download, bypassing the candle store (for reconciliation)."""
     kite = get_kite_client(user)
     now = datetime.datetime.now()
     from_date = (now - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
@@ -68,12 +145,24 @@ def get_historical_df(instrument_token, interval, days, user):
     return pd.DataFrame(data)
 
 
-def get_quotes(symbol, user):
+def get_quotes(symbol, user, max_age=None):
+    """
+    LTP for an NFO symbol. Served from the shared quote hub snapshot when it is
+    fresher than max_age (default QUOTE_MAX_AGE); otherwise one direct REST call
+    which also seeds the snapshot.
+    """
+    full_symbol = f"NFO:{symbol}"
+    quote_hub.subscribe([full_symbol], user)
+    ltp = quote_hub.get(full_symbol, max_age)
+    if ltp is not None:
+        return ltp
+
     kite = get_kite_client(user)
     try:
-        full_symbol = f"NFO:{symbol}"
         quote = kite.ltp([full_symbol])
-        return quote[full_symbol]['last_price']
+        ltp = quote[full_symbol]['last_price']
+        quote_hub.update({full_symbol: ltp})
+        return ltp
     except Exception as e:
         print(f"❌ Error fetching quote for {symbol}: {e}")
         logging.error(f"{user['user']}  | Error fetching quote for {symbol}: {e}")
@@ -81,6 +170,28 @@ def get_quotes(symbol, user):
 
 
 
+def get_quotes_batch(symbols, user):
+    """
+    LTP for many NFO symbols with one kite.ltp request (chunked at QUOTE_BATCH_SIZE).
+    Returns {symbol: last_price}; the prices also refresh the quote hub snapshot.
+    """
+    if not symbols:
+        return {}
+    kite = get_kite_client(user)
+    try:
+        full_symbols = [f"NFO:{s}" for s in symbols]
+        quote = {}
+        for i in range(0, len(full_symbols), QUOTE_BATCH_SIZE):
+            quote.update(kite.ltp(full_symbols[i:i + QUOTE_BATCH_SIZE]))
+        prices = {s: quote[f]['last_price'] for s, f in zip(symbols, full_symbols) if f in quote}
+        quote_hub.update({f"NFO:{s}": p for s, p in prices.items()})
+        return prices
+    except Exception as e:
+        print(f"❌ Error fetching batch quotes for {len(symbols)} symbols: {e}")
+        logging.error(f"{user['user']}  | Error fetching batch quotes for {len(symbols)} symbols: {e}")
+        return {}
+
+
 def get_avgprice_from_positions(tradingsymbol, user):
     kite = get_kite_client(user)
     try:
@@ -103,12 +214,14 @@ def get_avgprice_from_positions(tradingsymbol, user):
     return None, 0
 
 
-def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, timeout=5):
+def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, timeout=5, on_ack=None):
     
     print(config)
     if config['REAL_TRADE'].lower() != "yes":
         print(f"⚠️ {config['KEY']} | Simulated Aggressive Limit Order placed (REAL_TRADE is not YES)")
         logging.info(f"⚠️ {config['KEY']} | Simulated Aggressive Limit Order placed (REAL_TRADE is not YES)")
+        if on_ack:
+            on_ack("SIMULATED_ORDER")
         return "SIMULATED_ORDER", None, 0
 
     kite = get_kite_client(user)
@@ -118,6 +231,7 @@ def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, ti
     filled_qty = 0
     avg_price = 0.0
     order_id = None
+    live = order_tracker.is_live(user)
     start_time = time.time()
 
     try:
@@ -128,12 +242,12 @@ def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, ti
             if ordertype.upper() == "SELL":
                 best_price = depth.get("buy", [{}])[0].get("price")
                 if best_price is None:
-                    best_price = get_quotes(tradingsymbol, user)
+                    best_price = get_quotes(tradingsymbol, user, max_age=0)
                 limit_price = round(best_price - 0.05, 1)  # slightly aggressive
             else:
                 best_price = depth.get("sell", [{}])[0].get("price")
                 if best_price is None:
-                    best_price = get_quotes(tradingsymbol, user)
+                    best_price = get_quotes(tradingsymbol, user, max_age=0)
                 limit_price = round(best_price + 0.05, 1)  # slightly aggressive
 
             if not order_id:  # first time, place order
@@ -147,6 +261,8 @@ def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, ti
                     price=limit_price,
                     product=kite.PRODUCT_NRML
                 )
+                if on_ack:
+                    on_ack(order_id)
             else:  # modify if already placed
                 kite.modify_order(
                     variety=kite.VARIETY_REGULAR,
@@ -155,19 +271,27 @@ def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, ti
                 )
 
             # Check fills
-            history = get_historical_order(order_id, user)
-            if history:
-                filled_qty = sum(o["quantity"] for o in history if o["status"] == "COMPLETE")
-                if filled_qty > 0:
-                    avg_price = sum(
-                        o["average_price"] * o["quantity"] for o in history if o["status"] == "COMPLETE") / filled_qty
-                    avg_price = round(avg_price, 2)
-                if filled_qty >= int(qty):
-                    print(f"✅{config['KEY']} | Aggressive Limit Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
-                    logging.info(f"✅{config['KEY']} | Aggressive Limit Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
-                    return order_id, avg_price, filled_qty
+            if live:
+                # Wakes as soon as the order completes instead of polling order_history
+                update = order_tracker.wait_fill(order_id, 0.3) or order_tracker.latest(order_id)
+                if update:
+                    filled_qty, avg_price = fill_from_update(update)
+                    avg_price = avg_price or 0.0
+            else:
+                history = get_historical_order(order_id, user)
+                if history:
+                    filled_qty = sum(o["quantity"] for o in history if o["status"] == "COMPLETE")
+                    if filled_qty > 0:
+                        avg_price = sum(
+                            o["average_price"] * o["quantity"] for o in history if o["status"] == "COMPLETE") / filled_qty
+                        avg_price = round(avg_price, 2)
+            if filled_qty >= int(qty):
+                print(f"✅{config['KEY']} | Aggressive Limit Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
+                logging.info(f"✅{config['KEY']} | Aggressive Limit Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
+                return order_id, avg_price, filled_qty
 
-            time.sleep(0.3)  # short polling delay
+            if not live:
+                time.sleep(0.3)  # short polling delay
 
         # Timeout reached - cancel unfilled qty
         if filled_qty < int(qty) and order_id:
@@ -188,6 +312,9 @@ def place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, ti
         print(f"❌ {config['KEY']} | Aggressive Limit Order failed: {e}")
         logging.error(f"{config['KEY']} | Aggressive Limit Order failed: {e}")
         return "SIMULATED_ORDER", None, 0
+    finally:
+        if order_id:
+            order_tracker.forget(order_id)
 
 
 
@@ -219,13 +346,16 @@ def get_historical_order(order_id, user):
         logging.error(f"Error fetching order history for {order_id}: {e}")
         return []
 
-def place_option_market_order(tradingsymbol, qty, ordertype, config, user):
+def place_option_market_order(tradingsymbol, qty, ordertype, config, user, on_ack=None):
     if config['REAL_TRADE'].lower() != "yes":
         print(f"⚠️ {config['KEY']} | Simulated Market Order placed (REAL_TRADE is not YES)")
         logging.info(f"⚠️ {config['KEY']} | Simulated Market Order placed (REAL_TRADE is not YES)")
+        if on_ack:
+            on_ack("SIMULATED_ORDER")
         return "SIMULATED_ORDER", None, 0
 
     kite = get_kite_client(user)
+    order_id = None
     try:
         tx_type = kite.TRANSACTION_TYPE_SELL if ordertype.upper() == "SELL" else kite.TRANSACTION_TYPE_BUY
         order_id = kite.place_order(
@@ -237,23 +367,33 @@ def place_option_market_order(tradingsymbol, qty, ordertype, config, user):
             order_type=kite.ORDER_TYPE_MARKET,
             product=kite.PRODUCT_NRML
         )
-        history = get_historical_order(order_id, user)
-        if history:
-            filled_qty = sum(o["quantity"] for o in history if o["status"] == "COMPLETE")
-            if filled_qty > 0:
-                avg_price = sum(
-                    o["average_price"] * o["quantity"] for o in history if o["status"] == "COMPLETE") / filled_qty
-                avg_price = round(avg_price, 2)
-            if filled_qty >= int(qty):
-                
-                print(f"✅{config['KEY']} | Market Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
-                logging.info(f"✅{config['KEY']} | Market Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
+        if on_ack:
+            on_ack(order_id)
+        avg_price, filled_qty = None, 0
+        update = order_tracker.wait_fill(order_id, ORDER_FILL_TIMEOUT) if order_tracker.is_live(user) else None
+        if update:
+            # Fill price straight from the order-update stream
+            filled_qty, avg_price = fill_from_update(update)
+        else:
+            history = get_historical_order(order_id, user)
+            if history:
+                filled_qty = sum(o["quantity"] for o in history if o["status"] == "COMPLETE")
+                if filled_qty > 0:
+                    avg_price = sum(
+                        o["average_price"] * o["quantity"] for o in history if o["status"] == "COMPLETE") / filled_qty
+                    avg_price = round(avg_price, 2)
+        if filled_qty >= int(qty):
+            print(f"✅{config['KEY']} | Market Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
+            logging.info(f"✅{config['KEY']} | Market Order Placed: {ordertype} {tradingsymbol} | Order ID: {order_id}")
         return order_id, avg_price, filled_qty
         
     except Exception as e:
         print(f"❌{config['KEY']} | Market Order failed for {tradingsymbol}: {e}")
         logging.error(f"{config['KEY']} | Market Order failed for {tradingsymbol}: {e}")
         return "SIMULATED_ORDER", None, 0
+    finally:
+        if order_id:
+            order_tracker.forget(order_id)
 
 
 #Only limit order 
@@ -263,14 +403,14 @@ def place_option_hybrid_order_old(tradingsymbol, qty, ordertype,config , user):
 
 
 #Hybrid order: Try market first, then aggressive limit if not filled
-def place_option_hybrid_order(tradingsymbol, qty, ordertype,config , user):
+def place_option_hybrid_order(tradingsymbol, qty, ordertype,config , user, on_ack=None):
     
-    order_id, avg_price, filled_qty = place_option_market_order(tradingsymbol, qty, ordertype,config , user)
+    order_id, avg_price, filled_qty = place_option_market_order(tradingsymbol, qty, ordertype,config , user, on_ack=on_ack)
     if order_id and order_id != "SIMULATED_ORDER":
         return order_id, avg_price, filled_qty
     else:
         logging.info(f"⚠️{config['KEY']} | market order not filled for {tradingsymbol}, {order_id}, {avg_price}, {filled_qty}, placing market order")
-        order_id, avg_price, filled_qty = place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user)
+        order_id, avg_price, filled_qty = place_aggressive_limit_order(tradingsymbol, qty, ordertype, config, user, on_ack=on_ack)
         return order_id, avg_price, filled_qty
    
 
@@ -292,25 +432,68 @@ def place_basket_order(orders, config, user):
     return results
 
 
+class LegOrderAborted(Exception):
+    """The protective first leg was not placed, so the remaining legs were not sent."""
 
 
+def _leg_placed(order_id, config):
+    # "SIMULATED_ORDER" is the failure sentinel on a real trade, the normal result on a simulated one
+    return bool(order_id) and (order_id != "SIMULATED_ORDER" or config['REAL_TRADE'].lower() != "yes")
 
 
+def place_multi_leg_order(legs, config, user, hedge_first=LEG_EXECUTION_HEDGE_FIRST, ack_timeout=LEG_ACK_TIMEOUT):
+    """
+    Submit several legs concurrently on the shared order executor.
+    legs: [(tradingsymbol, qty, ordertype)] in margin-safe order - the protective
+    leg first (hedge BUY on entry, short buy-back on exit).
+    With hedge_first the remaining legs are only sent once the first leg is
+    acknowledged by the exchange with an order id (not after it fills); the
+    fills are then awaited in parallel. If the first leg fails, or neither acks
+    nor returns an order id, nothing else is sent and LegOrderAborted is raised,
+    so a short is never left without its hedge. Returns
+    [(order_id, avg_price, filled_qty)] in the same order as legs.
+    """
+    if not legs:
+        return []
+    started = time.time()
+    first_ack = threading.Event()
+    acked = []
+
+    def on_first_ack(order_id):
+        acked.append(order_id)
+        first_ack.set()
+
+    def submit(leg, on_ack=None):
+        tradingsymbol, qty, ordertype = leg
+        return _order_executor.submit(place_option_hybrid_order, tradingsymbol, qty, ordertype, config, user, on_ack=on_ack)
+
+    futures = [submit(legs[0], on_first_ack if hedge_first else None)]
+    if hedge_first and len(legs) > 1:
+        # Also wake up when the first leg returns without an ack (it failed)
+        futures[0].add_done_callback(lambda f: first_ack.set())
+        if not first_ack.wait(ack_timeout):
+            logging.warning(f"⚠️{config['KEY']} | No ack for {legs[0][0]} in {ack_timeout}s, waiting for the order to return")
+        if not any(_leg_placed(order_id, config) for order_id in acked):
+            try:
+                first = futures[0].result()
+            except Exception as e:
+                first = (None, None, 0)
+                logging.error(f"{config['KEY']} | Leg {legs[0][2]} {legs[0][0]} failed: {e}")
+            if not _leg_placed(first[0], config):
+                message = (f"{config['KEY']} | Protective leg {legs[0][2]} {legs[0][0]} was not placed ({first[0]}), "
+                           f"not sending {[(l[2], l[0]) for l in legs[1:]]}")
+                print(f"❌{message}")
+                logging.error(message)
+                raise LegOrderAborted(message)
+    futures += [submit(leg) for leg in legs[1:]]
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    results = []
+    for leg, future in zip(legs, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"❌{config['KEY']} | Leg {leg[2]} {leg[0]} failed: {e}")
+            logging.error(f"{config['KEY']} | Leg {leg[2]} {leg[0]} failed: {e}")
+            results.append(("SIMULATED_ORDER", None, 0))
+    logging.info(f"ℹ️{config['KEY']} | {len(legs)} legs executed in {time.time() - started:.2f}s: {[(l[2], l[0]) for l in legs]}")
+    return results
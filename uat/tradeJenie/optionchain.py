@@ -0,0 +1,189 @@
+import os
+import datetime
+import threading
+import logging
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict
+import pandas as pd
+from config import INSTRUMENTS_FILE, LOG_FILE, OPTION_SYMBOL, SEGMENT
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+OptionContract = namedtuple("OptionContract", ["tradingsymbol", "instrument_token", "strike", "expiry", "opt_type", "lot_size"])
+
+
+class OptionChainIndex:
+    """
+    Option chain for OPTION_SYMBOL/SEGMENT built once from the instruments file.
+    Contracts are keyed by (opt_type, expiry, strike) with expiries parsed to
+    datetime.date, and per-type sorted expiry and per-expiry sorted strike lists,
+    so every lookup is a dict access or a bisect.
+    """
+
+    def __init__(self, instruments_df, name=OPTION_SYMBOL, segment=SEGMENT):
+        df = instruments_df[(instruments_df['name'] == name) & (instruments_df['segment'] == segment)]
+
+        self.contracts = {}      # (opt_type, expiry, strike) -> OptionContract
+        self.expiries = {}       # opt_type -> sorted [expiry]
+        self.strikes = {}        # (opt_type, expiry) -> sorted [strike]
+        self.strike_set = {}     # opt_type -> {strike}
+        self.lot_sizes = {}      # expiry -> lot_size
+        expiry_sets = {}
+
+        expiry_dates = pd.to_datetime(df['expiry']).dt.date
+        for symbol, token, strike, expiry, lot_size in zip(df['tradingsymbol'], df['instrument_token'], df['strike'],
+                                                           expiry_dates, df['lot_size']):
+            opt_type = symbol[-2:]
+            strike = int(round(strike))
+            contract = OptionContract(symbol, int(token), strike, expiry, opt_type, int(lot_size))
+            self.contracts[(opt_type, expiry, strike)] = contract
+            expiry_sets.setdefault(opt_type, set()).add(expiry)
+            self.strikes.setdefault((opt_type, expiry), []).append(strike)
+            self.strike_set.setdefault(opt_type, set()).add(strike)
+            self.lot_sizes.setdefault(expiry, int(lot_size))
+
+        for opt_type, expiries in expiry_sets.items():
+            self.expiries[opt_type] = sorted(expiries)
+        for k in self.strikes:
+            self.strikes[k] = sorted(set(self.strikes[k]))
+        self.all_expiries = sorted(self.lot_sizes)
+
+    def get(self, opt_type, expiry, strike):
+        return self.contracts.get((opt_type, expiry, int(strike)))
+
+    def has_strike(self, opt_type, strike):
+        return int(strike) in self.strike_set.get(opt_type, ())
+
+    def expiries_between(self, opt_type, start, end):
+        """Listed expiries with start <= expiry <= end (all option types if opt_type is None)."""
+        expiries = self.all_expiries if opt_type is None else self.expiries.get(opt_type, [])
+        return expiries[bisect_left(expiries, start):bisect_right(expiries, end)]
+
+    def expiries_after(self, opt_type, date):
+        expiries = self.expiries.get(opt_type, [])
+        return expiries[bisect_right(expiries, date):]
+
+    def first_contract_between(self, opt_type, strike, start, end):
+        """Nearest-expiry contract for this strike with expiry in [start, end]."""
+        for expiry in self.expiries_between(opt_type, start, end):
+            contract = self.get(opt_type, expiry, strike)
+            if contract:
+                return contract
+        return None
+
+
+class ExpiryCalendar:
+    """
+    Resolves a config EXPIRY type (NEXT_WEEK / NEXT_TO_NEXT_WEEK / LAST / this week)
+    to the concrete expiry date listed in the instruments file, memoized per day.
+    Weekly types pick the listed expiry inside the target Tuesday's week, so
+    holiday-shifted expiries (e.g. Monday) are found; LAST is the last listed
+    expiry of the reference month. If nothing is listed (historical dates)
+    the nominal Tuesday is returned.
+    """
+    WEEK_OFFSETS = {"NEXT_WEEK": 7, "NEXT_TO_NEXT_WEEK": 14}
+
+    def __init__(self, index):
+        self.index = index
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def nominal_expiry(self, expiry_type, as_of):
+        if expiry_type == "LAST":
+            if as_of.day <= 15:
+                month_ref = as_of.replace(day=1)
+            else:
+                month_ref = (as_of.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            next_month = month_ref.replace(day=28) + datetime.timedelta(days=4)
+            last_day_of_month = next_month - datetime.timedelta(days=next_month.day)
+            return last_day_of_month - datetime.timedelta(days=(last_day_of_month.weekday() - 1) % 7)
+        days_until_tuesday = (1 - as_of.weekday() + 7) % 7
+        this_week_tuesday = as_of + datetime.timedelta(days=days_until_tuesday)
+        return this_week_tuesday + datetime.timedelta(days=self.WEEK_OFFSETS.get(expiry_type, 0))
+
+    def _resolve(self, expiry_type, as_of):
+        target = self.nominal_expiry(expiry_type, as_of)
+        if expiry_type == "LAST":
+            month_start = target.replace(day=1)
+            listed = self.index.expiries_between(None, month_start, target.replace(day=28) + datetime.timedelta(days=4))
+            listed = [e for e in listed if e.month == target.month and e >= as_of]
+            return listed[-1] if listed else target
+        week_start = target - datetime.timedelta(days=target.weekday())
+        week_end = week_start + datetime.timedelta(days=6)
+        listed = [e for e in self.index.expiries_between(None, week_start, week_end) if e >= as_of]
+        return listed[0] if listed else target
+
+    def __getstate__(self):
+        # Picklable for process pools (backtest sweeps); the lock is per process
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def resolve(self, expiry_type, as_of=None):
+        as_of = as_of or datetime.date.today()
+        key = (expiry_type, as_of)
+        with self._lock:
+            expiry = self._cache.get(key)
+            if expiry is None:
+                expiry = self._resolve(expiry_type, as_of)
+                self._cache[key] = expiry
+                logging.info(f"ℹ️ Expiry {expiry_type} as of {as_of} resolved to {expiry}")
+            return expiry
+
+
+_indexes = OrderedDict()   # source key -> (instruments_df or None, OptionChainIndex, ExpiryCalendar)
+_INDEX_CACHE_SIZE = 4      # sources kept: INSTRUMENTS_FILE plus the frames callers pass in
+_index_lock = threading.Lock()
+
+
+def _cached_chain(instruments_df):
+    today = datetime.date.today()
+    if instruments_df is None:
+        try:
+            mtime = os.path.getmtime(INSTRUMENTS_FILE)
+        except OSError:
+            mtime = None
+        key = ("file", today, mtime)
+    else:
+        # The entry holds the frame, so its id cannot be reused while cached
+        key = ("frame", today, id(instruments_df))
+    with _index_lock:
+        entry = _indexes.get(key)
+        if entry is None or entry[0] is not instruments_df:
+            frame = pd.read_csv(INSTRUMENTS_FILE) if instruments_df is None else instruments_df
+            index = OptionChainIndex(frame)
+            entry = (instruments_df, index, ExpiryCalendar(index))
+            _indexes[key] = entry
+            while len(_indexes) > _INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+            logging.info(f"ℹ️ Option chain index built: {len(index.contracts)} contracts, {len(index.all_expiries)} expiries")
+        else:
+            _indexes.move_to_end(key)
+        return entry
+
+
+def get_option_chain_index(instruments_df=None):
+    """
+    Shared OptionChainIndex, rebuilt once per trading day. Without
+    instruments_df it is built from INSTRUMENTS_FILE (and rebuilt when the
+    file is refreshed); a given instruments_df gets its own index, cached
+    for as long as the same frame object is passed.
+    """
+    return _cached_chain(instruments_df)[1]
+
+
+def get_expiry_calendar(instruments_df=None):
+    return _cached_chain(instruments_df)[2]
+
+
+def resolve_expiry(expiry_type, instruments_df=None, as_of=None):
+    """Concrete expiry date (datetime.date) for a config EXPIRY type."""
+    return get_expiry_calendar(instruments_df).resolve(expiry_type, as_of)
@@ -0,0 +1,113 @@
+import time
+import threading
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from config import LOG_FILE, ORDER_UPDATE_TTL
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class OrderTracker:
+    """
+    Order state fed by the ticker's order-update (postback) events.
+    Each order ID gets a Future resolved with the first terminal update
+    (COMPLETE / CANCELLED / REJECTED); partial fills are kept as the latest
+    state. Updates that arrive before the caller starts waiting (place_order
+    can return after the websocket push) are kept until the order is expected.
+    Entries leave on forget() (every exit of the order functions); updates
+    for orders nobody expects within ORDER_UPDATE_TTL seconds (placed from
+    another process or the Kite app) are dropped.
+    """
+    TERMINAL = ("COMPLETE", "CANCELLED", "REJECTED")
+
+    def __init__(self, ttl=ORDER_UPDATE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._orders = {}   # order_id -> {"future", "latest", "expected", "seen"}
+        self._swept = time.monotonic()
+        self._live = set()  # user names whose ticker connection is delivering updates
+        self.stats = {"updates": 0, "fills": 0, "timeouts": 0, "dropped": 0}
+
+    def _entry(self, order_id):
+        entry = self._orders.get(order_id)
+        if entry is None:
+            # expected: a caller registered it via expect(); seen: monotonic time of creation
+            entry = {"future": Future(), "latest": None, "expected": False, "seen": time.monotonic()}
+            self._orders[order_id] = entry
+        return entry
+
+    def _sweep(self, now):
+        """Caller holds self._lock; drop updates for orders no caller expected within ttl."""
+        if now - self._swept < self.ttl:
+            return
+        self._swept = now
+        stale = [oid for oid, e in self._orders.items() if not e["expected"] and now - e["seen"] > self.ttl]
+        for oid in stale:
+            del self._orders[oid]
+        self.stats["dropped"] += len(stale)
+
+    # ---------- connection state ----------
+    def set_live(self, user_name, live):
+        with self._lock:
+            if live:
+                self._live.add(user_name)
+            else:
+                self._live.discard(user_name)
+
+    def is_live(self, user):
+        return user['user'] in self._live
+
+    # ---------- updates ----------
+    def on_order_update(self, ws, data):
+        """KiteTicker on_order_update callback."""
+        order_id = data.get("order_id")
+        if not order_id:
+            return
+        with self._lock:
+            self._sweep(time.monotonic())
+            entry = self._entry(order_id)
+            entry["latest"] = data
+            self.stats["updates"] += 1
+        if data.get("status") in self.TERMINAL and not entry["future"].done():
+            entry["future"].set_result(data)
+            self.stats["fills"] += data.get("status") == "COMPLETE"
+            logging.info(f"ℹ️ Order {order_id} {data.get('status')} | filled {data.get('filled_quantity')} @ {data.get('average_price')}")
+
+    # ---------- consumers ----------
+    def expect(self, order_id):
+        """Future resolved with the terminal order update for order_id."""
+        with self._lock:
+            entry = self._entry(order_id)
+            entry["expected"] = True
+            return entry["future"]
+
+    def latest(self, order_id):
+        with self._lock:
+            entry = self._orders.get(order_id)
+            return entry["latest"] if entry else None
+
+    def wait_fill(self, order_id, timeout):
+        """Terminal update for order_id, or None if it doesn't arrive within timeout seconds."""
+        try:
+            return self.expect(order_id).result(timeout=timeout)
+        except FutureTimeoutError:
+            self.stats["timeouts"] += 1
+            return None
+
+    def forget(self, order_id):
+        with self._lock:
+            self._orders.pop(order_id, None)
+
+
+def fill_from_update(update):
+    """(filled_qty, avg_price) from an order update, (0, None) if nothing is filled."""
+    if not update or not update.get("filled_quantity"):
+        return 0, None
+    return int(update["filled_quantity"]), round(float(update.get("average_price") or 0.0), 2)
+
+
+order_tracker = OrderTracker()
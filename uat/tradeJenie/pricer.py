@@ -0,0 +1,313 @@
+"""
+Vectorized Black-76 option pricer for simulation and backtests when no option
+history is available.
+
+Everything works on NumPy arrays and broadcasts, so a whole strike ladder (or a
+bars x strikes premium grid) is priced in one call. The forward is
+spot x exp(rate x T) and premiums are discounted at the same rate; T runs to
+15:30 on the expiry date, in calendar years. Volatility comes from a VolSurface
+(flat, parametric smile, or fitted from implied vols of recorded premiums),
+optionally re-levelled to an ATM volatility series such as India VIX.
+VolSurface.calibrate fits the surface to a recorded option chain
+(recorder.ChainStore).
+
+ModelOptionPriceSource plugs the model into backtest.Backtester, so
+get_optimal_option's strike walk and the H-P10 / H-M100 / H-M200 hedges can be
+replayed offline.
+"""
+import math
+import numpy as np
+import pandas as pd
+from backtest import InstrumentsPriceSource
+from commonFunction import _parse_interval_to_minutes
+from config import OPTION_SYMBOL, OPTION_MODEL_VOL, OPTION_MODEL_RATE, OPTION_MODEL_LOT_SIZE
+
+YEAR_SECONDS = 365.0 * 24 * 3600
+EXPIRY_CLOSE = pd.Timedelta(hours=15, minutes=30)
+MIN_T = 1e-9   # years; below this a contract is priced at intrinsic value
+
+
+# ---------- Black-76 ----------
+def norm_pdf(x):
+    return np.exp(-0.5 * np.square(x)) / math.sqrt(2 * math.pi)
+
+
+def norm_cdf(x):
+    """Standard normal CDF (Abramowitz & Stegun 26.2.17, |error| < 7.5e-8), vectorized."""
+    x = np.asarray(x, dtype=np.float64)
+    a = np.abs(x)
+    t = 1.0 / (1.0 + 0.2316419 * a)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    tail = norm_pdf(a) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def _d1_d2(forward, strike, t, sigma):
+    sd = sigma * np.sqrt(np.maximum(t, MIN_T))
+    d1 = (np.log(forward / strike) + 0.5 * sd * sd) / sd
+    return d1, d1 - sd
+
+
+def black76(forward, strike, t, sigma, is_call, rate=OPTION_MODEL_RATE):
+    """Premium of calls (is_call True) / puts on a forward; all arguments broadcast."""
+    forward, strike, t, sigma = (np.asarray(a, dtype=np.float64) for a in (forward, strike, t, sigma))
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    discount = np.exp(-rate * np.maximum(t, 0.0))
+    call = discount * (forward * norm_cdf(d1) - strike * norm_cdf(d2))
+    put = discount * (strike * norm_cdf(-d2) - forward * norm_cdf(-d1))
+    price = np.where(is_call, call, put)
+    intrinsic = np.where(is_call, np.maximum(forward - strike, 0.0), np.maximum(strike - forward, 0.0))
+    return np.where(t > MIN_T, price, intrinsic)
+
+
+def vega76(forward, strike, t, sigma, rate=OPTION_MODEL_RATE):
+    forward, strike, t, sigma = (np.asarray(a, dtype=np.float64) for a in (forward, strike, t, sigma))
+    d1, _ = _d1_d2(forward, strike, t, sigma)
+    return np.exp(-rate * t) * forward * norm_pdf(d1) * np.sqrt(np.maximum(t, MIN_T))
+
+
+def implied_vol(price, forward, strike, t, is_call, rate=OPTION_MODEL_RATE, tol=1e-6, iterations=50,
+                low=1e-4, high=5.0):
+    """
+    Black-76 implied volatility, vectorized: Newton steps safeguarded by a
+    bisection bracket. NaN where the premium is outside the no-arbitrage range
+    or the contract has expired.
+    """
+    price, forward, strike, t = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                     for a in (price, forward, strike, t)))
+    is_call = np.broadcast_to(is_call, price.shape)
+    discount = np.exp(-rate * t)
+    intrinsic = discount * np.where(is_call, np.maximum(forward - strike, 0.0), np.maximum(strike - forward, 0.0))
+    upper = discount * np.where(is_call, forward, strike)
+    valid = (t > MIN_T) & (price > intrinsic) & (price < upper)
+
+    lo = np.full(price.shape, low)
+    hi = np.full(price.shape, high)
+    # Brenner-Subrahmanyam start, clipped into the bracket
+    sigma = np.clip(math.sqrt(2 * math.pi) * price / (forward * np.sqrt(np.maximum(t, MIN_T))), 0.05, 2.0)
+    for _ in range(iterations):
+        diff = black76(forward, strike, t, sigma, is_call, rate) - price
+        if np.all(~valid | (np.abs(diff) < tol)):
+            break
+        lo = np.where(diff < 0, sigma, lo)
+        hi = np.where(diff > 0, sigma, hi)
+        vega = vega76(forward, strike, t, sigma, rate)
+        newton = sigma - diff / np.where(vega > 1e-12, vega, np.nan)
+        sigma = np.where((newton > lo) & (newton < hi), newton, 0.5 * (lo + hi))
+    return np.where(valid, sigma, np.nan)
+
+
+def year_fraction(times, expiry):
+    """Years from each time (datetime-like) to 15:30 on the expiry date, floored at 0."""
+    expiry_close = pd.Timestamp(expiry).normalize() + EXPIRY_CLOSE
+    times = pd.DatetimeIndex(np.atleast_1d(np.asarray(times, dtype="datetime64[ns]")))
+    return np.maximum((expiry_close - times).total_seconds().to_numpy() / YEAR_SECONDS, 0.0)
+
+
+# ---------- volatility surface ----------
+class VolSurface:
+    """
+    Implied volatility on a (tenor in years) x (log-moneyness log(K/F)) grid,
+    bilinear in between and flat beyond the edge nodes.
+    """
+
+    def __init__(self, tenors, moneyness, vols):
+        self.tenors = np.asarray(tenors, dtype=np.float64)
+        self.moneyness = np.asarray(moneyness, dtype=np.float64)
+        self.vols = np.asarray(vols, dtype=np.float64).reshape(len(self.tenors), len(self.moneyness))
+
+    @classmethod
+    def flat(cls, sigma=OPTION_MODEL_VOL):
+        return cls([0.0], [0.0], [[sigma]])
+
+    @classmethod
+    def parametric(cls, atm=OPTION_MODEL_VOL, skew=-0.2, smile=1.0, tenors=(1 / 365, 7 / 365, 30 / 365, 90 / 365),
+                   moneyness=np.linspace(-0.15, 0.15, 13)):
+        """atm + skew * m + smile * m^2 at every tenor (m = log-moneyness), floored at 1%."""
+        m = np.asarray(moneyness, dtype=np.float64)
+        row = np.maximum(atm + skew * m + smile * m * m, 0.01)
+        return cls(tenors, m, np.tile(row, (len(tenors), 1)))
+
+    @classmethod
+    def fit(cls, moneyness, tenor, iv, tenors=(1 / 365, 7 / 365, 30 / 365, 90 / 365),
+            nodes=np.linspace(-0.15, 0.15, 13)):
+        """
+        Surface from observed implied vols (e.g. implied_vol() of recorded
+        premiums): each observation is averaged into its nearest node, empty
+        nodes take the nearest filled node along moneyness, then tenor.
+        """
+        tenors, nodes = np.asarray(tenors, dtype=np.float64), np.asarray(nodes, dtype=np.float64)
+        moneyness, tenor, iv = (np.asarray(a, dtype=np.float64).ravel() for a in (moneyness, tenor, iv))
+        ok = np.isfinite(iv) & np.isfinite(moneyness) & np.isfinite(tenor)
+        if not ok.any():
+            return cls.flat()
+        ti = np.abs(tenor[ok, None] - tenors[None, :]).argmin(axis=1)
+        mi = np.abs(moneyness[ok, None] - nodes[None, :]).argmin(axis=1)
+        total = np.zeros((len(tenors), len(nodes)))
+        count = np.zeros_like(total)
+        np.add.at(total, (ti, mi), iv[ok])
+        np.add.at(count, (ti, mi), 1)
+        vols = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        for grid in (vols, vols.T):
+            for row in grid:
+                filled = np.flatnonzero(np.isfinite(row))
+                if len(filled):
+                    nearest = filled[np.abs(np.arange(len(row))[:, None] - filled[None, :]).argmin(axis=1)]
+                    row[:] = row[nearest]
+        vols[np.isnan(vols)] = np.nanmean(iv[ok])
+        return cls(tenors, nodes, vols)
+
+    @classmethod
+    def calibrate(cls, store, dates=None, rate=OPTION_MODEL_RATE, field="ltp", every=300, **fit_args):
+        """
+        fit() to the recorded option chain (a recorder.ChainStore): implied
+        vols of the out-of-the-money contracts, one snapshot per `every`
+        seconds, over `dates` (all recorded dates by default).
+        """
+        samples = [chain_implied_vols(partition, rate, field, every) for partition in store.partitions(dates)]
+        if not samples:
+            return cls.flat()
+        moneyness, tenor, iv = (np.concatenate(parts) for parts in zip(*samples))
+        return cls.fit(moneyness, tenor, iv, **fit_args)
+
+    @staticmethod
+    def _locate(nodes, x):
+        if len(nodes) == 1:
+            return np.zeros(x.shape, dtype=int), np.zeros(x.shape)
+        i = np.clip(np.searchsorted(nodes, x) - 1, 0, len(nodes) - 2)
+        w = np.clip((x - nodes[i]) / (nodes[i + 1] - nodes[i]), 0.0, 1.0)
+        return i, w
+
+    def vol(self, moneyness, tenor):
+        m, t = np.broadcast_arrays(np.asarray(moneyness, dtype=np.float64), np.asarray(tenor, dtype=np.float64))
+        ti, tw = self._locate(self.tenors, t)
+        mi, mw = self._locate(self.moneyness, m)
+        t1 = np.minimum(ti + 1, len(self.tenors) - 1)
+        m1 = np.minimum(mi + 1, len(self.moneyness) - 1)
+        v = self.vols
+        near = v[ti, mi] * (1 - mw) + v[ti, m1] * mw
+        far = v[t1, mi] * (1 - mw) + v[t1, m1] * mw
+        return near * (1 - tw) + far * tw
+
+
+def chain_implied_vols(partition, rate=OPTION_MODEL_RATE, field="ltp", every=300, min_premium=0.5):
+    """
+    (log-moneyness, tenor, implied vol) of a recorded chain partition's
+    out-of-the-money rows with a premium of at least min_premium, keeping the
+    first snapshot of every `every`-second bucket.
+    """
+    ts = np.asarray(partition.columns["ts"])
+    if not len(ts):
+        return np.empty(0), np.empty(0), np.empty(0)
+    bucket = ts // np.int64(every * 10**9)
+    first = np.r_[True, bucket[1:] != bucket[:-1]]
+    rows = np.flatnonzero(ts == ts[first][np.cumsum(first) - 1])
+    contract = np.asarray(partition.columns["contract"])[rows]
+    strike, is_call = partition.strikes[contract], partition.is_call[contract]
+    price = np.asarray(partition.columns[field][rows], dtype=np.float64)
+    expiry_close = pd.Timestamp(partition.expiry).value + EXPIRY_CLOSE.value
+    t = (expiry_close - ts[rows]) / 1e9 / YEAR_SECONDS
+    forward = np.asarray(partition.columns["spot"][rows], dtype=np.float64) * np.exp(rate * np.maximum(t, 0.0))
+    otm = (np.where(is_call, strike >= forward, strike <= forward) & (price >= min_premium) & (t > MIN_T)
+           & (forward > 0))
+    iv = implied_vol(price[otm], forward[otm], strike[otm], t[otm], is_call[otm], rate)
+    return np.log(strike[otm] / forward[otm]), t[otm], iv
+
+
+def premium_grid(spot, times, strikes, expiry, is_call, surface=None, rate=OPTION_MODEL_RATE, atm_vol=None):
+    """
+    Premiums for every (bar, strike): spot and times are per-bar arrays,
+    strikes the candidate strike ladder. Returns an array of shape
+    (len(spot), len(strikes)). atm_vol (per bar, optional) re-levels the
+    surface so its ATM volatility matches, e.g. India VIX / 100.
+    """
+    return _premiums(spot, year_fraction(times, expiry), strikes, is_call, surface or VolSurface.flat(), rate, atm_vol)
+
+
+def _premiums(spot, t, strikes, is_call, surface, rate, atm_vol=None):
+    spot = np.asarray(spot, dtype=np.float64)[:, None]
+    t = np.asarray(t, dtype=np.float64)[:, None]
+    strikes = np.asarray(strikes, dtype=np.float64)[None, :]
+    forward = spot * np.exp(rate * t)
+    sigma = surface.vol(np.log(strikes / forward), t)
+    if atm_vol is not None:
+        sigma = sigma - surface.vol(0.0, t) + np.asarray(atm_vol, dtype=np.float64)[:, None]
+    return black76(forward, strikes, t, np.maximum(sigma, 0.01), is_call, rate)
+
+
+# ---------- backtest price source ----------
+class ModelOptionPriceSource(InstrumentsPriceSource):
+    """
+    Option premiums priced with Black-76 off the index candles.
+    Contracts come from instruments_df when given; otherwise (no history of
+    expired contracts) expiries are the nominal weekly/monthly Tuesdays and
+    every strike_step strike within strike_range of the spot's range is
+    listed under a synthetic tradingsymbol. Quotes for a ladder are priced in
+    one vectorized call.
+    """
+
+    def __init__(self, spot_candles, interval, instruments_df=None, surface=None, rate=OPTION_MODEL_RATE,
+                 vol_index=None, lot_size=OPTION_MODEL_LOT_SIZE, strike_step=100, strike_range=0.3):
+        super().__init__(instruments_df if instruments_df is not None else
+                         pd.DataFrame(columns=["name", "segment", "tradingsymbol", "instrument_token", "strike",
+                                               "expiry", "lot_size"]))
+        self.surface = surface or VolSurface.flat()
+        self.rate = rate
+        self.default_lot_size = lot_size
+        self.listed = instruments_df is not None
+        self._spot_ends, self._spot = self._series(spot_candles, interval)
+        self._vix = None if vol_index is None else self._series(vol_index, interval)
+        low, high = self._spot.min() * (1 - strike_range), self._spot.max() * (1 + strike_range)
+        self.strike_grid = np.arange(math.ceil(low / strike_step) * strike_step, high, strike_step)
+        self._contracts = {c.tradingsymbol: (c.opt_type, c.expiry, c.strike) for c in self.index.contracts.values()}
+
+    @staticmethod
+    def _series(candles, interval):
+        """(bar close times as int64 ns, closes) of a date/close frame."""
+        dates = pd.to_datetime(candles['date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        ends = dates.to_numpy(dtype="datetime64[ns]").astype(np.int64) + _parse_interval_to_minutes(interval) * 60 * 10**9
+        return ends, candles['close'].to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def _at(series, ts_ns):
+        ends, values = series
+        pos = int(np.searchsorted(ends, ts_ns, side="right"))
+        return values[pos - 1] if pos else None
+
+    def symbol(self, opt_type, expiry, strike):
+        if self.listed:
+            return super().symbol(opt_type, expiry, strike)
+        if not self.strike_grid[0] <= strike <= self.strike_grid[-1]:
+            return None
+        symbol = f"{OPTION_SYMBOL}{expiry:%y%m%d}{int(strike)}{opt_type}"
+        self._contracts.setdefault(symbol, (opt_type, expiry, int(strike)))
+        return symbol
+
+    def lot_size(self, expiry):
+        return super().lot_size(expiry) or self.default_lot_size
+
+    def quotes(self, symbols, ts):
+        """Premiums of several contracts at ts in one vectorized pricing call (None for unknown symbols)."""
+        ts_ns = pd.Timestamp(ts).value
+        spot = self._at((self._spot_ends, self._spot), ts_ns)
+        contracts = [self._contracts.get(symbol) for symbol in symbols]
+        known = [c for c in contracts if c is not None]
+        if spot is None or not known:
+            return [None] * len(symbols)
+        strikes = np.array([c[2] for c in known], dtype=np.float64)
+        is_call = np.array([c[0] == "CE" for c in known])
+        expiry_close = np.array([pd.Timestamp(c[1]).value for c in known], dtype=np.int64) + EXPIRY_CLOSE.value
+        t = np.maximum((expiry_close - ts_ns) / 1e9 / YEAR_SECONDS, 0.0)
+        forward = spot * np.exp(self.rate * t)
+        sigma = self.surface.vol(np.log(strikes / forward), t)
+        if self._vix is not None:
+            vix = self._at(self._vix, ts_ns)
+            if vix is not None:
+                sigma = sigma - self.surface.vol(0.0, t) + vix / 100.0
+        premiums = iter(np.round(black76(forward, strikes, t, np.maximum(sigma, 0.01), is_call, self.rate), 2))
+        return [None if c is None else float(next(premiums)) for c in contracts]
+
+    def quote(self, symbol, ts):
+        return self.quotes([symbol], ts)[0]
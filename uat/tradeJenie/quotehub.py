@@ -0,0 +1,135 @@
+import time
+import threading
+import logging
+from config import LOG_FILE, QUOTE_POLL_INTERVAL, QUOTE_MAX_AGE, QUOTE_IDLE_EXPIRY, QUOTE_BATCH_SIZE
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class QuoteHub:
+    """
+    Shared LTP snapshot for every user/config thread.
+    Threads subscribe "EXCHANGE:SYMBOL" keys; a single background thread
+    prices the union of all subscribed symbols with one batched kite.ltp
+    call per interval and publishes the result into an in-memory snapshot.
+    Symbols nobody has read for QUOTE_IDLE_EXPIRY seconds are dropped.
+    """
+
+    def __init__(self, client_provider, interval=QUOTE_POLL_INTERVAL, max_age=QUOTE_MAX_AGE,
+                 idle_expiry=QUOTE_IDLE_EXPIRY, batch_size=QUOTE_BATCH_SIZE):
+        self.client_provider = client_provider   # callable(user) -> KiteConnect or None
+        self.interval = interval
+        self.max_age = max_age
+        self.idle_expiry = idle_expiry
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._symbols = {}    # full_symbol -> monotonic time of last read
+        self._users = {}      # user name -> user dict (any of them can price the batch)
+        self._snapshot = {}   # full_symbol -> (last_price, monotonic time of update)
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_refresh = None
+        self.stats = {"batches": 0, "symbols_priced": 0, "hits": 0, "misses": 0, "errors": 0}
+
+    # ---------- subscription ----------
+    def subscribe(self, symbols, user):
+        now = time.monotonic()
+        with self._lock:
+            for s in symbols:
+                self._symbols[s] = now
+            self._users[user['user']] = user
+        self.start()
+
+    def unsubscribe(self, symbols):
+        with self._lock:
+            for s in symbols:
+                self._symbols.pop(s, None)
+                self._snapshot.pop(s, None)
+
+    # ---------- snapshot ----------
+    def update(self, prices):
+        """Publish {full_symbol: last_price} into the snapshot (REST batch or ticker)."""
+        now = time.monotonic()
+        with self._lock:
+            for s, price in prices.items():
+                self._snapshot[s] = (price, now)
+
+    def get(self, full_symbol, max_age=None):
+        """Return the snapshot price if it is not older than max_age seconds, else None."""
+        max_age = self.max_age if max_age is None else max_age
+        now = time.monotonic()
+        with self._lock:
+            if full_symbol in self._symbols:
+                self._symbols[full_symbol] = now
+            entry = self._snapshot.get(full_symbol)
+            if entry and now - entry[1] <= max_age:
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            return None
+
+    def snapshot(self):
+        with self._lock:
+            return {s: price for s, (price, _) in self._snapshot.items()}, self.last_refresh
+
+    # ---------- batch refresh ----------
+    def refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            for s, last_read in list(self._symbols.items()):
+                if now - last_read > self.idle_expiry:
+                    del self._symbols[s]
+                    self._snapshot.pop(s, None)
+            # Symbols kept fresh by a ticker stream don't need a REST poll
+            symbols = [s for s in self._symbols
+                       if not (s in self._snapshot and now - self._snapshot[s][1] < self.interval / 2)]
+            users = list(self._users.values())
+        if not symbols:
+            return
+
+        for user in users:
+            kite = self.client_provider(user)
+            if kite is None:
+                continue
+            try:
+                prices = {}
+                for i in range(0, len(symbols), self.batch_size):
+                    quote = kite.ltp(symbols[i:i + self.batch_size])
+                    for s, q in quote.items():
+                        prices[s] = q['last_price']
+                self.update(prices)
+                self.last_refresh = time.time()
+                self.stats["batches"] += 1
+                self.stats["symbols_priced"] += len(prices)
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"{user['user']} | Quote hub batch LTP failed for {len(symbols)} symbols: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Quote hub refresh error: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="QuoteHub", daemon=True)
+            self._thread.start()
+        logging.info(f"ℹ️ Quote hub started | interval {self.interval}s | max age {self.max_age}s")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,458 @@
+"""
+Option-chain snapshot recorder and its on-disk store.
+
+During market hours a background thread snapshots the NIFTY strike ladder
+(CHAIN_RECORD_STRIKES strikes each side of ATM, CE and PE) for the next
+CHAIN_RECORD_EXPIRIES expiries every CHAIN_RECORD_INTERVAL seconds, with one
+batched kite.quote call (LTP, volume, OI and CHAIN_DEPTH_LEVELS of depth).
+
+Snapshots go to a columnar store, one directory per (trade date, expiry):
+
+    CHAIN_STORE_DIR/2025-01-03/2025-01-07/meta.json    columns and contracts
+    CHAIN_STORE_DIR/2025-01-03/2025-01-07/ltp.bin      one raw little-endian array per column
+    ...
+
+Rows are buffered in fixed-size arrays and appended at most every
+CHAIN_FLUSH_SECONDS (or CHAIN_FLUSH_ROWS rows), so a session writes a bounded
+number of sequential appends and the recorder's memory does not grow with
+the day. Readers memory-map the column files; RecordedChainPriceSource plugs
+them into backtest.Backtester and pricer.VolSurface.calibrate fits a vol
+surface to them.
+"""
+import os
+import json
+import time
+import datetime
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from backtest import InstrumentsPriceSource
+from commonFunction import is_market_open
+from kitefunction import get_kite_client
+from optionchain import get_option_chain_index
+from config import (LOG_FILE, SYMBOL, OPTION_SYMBOL, SEGMENT, QUOTE_BATCH_SIZE, CHAIN_STORE_DIR, CHAIN_RECORD_INTERVAL,
+                    CHAIN_RECORD_EXPIRIES, CHAIN_RECORD_STRIKES, CHAIN_DEPTH_LEVELS, CHAIN_FLUSH_ROWS,
+                    CHAIN_FLUSH_SECONDS, CHAIN_QUOTE_MAX_AGE)
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+SPOT_KEY = f"NSE:{SYMBOL}"
+PARTITION_CACHE_SIZE = 16   # partitions kept open by a RecordedChainPriceSource
+
+
+def chain_columns(depth_levels=CHAIN_DEPTH_LEVELS):
+    """(name, dtype) of every stored column. ts is the snapshot time (naive local, int64 ns)."""
+    columns = [("ts", "<i8"), ("contract", "<i2"), ("spot", "<f8"), ("ltp", "<f4"), ("volume", "<i8"),
+               ("oi", "<i8"), ("buy_quantity", "<i8"), ("sell_quantity", "<i8")]
+    for side in ("bid", "ask"):
+        for level in range(depth_levels):
+            columns += [(f"{side}{level}", "<f4"), (f"{side}{level}_qty", "<i4")]
+    return columns
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _column_rows(path, columns):
+    """Complete rows on disk: the shortest column wins (a crash can cut an append short)."""
+    rows = []
+    for name, dtype in columns:
+        try:
+            rows.append(os.path.getsize(os.path.join(path, f"{name}.bin")) // np.dtype(dtype).itemsize)
+        except FileNotFoundError:
+            rows.append(0)
+    return min(rows) if rows else 0
+
+
+class ChainPartition:
+    """
+    One recorded (trade date, expiry), read-only: `columns` maps each column to
+    a memory-mapped array (all the same length), `contracts` lists
+    (tradingsymbol, instrument_token, strike, opt_type, lot_size) by the ids
+    stored in the contract column.
+    """
+
+    def __init__(self, path, date, expiry, meta):
+        self.date, self.expiry = date, expiry
+        self.contracts = [tuple(c) for c in meta["contracts"]]
+        self.contract_ids = {c[0]: i for i, c in enumerate(self.contracts)}
+        self.strikes = np.array([c[2] for c in self.contracts], dtype=np.float64)
+        self.is_call = np.array([c[3] == "CE" for c in self.contracts], dtype=bool)
+        columns = [tuple(c) for c in meta["columns"]]
+        rows = _column_rows(path, columns)
+        self.columns = {name: (np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+                               if rows else np.empty(0, dtype=dtype))
+                        for name, dtype in columns}
+        self._index = None
+
+    def __len__(self):
+        return len(self.columns["ts"])
+
+    def _build_index(self):
+        # Rows sorted by (contract, ts); starts[i]:starts[i + 1] is contract i's time series
+        ts, contract = self.columns["ts"], self.columns["contract"]
+        order = np.lexsort((ts, contract))
+        starts = np.searchsorted(contract[order], np.arange(len(self.contracts) + 1))
+        self._index = (order, np.asarray(ts)[order], starts)
+
+    def row_at(self, contract_id, ts_ns):
+        """Row of the contract's last snapshot at or before ts_ns, or -1."""
+        if self._index is None:
+            self._build_index()
+        order, times, starts = self._index
+        lo, hi = starts[contract_id], starts[contract_id + 1]
+        pos = int(np.searchsorted(times[lo:hi], ts_ns, side="right"))
+        return int(order[lo + pos - 1]) if pos else -1
+
+    def frame(self):
+        """The partition as a DataFrame (copies the columns), with tradingsymbol/strike/opt_type per row."""
+        df = pd.DataFrame({name: np.asarray(col) for name, col in self.columns.items()})
+        df.insert(0, "date", pd.to_datetime(df.pop("ts")))
+        contracts = pd.DataFrame(self.contracts, columns=["tradingsymbol", "instrument_token", "strike", "opt_type",
+                                                          "lot_size"])
+        return df.join(contracts[["tradingsymbol", "strike", "opt_type"]], on="contract")
+
+
+class ChainWriter:
+    """
+    Appends rows to one partition through fixed-size column buffers.
+    Reopening a partition (restart mid-day) keeps its contract ids and trims
+    any half-written tail so the columns stay aligned.
+    """
+
+    def __init__(self, path, date, expiry, columns, flush_rows=CHAIN_FLUSH_ROWS):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = _read_meta(path)
+        self.meta = meta or {"date": str(date), "expiry": str(expiry), "columns": [list(c) for c in columns],
+                             "contracts": []}
+        self.columns = [tuple(c) for c in self.meta["columns"]]
+        if meta:
+            rows = _column_rows(path, self.columns)
+            for name, dtype in self.columns:
+                file = os.path.join(path, f"{name}.bin")
+                if os.path.exists(file) and os.path.getsize(file) != rows * np.dtype(dtype).itemsize:
+                    os.truncate(file, rows * np.dtype(dtype).itemsize)
+        self.contract_ids = {c[0]: i for i, c in enumerate(self.meta["contracts"])}
+        self._buffers = {name: np.zeros(flush_rows, dtype=dtype) for name, dtype in self.columns}
+        self._n = 0
+        self._meta_dirty = meta is None
+        self.last_flush = time.monotonic()
+
+    def contract_id(self, contract):
+        """Stored id of an OptionContract, registering it on first sight."""
+        i = self.contract_ids.get(contract.tradingsymbol)
+        if i is None:
+            i = self.contract_ids[contract.tradingsymbol] = len(self.meta["contracts"])
+            self.meta["contracts"].append([contract.tradingsymbol, contract.instrument_token, contract.strike,
+                                           contract.opt_type, contract.lot_size])
+            self._meta_dirty = True
+        return i
+
+    def append(self, row):
+        """Buffer one row ({column: value}, missing columns are 0); flushes when the buffer is full."""
+        n = self._n
+        for name, buffer in self._buffers.items():
+            buffer[n] = row.get(name, 0)
+        self._n = n + 1
+        if self._n == len(self._buffers["ts"]):
+            self.flush()
+
+    def flush(self):
+        # meta first: rows on disk must never reference a contract id it doesn't list
+        if self._meta_dirty:
+            tmp = os.path.join(self.path, "meta.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.meta, f)
+            os.replace(tmp, os.path.join(self.path, "meta.json"))
+            self._meta_dirty = False
+        if self._n:
+            for name, buffer in self._buffers.items():
+                with open(os.path.join(self.path, f"{name}.bin"), "ab") as f:
+                    f.write(buffer[:self._n].tobytes())
+            self._n = 0
+        self.last_flush = time.monotonic()
+
+
+class ChainStore:
+    """The CHAIN_STORE_DIR tree: partition paths, listings, readers and writers."""
+
+    def __init__(self, root=CHAIN_STORE_DIR):
+        self.root = root
+
+    def path(self, date, expiry):
+        return os.path.join(self.root, str(date), str(expiry))
+
+    @staticmethod
+    def _dates(path):
+        try:
+            names = os.listdir(path)
+        except FileNotFoundError:
+            return []
+        dates = []
+        for name in names:
+            try:
+                dates.append(datetime.date.fromisoformat(name))
+            except ValueError:
+                continue
+        return sorted(dates)
+
+    def dates(self):
+        """Recorded trade dates."""
+        return self._dates(self.root)
+
+    def expiries(self, date):
+        """Expiries recorded on a trade date."""
+        return [e for e in self._dates(os.path.join(self.root, str(date)))
+                if os.path.exists(os.path.join(self.path(date, e), "meta.json"))]
+
+    def partition(self, date, expiry):
+        """ChainPartition for (date, expiry), or None if nothing was recorded."""
+        path = self.path(date, expiry)
+        meta = _read_meta(path)
+        return ChainPartition(path, date, expiry, meta) if meta else None
+
+    def partitions(self, dates=None):
+        for date in self.dates() if dates is None else dates:
+            for expiry in self.expiries(date):
+                partition = self.partition(date, expiry)
+                if partition is not None:
+                    yield partition
+
+    def writer(self, date, expiry, columns, flush_rows=CHAIN_FLUSH_ROWS):
+        return ChainWriter(self.path(date, expiry), date, expiry, columns, flush_rows)
+
+    def instruments(self):
+        """Every recorded contract as an instruments-file frame (OptionChainIndex input)."""
+        rows = {}
+        for date in self.dates():
+            for expiry in self.expiries(date):
+                for symbol, token, strike, _, lot_size in _read_meta(self.path(date, expiry))["contracts"]:
+                    rows[symbol] = (OPTION_SYMBOL, SEGMENT, symbol, token, strike, expiry, lot_size)
+        return pd.DataFrame(list(rows.values()), columns=["name", "segment", "tradingsymbol", "instrument_token",
+                                                          "strike", "expiry", "lot_size"])
+
+
+class ChainRecorder:
+    """
+    Background option-chain snapshots into a ChainStore. Any registered
+    user's Kite session can price the batch (first one that works). Writers
+    only exist for the current trade date and are flushed and dropped at the
+    close, so memory stays flat across sessions.
+    """
+
+    def __init__(self, client_provider, store=None, interval=CHAIN_RECORD_INTERVAL, expiries=CHAIN_RECORD_EXPIRIES,
+                 strikes=CHAIN_RECORD_STRIKES, depth_levels=CHAIN_DEPTH_LEVELS, flush_rows=CHAIN_FLUSH_ROWS,
+                 flush_seconds=CHAIN_FLUSH_SECONDS):
+        self.client_provider = client_provider   # callable(user) -> KiteConnect or None
+        self.store = store or ChainStore()
+        self.interval = interval
+        self.expiries = expiries
+        self.strikes = strikes
+        self.depth_levels = depth_levels
+        self.columns = chain_columns(depth_levels)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self._lock = threading.Lock()
+        self._users = {}
+        self._writers = {}   # expiry -> ChainWriter for self._date
+        self._date = None
+        self._spot = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"snapshots": 0, "rows": 0, "errors": 0}
+
+    def ladder(self, index, spot, today):
+        """OptionContracts recorded around `spot`: +-strikes x 100 points, CE and PE, next `expiries` expiries."""
+        atm = int(round(spot / 100.0) * 100)
+        contracts = []
+        for expiry in [e for e in index.all_expiries if e >= today][:self.expiries]:
+            for k in range(-self.strikes, self.strikes + 1):
+                for opt_type in ("CE", "PE"):
+                    contract = index.get(opt_type, expiry, atm + 100 * k)
+                    if contract:
+                        contracts.append(contract)
+        return contracts
+
+    def _fetch(self, today):
+        """(contracts, kite.quote result) from the first user session that can price the ladder."""
+        with self._lock:
+            users = list(self._users.values())
+        for user in users:
+            kite = self.client_provider(user)
+            if kite is None:
+                continue
+            try:
+                if self._spot is None:
+                    self._spot = kite.ltp([SPOT_KEY])[SPOT_KEY]['last_price']
+                contracts = self.ladder(get_option_chain_index(), self._spot, today)
+                keys = [SPOT_KEY] + [f"NFO:{c.tradingsymbol}" for c in contracts]
+                quotes = {}
+                for i in range(0, len(keys), QUOTE_BATCH_SIZE):
+                    quotes.update(kite.quote(keys[i:i + QUOTE_BATCH_SIZE]))
+                return contracts, quotes
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"{user['user']} | Chain recorder quote failed: {e}")
+        return None, None
+
+    def _writer(self, expiry):
+        writer = self._writers.get(expiry)
+        if writer is None:
+            writer = self._writers[expiry] = self.store.writer(self._date, expiry, self.columns, self.flush_rows)
+        return writer
+
+    def snapshot(self):
+        """Record one snapshot of the ladder; returns the rows written."""
+        now = datetime.datetime.now()
+        contracts, quotes = self._fetch(now.date())
+        if not quotes:
+            return 0
+        if now.date() != self._date:
+            self.close()
+            self._date = now.date()
+        spot = (quotes.get(SPOT_KEY) or {}).get('last_price')
+        if spot:
+            self._spot = spot
+        ts = np.datetime64(now, "ns").astype(np.int64)
+        rows = 0
+        for contract in contracts:
+            q = quotes.get(f"NFO:{contract.tradingsymbol}")
+            if q is None:
+                continue
+            writer = self._writer(contract.expiry)
+            row = {"ts": ts, "contract": writer.contract_id(contract), "spot": self._spot,
+                   "ltp": q.get('last_price') or 0.0, "volume": q.get('volume') or 0, "oi": q.get('oi') or 0,
+                   "buy_quantity": q.get('buy_quantity') or 0, "sell_quantity": q.get('sell_quantity') or 0}
+            depth = q.get('depth') or {}
+            for side, key in (("bid", "buy"), ("ask", "sell")):
+                for level, entry in enumerate((depth.get(key) or [])[:self.depth_levels]):
+                    row[f"{side}{level}"] = entry.get('price') or 0.0
+                    row[f"{side}{level}_qty"] = entry.get('quantity') or 0
+            writer.append(row)
+            rows += 1
+        started = time.monotonic()
+        for writer in self._writers.values():
+            if started - writer.last_flush >= self.flush_seconds:
+                writer.flush()
+        self.stats["snapshots"] += 1
+        self.stats["rows"] += rows
+        return rows
+
+    def close(self):
+        """Flush and drop the open writers."""
+        for expiry, writer in list(self._writers.items()):
+            try:
+                writer.flush()
+            except Exception as e:
+                logging.error(f"Chain recorder could not flush {self._date}/{expiry}: {e}")
+        self._writers.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if is_market_open():
+                    self.snapshot()
+                elif self._writers:
+                    self.close()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"Chain recorder snapshot error: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        self.close()
+
+    def start(self, user):
+        with self._lock:
+            self._users[user['user']] = user
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ChainRecorder", daemon=True)
+            self._thread.start()
+        logging.info(f"ℹ️ Chain recorder started | every {self.interval}s | {self.expiries} expiries | "
+                     f"+-{self.strikes} strikes | {self.store.root}")
+
+    def stop(self, timeout=None):
+        """Stop recording; buffered rows are flushed before the thread exits."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+chain_recorder = ChainRecorder(client_provider=get_kite_client)
+
+
+class RecordedChainPriceSource(InstrumentsPriceSource):
+    """
+    Premiums from recorded chain snapshots. A quote at ts is the contract's
+    last snapshot at or before ts that day (None if it is older than max_age
+    seconds); `field` picks the stored column - ltp by default, any depth
+    column, or "mid" for the level-0 bid/ask midpoint. Contracts come from
+    instruments_df if given, else from the store itself.
+    """
+
+    def __init__(self, store=None, instruments_df=None, field="ltp", max_age=CHAIN_QUOTE_MAX_AGE,
+                 cache_size=PARTITION_CACHE_SIZE):
+        self.store = store if isinstance(store, ChainStore) else ChainStore(store or CHAIN_STORE_DIR)
+        super().__init__(instruments_df if instruments_df is not None else self.store.instruments())
+        self.field = field
+        self.max_age = np.int64(max_age * 10**9)
+        self.cache_size = cache_size
+        self._expiry_of = {c.tradingsymbol: c.expiry for c in self.index.contracts.values()}
+        self._partitions = OrderedDict()
+
+    def __getstate__(self):
+        # Picklable for sweep workers: open partitions are re-mapped in each process
+        state = dict(self.__dict__)
+        state["_partitions"] = OrderedDict()
+        return state
+
+    def _partition(self, date, expiry):
+        key = (date, expiry)
+        if key in self._partitions:
+            self._partitions.move_to_end(key)
+            return self._partitions[key]
+        partition = self._partitions[key] = self.store.partition(date, expiry)
+        if len(self._partitions) > self.cache_size:
+            self._partitions.popitem(last=False)
+        return partition
+
+    def _value(self, partition, row):
+        columns = partition.columns
+        if self.field == "mid":
+            bid, ask = float(columns["bid0"][row]), float(columns["ask0"][row])
+            price = (bid + ask) / 2 if bid > 0 and ask > 0 else float(columns["ltp"][row])
+        else:
+            price = float(columns[self.field][row])
+        return round(price, 2) if price > 0 else None
+
+    def quotes(self, symbols, ts):
+        ts = pd.Timestamp(ts)
+        ts_ns, day = ts.value, ts.date()
+        prices = []
+        for symbol in symbols:
+            expiry = self._expiry_of.get(symbol)
+            partition = self._partition(day, expiry) if expiry else None
+            contract_id = partition.contract_ids.get(symbol) if partition is not None else None
+            row = partition.row_at(contract_id, ts_ns) if contract_id is not None else -1
+            if row < 0 or ts_ns - partition.columns["ts"][row] > self.max_age:
+                prices.append(None)
+            else:
+                prices.append(self._value(partition, row))
+        return prices
+
+    def quote(self, symbol, ts):
+        return self.quotes([symbol], ts)[0]
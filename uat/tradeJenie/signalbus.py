@@ -0,0 +1,89 @@
+import datetime
+import threading
+import logging
+from strategies import get_strategy
+from config import LOG_FILE
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class SignalBus:
+    """
+    One signal frame per (strategy, interval, lookback) per bar, shared by
+    every config thread of every user. Strategies are keyed by their
+    registry name, so configs spelling the same strategy differently (case,
+    whitespace) share one frame. The first thread to ask after a bar closes computes
+    the frame (candles + strategy signals); concurrent callers for the same key
+    wait for that computation, and later callers get the cached frame until
+    the bar's expiry time. Each new frame's latest row is published to the
+    key's subscribers.
+    """
+
+    def __init__(self, compute, expires_at):
+        self.compute = compute        # callable(strategy, interval, user) -> signal DataFrame or None
+        self.expires_at = expires_at  # callable(strategy, interval, user) -> datetime the frame goes stale
+        self._lock = threading.Lock()
+        self._entries = {}            # (strategy, interval, lookback) -> {"df", "expires", "lock", "version"}
+        self._subscribers = {}        # (strategy, interval, lookback) -> [callback(strategy, interval, row)]
+        self.stats = {"computes": 0, "shared": 0}
+
+    @staticmethod
+    def _key(strategy, interval):
+        spec = get_strategy(strategy)
+        return spec.name, interval, spec.lookback
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"df": None, "expires": None, "lock": threading.Lock(), "version": 0}
+                self._entries[key] = entry
+            return entry
+
+    def get(self, strategy, interval, user):
+        """Signal frame for the current bar (None if it could not be computed, e.g. not enough candles)."""
+        key = self._key(strategy, interval)
+        strategy = key[0]
+        entry = self._entry(key)
+        with entry["lock"]:
+            if entry["df"] is not None and datetime.datetime.now() < entry["expires"]:
+                self.stats["shared"] += 1
+                return entry["df"]
+            df = self.compute(strategy, interval, user)
+            if df is None or df.empty:
+                return df   # not cached: the caller retries on its own schedule
+            entry["df"] = df
+            entry["expires"] = self.expires_at(strategy, interval, user)
+            entry["version"] += 1
+            self.stats["computes"] += 1
+            subscribers = list(self._subscribers.get(key, []))
+        logging.info(f"ℹ️ Signal bus computed {strategy} {interval} (v{entry['version']}) valid until {entry['expires']:%H:%M:%S}")
+        latest = df.iloc[-1]
+        for callback in subscribers:
+            try:
+                callback(strategy, interval, latest)
+            except Exception as e:
+                logging.error(f"Signal bus subscriber error for {key}: {e}")
+        return df
+
+    def subscribe(self, strategy, interval, callback):
+        with self._lock:
+            self._subscribers.setdefault(self._key(strategy, interval), []).append(callback)
+
+    def unsubscribe(self, strategy, interval, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(self._key(strategy, interval), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def invalidate(self, strategy=None, interval=None):
+        strategy = get_strategy(strategy).name if strategy is not None else None
+        with self._lock:
+            for key, entry in self._entries.items():
+                if strategy in (None, key[0]) and interval in (None, key[1]):
+                    entry["expires"] = None
+                    entry["df"] = None
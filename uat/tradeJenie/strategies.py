@@ -0,0 +1,89 @@
+import math
+import numpy as np
+import pandas as pd
+from commonFunction import generate_god_signals, convertIntoHeikinashi, hd_strategy, railway_track_strategy, \
+    _parse_interval_to_minutes
+from indicatorengine import GodState, HdState, RailwayState
+from strategynames import STRATEGY_NAMES
+
+SESSION_MINUTES = 375        # 09:15 - 15:30
+CALENDAR_SLACK_DAYS = 4      # weekends/holidays on top of the 7/5 calendar ratio
+
+
+def hd_on_heikin_ashi(df, maLength=50):
+    """hd_strategy on Heikin-Ashi candles, as live_trading runs HDSTRATEGY."""
+    return hd_strategy(convertIntoHeikinashi(df), maLength=maLength)
+
+
+class StrategySpec:
+    """
+    Everything the engine needs to know about one strategy:
+    - lookback: candles needed before the signals are stable (EMA/SMA warm-up)
+    - columns: input candle columns the strategy reads
+    - outputs: indicator columns it adds (besides trend/buySignal/sellSignal)
+    - batch(df, **params): reference DataFrame implementation
+    - incremental: per-bar state class used by the indicator engine
+    - params: default parameters, overridable per call (parameter sweeps)
+    """
+
+    def __init__(self, name, lookback, columns, outputs, batch, incremental, params=None):
+        self.name = name
+        self.lookback = lookback
+        self.columns = tuple(columns)
+        self.outputs = tuple(outputs)
+        self.batch_fn = batch
+        self.incremental = incremental
+        self.params = dict(params or {})
+
+    def batch(self, df, **params):
+        return self.batch_fn(df, **dict(self.params, **params))
+
+    def batch_arrays(self, arrays, **params):
+        """
+        Columnar entry point: {column: ndarray} in, {column: ndarray} out
+        (outputs + trend/buySignal/sellSignal, and OHLC when the strategy
+        rewrites them, e.g. Heikin-Ashi).
+        """
+        missing = [c for c in self.columns if c not in arrays]
+        if missing:
+            raise ValueError(f"{self.name} needs columns {missing}")
+        df = self.batch(pd.DataFrame({c: np.asarray(a, dtype=np.float64) for c, a in arrays.items()}), **params)
+        return {c: df[c].to_numpy() for c in self.outputs + ("trend", "buySignal", "sellSignal")}
+
+    def candle_days(self, interval):
+        """Calendar days of history that cover `lookback` candles of `interval`."""
+        per_day = math.ceil(SESSION_MINUTES / _parse_interval_to_minutes(interval))
+        trading_days = math.ceil(self.lookback / per_day)
+        return math.ceil(trading_days * 7 / 5) + CALENDAR_SLACK_DAYS
+
+    def __repr__(self):
+        return f"StrategySpec({self.name}, lookback={self.lookback})"
+
+
+STRATEGIES = {spec.name: spec for spec in (
+    StrategySpec("GOD", lookback=100, columns=("close",), outputs=("ema1", "ema2"),
+                 batch=generate_god_signals, incremental=GodState,
+                 params={"len1": 8, "len2": 20}),
+    StrategySpec("HDSTRATEGY", lookback=150, columns=("open", "high", "low", "close"),
+                 outputs=("open", "high", "low", "close", "sma", "buyat", "sellat"),
+                 batch=hd_on_heikin_ashi, incremental=HdState, params={"maLength": 50}),
+    StrategySpec("RAILWAY_TRACK", lookback=100, columns=("high", "low", "close"), outputs=("emaHigh", "emaLow"),
+                 batch=railway_track_strategy, incremental=RailwayState,
+                 params={"period": 20}),
+)}
+
+if tuple(STRATEGIES) != STRATEGY_NAMES:
+    raise ImportError(f"strategynames.STRATEGY_NAMES {STRATEGY_NAMES} does not match the registry {tuple(STRATEGIES)}")
+
+
+def get_strategy(name):
+    """
+    StrategySpec for a registered strategy name (case-insensitive). Anything
+    else - including the old GOD_EMA / PARALLEL_EMA names offered by earlier
+    config CLIs - raises ValueError, so such configs are skipped, not guessed.
+    """
+    key = str(name or "").strip().upper()
+    spec = STRATEGIES.get(key)
+    if spec is None:
+        raise ValueError(f"Unknown strategy {name!r} (known: {', '.join(STRATEGIES)})")
+    return spec
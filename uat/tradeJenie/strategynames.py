@@ -0,0 +1,4 @@
+# Names accepted in trade_config.STRATEGY. Kept free of imports so the config
+# CLI can offer them without loading the trading modules; strategies.py
+# registers exactly these.
+STRATEGY_NAMES = ("GOD", "HDSTRATEGY", "RAILWAY_TRACK")
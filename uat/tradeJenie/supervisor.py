@@ -0,0 +1,93 @@
+import threading
+import logging
+from config import LOG_FILE, SERVER, CONFIG_CHECK_INTERVAL
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class StrategySupervisor:
+    """
+    Keeps one strategy thread per trade_config KEY of a user while the process
+    runs. Every `interval` seconds it diffs the user's configs (served by the
+    config store, so this is a memory read unless trade_config changed) with
+    the running threads:
+
+    - a new KEY gets a thread straight away, no restart or re-login;
+    - a removed KEY has its stop event set. The thread drains: it keeps
+      managing its open trade until that exits on its own rules (no new
+      entries), then stops. A flat thread stops at its next check;
+    - a KEY re-added while its thread is still draining is resumed;
+    - a thread that ended by itself (NEW_TRADE no, market closed) is started
+      again only if its config was edited since.
+
+    Open positions are never touched by the supervisor itself.
+    """
+
+    def __init__(self, user, configs_provider, interval=CONFIG_CHECK_INTERVAL):
+        self.user = user
+        self.configs_provider = configs_provider   # user_id -> {KEY: config}
+        self.interval = interval
+        self._threads = {}   # KEY -> (Thread, stop Event, config it started with)
+        self._stop = threading.Event()
+
+    def _start(self, spawn, key, config):
+        stop_event = threading.Event()
+        t = threading.Thread(target=spawn, args=(config, key, stop_event), name=f"{self.user['user']}:{key}")
+        t.start()
+        self._threads[key] = (t, stop_event, dict(config))
+
+    def sync(self, spawn):
+        """One reconciliation pass; spawn(config, key, stop_event) runs a strategy thread."""
+        configs = self.configs_provider(self.user['id'])
+        for key, config in configs.items():
+            entry = self._threads.get(key)
+            if entry is None:
+                if self._threads:
+                    print(f"➕ {self.user['user']} {SERVER}  |  {key}  | New trade config, starting thread")
+                    logging.info(f"➕ {self.user['user']} {SERVER}  |  {key}  | New trade config, starting thread")
+                self._start(spawn, key, config)
+                continue
+            t, stop_event, started_with = entry
+            if t.is_alive():
+                if stop_event.is_set():
+                    stop_event.clear()
+                    logging.info(f"↩️ {self.user['user']} {SERVER}  |  {key}  | Trade config restored, thread resumed")
+            elif dict(config) != started_with:
+                logging.info(f"🔁 {self.user['user']} {SERVER}  |  {key}  | Trade config edited after its thread ended, restarting")
+                self._start(spawn, key, config)
+
+        for key in [k for k in self._threads if k not in configs]:
+            t, stop_event, _ = self._threads[key]
+            if not t.is_alive():
+                del self._threads[key]   # forgotten: re-adding the KEY starts it afresh
+            elif not stop_event.is_set():
+                stop_event.set()
+                print(f"➖ {self.user['user']} {SERVER}  |  {key}  | Trade config removed, stopping after the open trade (if any) exits")
+                logging.info(f"➖ {self.user['user']} {SERVER}  |  {key}  | Trade config removed, stopping after the open trade (if any) exits")
+
+    def alive(self):
+        return [key for key, (t, _, _) in self._threads.items() if t.is_alive()]
+
+    def supervise(self, spawn, keep_running):
+        """
+        Sync until stop() or until no thread is alive and keep_running() is
+        False (the original behaviour: return once every thread has ended).
+        """
+        while not self._stop.is_set():
+            try:
+                self.sync(spawn)
+            except Exception as e:
+                logging.error(f"❌ {self.user['user']} {SERVER}  | Config supervisor error: {e}", exc_info=True)
+            if not self.alive() and not keep_running():
+                break
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        """Stop supervising and drain every thread."""
+        self._stop.set()
+        for t, stop_event, _ in self._threads.values():
+            stop_event.set()
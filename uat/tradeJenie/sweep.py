@@ -0,0 +1,231 @@
+"""
+Parallel parameter sweep over the backtester.
+
+A grid point mixes three kinds of keys:
+- strategy parameters (the registry's StrategySpec.params, e.g. len1/len2 for
+  GOD, maLength for HDSTRATEGY, period for RAILWAY_TRACK)
+- backtester settings (target_ratio, hedge_nearest_ltp)
+- trade config overrides (anything else, e.g. NEAREST_LTP, EXPIRY)
+
+The candles are copied once into a shared-memory block that every worker maps
+read-only; the config and price source are sent once per worker, and each
+worker reuses the strategy signals across grid points that only differ in
+exit settings. Results come back as one DataFrame row per grid point.
+
+    grid = param_grid(len1=[5, 8, 13], len2=[20, 34], target_ratio=[0.5, 0.6], NEAREST_LTP=[80, 100])
+    table = run_sweep(config, candles, source, grid)
+
+walk_forward() runs the same grid as a rolling train/test evaluation and
+returns the consolidated out-of-sample equity curve:
+
+    windows, equity = walk_forward(config, candles, source, grid, train_days=60, test_days=20, key=key)
+"""
+import os
+import time
+import itertools
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from backtest import Backtester, trade_metrics
+from strategies import get_strategy
+
+BACKTEST_SETTINGS = ("target_ratio", "hedge_nearest_ltp")
+SIGNAL_CACHE_SIZE = 32   # signal sets kept per worker
+
+
+class SharedCandles:
+    """
+    date/open/high/low/close in one shared-memory block: row 0 holds the dates
+    (naive local time as int64 ns), rows 1-4 the float64 prices.
+    """
+    COLUMNS = ("date", "open", "high", "low", "close")
+
+    def __init__(self, candles):
+        n = len(candles)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8, 8 * n * len(self.COLUMNS)))
+        self.handle = (self.shm.name, n)
+        dates = pd.to_datetime(candles['date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        views = self._views(self.shm, n)
+        views["date"][:] = dates.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        for col in self.COLUMNS[1:]:
+            views[col][:] = candles[col].to_numpy(dtype=np.float64)
+
+    @classmethod
+    def _views(cls, shm, n):
+        return {col: np.ndarray((n,), dtype=np.int64 if col == "date" else np.float64, buffer=shm.buf, offset=8 * n * i)
+                for i, col in enumerate(cls.COLUMNS)}
+
+    @classmethod
+    def attach(cls, handle):
+        """(shm, read-only candle DataFrame) in a worker process."""
+        name, n = handle
+        shm = shared_memory.SharedMemory(name=name)
+        views = cls._views(shm, n)
+        for view in views.values():
+            view.flags.writeable = False
+        views["date"] = views["date"].view("datetime64[ns]")
+        return shm, pd.DataFrame(views, copy=False)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def param_grid(**axes):
+    """Every combination of the axes, e.g. param_grid(len1=[5, 8], target_ratio=[0.5, 0.6]) -> 4 points."""
+    keys = list(axes)
+    return [dict(zip(keys, values)) for values in itertools.product(*axes.values())]
+
+
+def _split(point, config):
+    """Grid point -> (config, strategy params, backtester settings)."""
+    config = dict(config)
+    for k, v in point.items():
+        if k not in BACKTEST_SETTINGS:
+            config[k] = v
+    spec = get_strategy(config['STRATEGY'])
+    params = {k: v for k, v in point.items() if k in spec.params}
+    for k in params:
+        config.pop(k)
+    settings = {k: v for k, v in point.items() if k in BACKTEST_SETTINGS}
+    return config, params, settings
+
+
+# ---------- worker process ----------
+_worker = {}
+
+
+def _init_worker(handle, config, source):
+    shm, candles = SharedCandles.attach(handle)
+    _worker.update(shm=shm, candles=candles, config=config, source=source, times=None, signals={})
+
+
+def _backtest(point, lo=0, hi=None):
+    """
+    Trades for one grid point over bars [lo, hi). Signals are computed on the
+    whole history once per strategy parameter set and sliced, so windows see
+    warmed-up indicators and overlapping windows share the work.
+    """
+    config, params, settings = _split(point, _worker["config"])
+    bt = Backtester(config, _worker["source"], params=params, **settings)
+    candles = _worker["candles"]
+    if _worker["times"] is None:
+        _worker["times"] = bt.close_times(candles)
+    cache = _worker["signals"]
+    cache_key = (bt.spec.name, tuple(sorted(params.items())))
+    signals = cache.get(cache_key)
+    if signals is None:
+        if len(cache) >= SIGNAL_CACHE_SIZE:
+            cache.clear()
+        signals = cache[cache_key] = bt.signals(candles)
+    window = slice(lo, hi)
+    return bt.run(candles.iloc[window], signals={k: v[window] for k, v in signals.items()},
+                  times=_worker["times"][window], close_at_end=hi is not None)
+
+
+def _run_point(point):
+    started = time.perf_counter()
+    trades = _backtest(point)
+    return dict(point, **trade_metrics(trades), seconds=time.perf_counter() - started)
+
+
+def _run_window(job):
+    """(point, lo, hi, keep_trades) -> metrics, plus the trades for test windows."""
+    point, lo, hi, keep_trades = job
+    trades = _backtest(point, lo, hi)
+    return trade_metrics(trades), (trades if keep_trades else None)
+
+
+def _by_strategy_params(grid, config):
+    # Points sharing strategy parameters run back to back, so workers hit their signal cache
+    return sorted(grid, key=lambda p: repr(sorted(_split(p, config)[1].items())))
+
+
+@contextmanager
+def _pool(config, candles, source, workers):
+    shared = SharedCandles(candles)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.handle, config, source)) as pool:
+            yield pool
+    finally:
+        shared.close()
+
+
+def run_sweep(config, candles, source, grid, workers=None, chunksize=None):
+    """
+    Backtest `config` over `candles` for every grid point on a process pool
+    (all cores by default). Returns one row per point - the point's keys plus
+    pnl, max_drawdown, trades, win_rate, target_hits, seconds - best PnL first.
+    """
+    workers = workers or os.cpu_count() or 1
+    grid = _by_strategy_params(grid, config)
+    chunksize = chunksize or max(1, len(grid) // (workers * 4))
+    with _pool(config, candles, source, workers) as pool:
+        rows = list(pool.map(_run_point, grid, chunksize=chunksize))
+    return pd.DataFrame(rows).sort_values("pnl", ascending=False, ignore_index=True)
+
+
+def walk_windows(candles, train_days, test_days, step_days=None):
+    """
+    Rolling (train_lo, train_hi, test_hi) bar ranges over the candles' trading
+    days: train on `train_days` days, test on the next `test_days`, then move
+    forward `step_days` (default test_days) so the test windows tile history.
+    """
+    dates = pd.to_datetime(candles['date'])
+    days = dates.dt.date.to_numpy()
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    bounds = np.r_[starts, len(days)]
+    step_days = step_days or test_days
+    windows = []
+    first = 0
+    while first + train_days + test_days <= len(starts):
+        windows.append((int(bounds[first]), int(bounds[first + train_days]),
+                        int(bounds[first + train_days + test_days])))
+        first += step_days
+    return windows
+
+
+def walk_forward(config, candles, source, grid, train_days, test_days, step_days=None, key="BACKTEST",
+                 metric="pnl", workers=None):
+    """
+    Walk-forward evaluation of `config` over `candles`. Every grid point is
+    backtested on every train window (all in one parallel batch); the best
+    point per window by `metric` is then run on the following test window.
+    Returns (windows, equity):
+    - windows: one row per window - its dates, the chosen point, train and
+      out-of-sample metrics
+    - equity: the out-of-sample trades of all test windows in order, with the
+      consolidated equity curve (cumulative total_pnl x qty) for `key`
+    """
+    workers = workers or os.cpu_count() or 1
+    grid = _by_strategy_params(grid, config)
+    windows = walk_windows(candles, train_days, test_days, step_days)
+    dates = pd.to_datetime(candles['date'])
+    rows, oos = [], []
+    with _pool(config, candles, source, workers) as pool:
+        jobs = [(point, lo, hi, False) for lo, hi, _ in windows for point in grid]
+        chunksize = max(1, len(jobs) // (workers * 4))
+        train = [metrics for metrics, _ in pool.map(_run_window, jobs, chunksize=chunksize)]
+        best = []
+        for w in range(len(windows)):
+            scores = train[w * len(grid):(w + 1) * len(grid)]
+            i = max(range(len(grid)), key=lambda j: scores[j][metric])
+            best.append((grid[i], scores[i]))
+        tests = pool.map(_run_window, [(point, hi, test_hi, True) for (_, hi, test_hi), (point, _) in zip(windows, best)])
+        for w, ((lo, hi, test_hi), (point, train_metrics), (test_metrics, trades)) in enumerate(zip(windows, best, tests)):
+            rows.append(dict(window=w, train_from=dates.iloc[lo].date(), test_from=dates.iloc[hi].date(),
+                             test_to=dates.iloc[test_hi - 1].date(), **point,
+                             **{f"train_{k}": v for k, v in train_metrics.items()},
+                             **{f"test_{k}": v for k, v in test_metrics.items()}))
+            for trade in trades:
+                oos.append(dict(window=w, key=key, entry_time=trade["EntryTime"], exit_time=trade["ExitTime"],
+                                signal=trade["Signal"], exit_reason=trade["ExitReason"],
+                                pnl=trade["total_pnl"] * trade["qty"]))
+    equity = pd.DataFrame(oos, columns=["window", "key", "entry_time", "exit_time", "signal", "exit_reason", "pnl"])
+    equity["equity"] = equity["pnl"].cumsum()
+    return pd.DataFrame(rows), equity
@@ -1,5 +1,16 @@
 import requests
 import json
+import queue
+import atexit
+import threading
+import logging
+from config import LOG_FILE, TELEGRAM_QUEUE_SIZE, JOURNAL_FLUSH_TIMEOUT
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
 
 #old one 
 #url = f'https://api.telegram.org/bot{TOKEN}/getUpdates'
@@ -14,5 +25,40 @@ def send_telegram_message(message, CHAT_ID, TOKEN):
         'text': message
     }
     response = requests.post(url, data=data)
-    
 
+
+# ---------- background sender (keeps Telegram's HTTP latency off the order path) ----------
+_outbox = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def _send_loop():
+    while True:
+        message, chat_id, token = _outbox.get()
+        try:
+            send_telegram_message(message, chat_id, token)
+        except Exception as e:
+            logging.error(f"❌ Telegram send failed: {e}")
+        finally:
+            _outbox.task_done()
+
+
+def _drain(timeout=JOURNAL_FLUSH_TIMEOUT):
+    with _outbox.all_tasks_done:
+        _outbox.all_tasks_done.wait_for(lambda: not _outbox.unfinished_tasks, timeout)
+
+
+def send_telegram_message_async(message, CHAT_ID, TOKEN):
+    """Queue the message for the sender thread (in order); dropped with a log line if the queue is full."""
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = threading.Thread(target=_send_loop, name="TelegramSender", daemon=True)
+                _sender.start()
+                atexit.register(_drain)
+    try:
+        _outbox.put_nowait((message, CHAT_ID, TOKEN))
+    except queue.Full:
+        logging.error(f"❌ Telegram queue full, dropped: {message}")
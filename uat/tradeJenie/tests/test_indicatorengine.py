@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_candles
+from indicatorengine import IndicatorEngine
+from strategies import STRATEGIES
+
+SIZES = [1, 2, 5, 60, 500]
+
+
+def assert_matches(inc, batch, spec, label):
+    for col in list(spec.outputs) + ["trend", "buySignal", "sellSignal"]:
+        pd.testing.assert_series_equal(inc[col].reset_index(drop=True), batch[col].reset_index(drop=True),
+                                       check_dtype=False, check_exact=False, rtol=1e-9, check_names=False,
+                                       obj=f"incremental {spec.name}[{col}] {label}")
+
+
+@pytest.mark.parametrize("name", list(STRATEGIES))
+@pytest.mark.parametrize("rows", SIZES)
+def test_replay_matches_batch(name, rows, tmp_path):
+    spec = STRATEGIES[name]
+    df = synthetic_candles(rows)
+    engine = IndicatorEngine(spec.name, rows, "test", spec.incremental, state_dir=str(tmp_path), history=rows)
+    assert_matches(engine.sync(df), spec.batch(df.copy()), spec, f"replay of {rows} rows")
+
+
+@pytest.mark.parametrize("name", list(STRATEGIES))
+def test_next_bars_match_batch(name, tmp_path):
+    """Live use: one new candle per sync, the engine resumed from its saved state."""
+    spec = STRATEGIES[name]
+    df = synthetic_candles(120)
+    engine = IndicatorEngine(spec.name, 1, "test", spec.incremental, state_dir=str(tmp_path))
+    engine.sync(df.iloc[:100])
+    for end in range(101, len(df) + 1):
+        inc = engine.sync(df.iloc[:end])
+        assert_matches(inc, spec.batch(df.iloc[:end].copy()).iloc[-len(inc):], spec, f"at bar {end}")
+    resumed = IndicatorEngine(spec.name, 1, "test", spec.incremental, state_dir=str(tmp_path))
+    assert resumed.last_date == engine.last_date
+    assert_matches(resumed.sync(df), spec.batch(df.copy()).iloc[-len(inc):], spec, "after resume")
+    assert resumed.stats["reseeds"] == 0
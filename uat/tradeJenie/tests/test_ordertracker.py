@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+import kitefunction
+from kitefunction import place_option_market_order, place_aggressive_limit_order
+from ordertracker import OrderTracker, order_tracker
+from tickerstream import FakeTicker
+
+USER = {"id": 1, "user": "order_test"}
+CONFIG = {"KEY": "TEST", "REAL_TRADE": "yes"}
+
+
+def postback(order_id, status="COMPLETE", qty=75, price=101.25):
+    return {"order_id": order_id, "status": status, "filled_quantity": qty, "average_price": price}
+
+
+class FakeKite:
+    """Kite client double: place_order can push the postback before it returns."""
+    TRANSACTION_TYPE_SELL = "SELL"
+    TRANSACTION_TYPE_BUY = "BUY"
+    VARIETY_REGULAR = "regular"
+    ORDER_TYPE_MARKET = "MARKET"
+    ORDER_TYPE_LIMIT = "LIMIT"
+    PRODUCT_NRML = "NRML"
+
+    def __init__(self, ticker=None, update=None, history=None):
+        self.ticker = ticker
+        self.update = update
+        self.history = history or []
+        self.history_calls = 0
+        self.cancelled = []
+
+    def place_order(self, **kwargs):
+        if self.ticker and self.update:
+            self.ticker.push_order_update(self.update)
+        return "OID1"
+
+    def modify_order(self, **kwargs):
+        pass
+
+    def cancel_order(self, variety, order_id):
+        self.cancelled.append(order_id)
+
+    def quote(self, symbol):
+        return {symbol: {"depth": {"buy": [{"price": 100.0}], "sell": [{"price": 100.5}]}}}
+
+    def order_history(self, order_id):
+        self.history_calls += 1
+        return self.history
+
+
+@pytest.fixture
+def ticker():
+    ticker = FakeTicker()
+    ticker.on_order_update = order_tracker.on_order_update
+    return ticker
+
+
+@pytest.fixture
+def live():
+    order_tracker.set_live(USER["user"], True)
+    yield
+    order_tracker.set_live(USER["user"], False)
+
+
+def use_kite(monkeypatch, kite):
+    monkeypatch.setattr(kitefunction, "get_kite_client", lambda user: kite)
+
+
+def test_update_before_expect_is_kept():
+    tracker = OrderTracker()
+    ticker = FakeTicker()
+    ticker.on_order_update = tracker.on_order_update
+    ticker.push_order_update(postback("A1", "OPEN", qty=0))
+    ticker.push_order_update(postback("A1"))
+    assert tracker.wait_fill("A1", 0) == postback("A1")
+
+
+def test_partial_fill_is_latest_not_terminal():
+    tracker = OrderTracker()
+    tracker.on_order_update(None, postback("A2", "OPEN", qty=25))
+    assert tracker.wait_fill("A2", 0.01) is None
+    assert tracker.latest("A2")["filled_quantity"] == 25
+    assert tracker.stats["timeouts"] == 1
+
+
+def test_ttl_sweep_drops_unregistered_orders():
+    tracker = OrderTracker(ttl=0.05)
+    ticker = FakeTicker()
+    ticker.on_order_update = tracker.on_order_update
+    for i in range(20):
+        ticker.push_order_update(postback(f"OTHER{i}"))
+    tracker.expect("MINE")
+    ticker.push_order_update(postback("MINE", "OPEN", qty=0))
+    time.sleep(0.06)
+    ticker.push_order_update(postback("LATE"))   # the next update runs the sweep
+    assert tracker.latest("OTHER0") is None
+    assert tracker.stats["dropped"] == 20
+    assert tracker.latest("MINE")["status"] == "OPEN"
+    assert tracker.latest("LATE") is not None
+
+
+def test_market_order_fill_from_update(monkeypatch, ticker, live):
+    kite = FakeKite(ticker, update=postback("OID1", price=98.4))
+    use_kite(monkeypatch, kite)
+    assert place_option_market_order("NIFTY_CE", 75, "SELL", CONFIG, USER) == ("OID1", 98.4, 75)
+    assert kite.history_calls == 0
+    assert order_tracker.latest("OID1") is None   # forgotten on return
+
+
+def test_market_order_timeout_falls_back_to_rest(monkeypatch, ticker, live):
+    history = [{"order_id": "OID1", "quantity": 75, "status": "COMPLETE", "average_price": 97.0}]
+    kite = FakeKite(ticker, history=history)
+    use_kite(monkeypatch, kite)
+    monkeypatch.setattr(kitefunction, "ORDER_FILL_TIMEOUT", 0.05)
+    timeouts = order_tracker.stats["timeouts"]
+    assert place_option_market_order("NIFTY_CE", 75, "SELL", CONFIG, USER) == ("OID1", 97.0, 75)
+    assert kite.history_calls == 1
+    assert order_tracker.stats["timeouts"] == timeouts + 1
+    assert order_tracker.latest("OID1") is None
+
+
+def test_market_order_not_live_uses_rest(monkeypatch, ticker):
+    history = [{"order_id": "OID1", "quantity": 75, "status": "COMPLETE", "average_price": 97.0}]
+    kite = FakeKite(ticker, update=postback("OID1", price=98.4), history=history)
+    use_kite(monkeypatch, kite)
+    assert place_option_market_order("NIFTY_CE", 75, "SELL", CONFIG, USER) == ("OID1", 97.0, 75)
+    assert kite.history_calls == 1
+
+
+def test_market_order_failure_forgets(monkeypatch, ticker, live):
+    use_kite(monkeypatch, FakeKite(ticker, update=postback("OID1")))
+
+    def on_ack(order_id):
+        raise RuntimeError("ack failed")
+
+    assert place_option_market_order("NIFTY_CE", 75, "SELL", CONFIG, USER, on_ack=on_ack) == ("SIMULATED_ORDER", None, 0)
+    assert order_tracker.latest("OID1") is None
+
+
+def test_limit_order_fill_from_update_forgets(monkeypatch, ticker, live):
+    kite = FakeKite(ticker, update=postback("OID1", price=99.95))
+    use_kite(monkeypatch, kite)
+    assert place_aggressive_limit_order("NIFTY_CE", 75, "SELL", CONFIG, USER, timeout=1) == ("OID1", 99.95, 75)
+    assert kite.history_calls == 0
+    assert order_tracker.latest("OID1") is None
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_candles
+from commonFunction import generate_god_signals, generate_god_signals_old, convertIntoHeikinashi, convertIntoHeikinashi_old
+
+SIZES = [0, 1, 2, 5, 50, 1000, 20000]
+GOD_COLUMNS = ["ema1", "ema2", "crossover", "crossunder", "trend", "twoAbove", "twoBelow", "buySignal", "sellSignal"]
+HA_COLUMNS = ["open", "high", "low", "close"]
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_god_signals_match_loop_version(rows):
+    df = synthetic_candles(rows)
+    new = generate_god_signals(df.copy())
+    old = generate_god_signals_old(df.copy())
+    for col in GOD_COLUMNS:
+        pd.testing.assert_series_equal(new[col], old[col], check_dtype=False, check_exact=True,
+                                       obj=f"generate_god_signals[{col}] at {rows} rows")
+
+
+@pytest.mark.parametrize("rows", SIZES[1:])
+def test_heikin_ashi_matches_loop_version(rows):
+    df = synthetic_candles(rows)
+    new = convertIntoHeikinashi(df.copy())
+    old = convertIntoHeikinashi_old(df.copy())
+    for col in HA_COLUMNS:
+        pd.testing.assert_series_equal(new[col], old[col], check_dtype=False, check_exact=False, rtol=1e-12,
+                                       obj=f"convertIntoHeikinashi[{col}] at {rows} rows")
+
+
+def test_heikin_ashi_empty_frame():
+    # The loop version indexes the first candle; the vectorized one passes an empty frame through
+    df = synthetic_candles(0)
+    pd.testing.assert_frame_equal(convertIntoHeikinashi(df), df)
@@ -0,0 +1,108 @@
+import datetime
+import time
+import types
+
+import pytest
+
+import tickerstream
+from tickerstream import FakeTicker, TickerStream, PositionWatch
+from kitefunction import quote_hub
+from ordertracker import order_tracker
+from config import TARGET_EXIT_RATIO
+
+USER = {"id": 1, "user": "tick_test"}
+TOKENS = {"NIFTY_CE": 101, "NIFTY_PE": 102}
+ENTRY = 100.0
+
+
+def tick(token, ltp):
+    return {"instrument_token": token, "last_price": ltp}
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    kite = types.SimpleNamespace(api_key="key", access_token="token")
+    monkeypatch.setattr(tickerstream, "get_kite_client", lambda user: kite)
+    monkeypatch.setattr(tickerstream, "get_token_for_symbol", TOKENS.get)
+    stream = TickerStream(USER, ticker_factory=lambda *a: FakeTicker(ticks=[]))
+    assert stream.start()
+    assert wait_until(lambda: stream.stats["connects"] == 1)
+    yield stream
+    stream.stop()
+
+
+def at(hour, minute):
+    """tickerstream.datetime stand-in whose now() is today at hour:minute."""
+    class _Now(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(datetime.date.today(), datetime.time(hour, minute))
+    return types.SimpleNamespace(datetime=_Now, time=datetime.time)
+
+
+def test_set_live_follows_connection(stream):
+    assert order_tracker.is_live(USER)
+    stream.ticker.close()
+    assert not order_tracker.is_live(USER)
+
+
+def test_target_hit_on_first_qualifying_tick(stream, monkeypatch):
+    monkeypatch.setattr(tickerstream, "datetime", at(10, 0))
+    watch = PositionWatch(stream, {"OptionSymbol": "NIFTY_CE", "OptionSellPrice": ENTRY}, "no")
+    target = TARGET_EXIT_RATIO * ENTRY
+
+    stream.ticker.push_ticks([tick(101, ENTRY), tick(101, target + 0.05)])
+    assert watch.reason is None and not watch.event.is_set()
+
+    stream.ticker.push_ticks([tick(101, target)])
+    assert watch.reason == "TARGET_HIT" and watch.event.is_set()
+
+    stream.ticker.push_ticks([tick(101, ENTRY)])
+    assert watch.reason == "TARGET_HIT"
+    watch.close()
+
+
+def test_tick_reaches_quote_hub(stream):
+    watch = PositionWatch(stream, {"OptionSymbol": "NIFTY_CE", "OptionSellPrice": ENTRY}, "no")
+    stream.ticker.push_ticks([tick(101, 87.5)])
+    assert quote_hub.get("NFO:NIFTY_CE") == 87.5
+    watch.close()
+
+
+@pytest.mark.parametrize("intraday, hour, minute, reason", [
+    ("yes", 15, 14, None),
+    ("yes", 15, 15, "INTRADAY_EXIT"),
+    ("no", 15, 20, None),
+])
+def test_intraday_exit_after_cutoff(stream, monkeypatch, intraday, hour, minute, reason):
+    monkeypatch.setattr(tickerstream, "datetime", at(hour, minute))
+    watch = PositionWatch(stream, {"OptionSymbol": "NIFTY_CE", "OptionSellPrice": ENTRY}, intraday)
+    stream.ticker.push_ticks([tick(101, ENTRY)])
+    assert watch.reason == reason
+    assert watch.event.is_set() == (reason is not None)
+    watch.close()
+
+
+def test_unwatched_tokens_are_ignored(stream, monkeypatch):
+    monkeypatch.setattr(tickerstream, "datetime", at(15, 30))
+    trade = {"OptionSymbol": "NIFTY_CE", "OptionSellPrice": ENTRY, "hedge_option_symbol": "NIFTY_PE"}
+    watch = PositionWatch(stream, trade, "yes")
+    assert stream.ticker.subscribed == {101, 102}
+
+    watch.close()
+    assert stream.ticker.subscribed == set()
+    ticks = stream.stats["ticks"]
+    stream.ticker.push_ticks([tick(101, 1.0), tick(102, 1.0)])
+    # Delivered anyway (as a late websocket frame would be): no listener left to fire
+    stream._on_ticks(stream.ticker, [tick(101, 1.0)])
+    assert watch.reason is None and not watch.event.is_set()
+    assert stream.stats["ticks"] == ticks + 1
@@ -0,0 +1,274 @@
+import time
+import datetime
+import threading
+import logging
+from kiteconnect import KiteTicker
+from kitefunction import get_kite_client, get_token_for_symbol, quote_hub
+from ordertracker import order_tracker
+from config import LOG_FILE, TARGET_EXIT_RATIO
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+
+class FakeTicker:
+    """
+    Local stand-in for KiteTicker with the same callback interface.
+    Replays a recorded list of tick batches (each a list of tick dicts with
+    'instrument_token' and 'last_price') after connect(), and lets a harness
+    push ticks directly with push_ticks() and order updates (postback dicts with
+    'order_id', 'status', 'filled_quantity', 'average_price') with
+    push_order_update(). Only subscribed tokens are delivered.
+    Usage: TickerStream(user, ticker_factory=lambda api_key, token: FakeTicker(ticks=batches))
+    """
+    MODE_LTP = "ltp"
+    MODE_QUOTE = "quote"
+    MODE_FULL = "full"
+
+    def __init__(self, api_key=None, access_token=None, ticks=None, delay=0.0):
+        self.on_ticks = None
+        self.on_connect = None
+        self.on_close = None
+        self.on_error = None
+        self.on_reconnect = None
+        self.on_noreconnect = None
+        self.on_order_update = None
+        self.subscribed = set()
+        self.modes = {}
+        self._ticks = list(ticks or [])
+        self._delay = delay
+        self._connected = False
+
+    def connect(self, threaded=False, **kwargs):
+        self._connected = True
+        if threaded:
+            threading.Thread(target=self._replay, name="FakeTicker", daemon=True).start()
+        else:
+            self._replay()
+
+    def _replay(self):
+        if self.on_connect:
+            self.on_connect(self, {})
+        for batch in self._ticks:
+            if not self._connected:
+                break
+            self.push_ticks(batch)
+            if self._delay:
+                time.sleep(self._delay)
+
+    def push_order_update(self, data):
+        if self.on_order_update:
+            self.on_order_update(self, data)
+
+    def push_ticks(self, ticks):
+        ticks = [t for t in ticks if t.get("instrument_token") in self.subscribed]
+        if ticks and self.on_ticks:
+            self.on_ticks(self, ticks)
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, instrument_tokens):
+        self.subscribed.update(instrument_tokens)
+        return True
+
+    def unsubscribe(self, instrument_tokens):
+        self.subscribed.difference_update(instrument_tokens)
+        return True
+
+    def set_mode(self, mode, instrument_tokens):
+        for t in instrument_tokens:
+            self.modes[t] = mode
+        return True
+
+    def close(self, code=None, reason=None):
+        self._connected = False
+        if self.on_close:
+            self.on_close(self, code, reason)
+
+    def stop(self):
+        self.close()
+
+
+def _kite_ticker_factory(api_key, access_token):
+    return KiteTicker(api_key, access_token)
+
+
+class TickerStream:
+    """
+    One websocket ticker connection per user. Watched symbols are subscribed
+    by instrument token; every tick is published into the shared quote hub
+    snapshot and fanned out to per-token listeners.
+    """
+
+    def __init__(self, user, ticker_factory=None):
+        self.user = user
+        self.ticker_factory = ticker_factory or _kite_ticker_factory
+        self.ticker = None
+        self._lock = threading.Lock()
+        self._symbols = {}     # instrument_token -> "EXCHANGE:SYMBOL"
+        self._listeners = {}   # instrument_token -> [callback(tick)]
+        self.stats = {"ticks": 0, "connects": 0, "errors": 0}
+
+    def start(self):
+        with self._lock:
+            if self.ticker is not None:
+                return True
+            kite = get_kite_client(self.user)
+            if kite is None:
+                logging.error(f"{self.user['user']} | Ticker stream not started: no Kite client")
+                return False
+            self.ticker = self.ticker_factory(kite.api_key, kite.access_token)
+            self.ticker.on_ticks = self._on_ticks
+            self.ticker.on_connect = self._on_connect
+            self.ticker.on_close = self._on_close
+            self.ticker.on_error = self._on_error
+            self.ticker.on_order_update = order_tracker.on_order_update
+        self.ticker.connect(threaded=True)
+        logging.info(f"ℹ️ {self.user['user']} | Ticker stream connecting")
+        return True
+
+    def stop(self):
+        with self._lock:
+            ticker, self.ticker = self.ticker, None
+        order_tracker.set_live(self.user['user'], False)
+        if ticker is not None:
+            ticker.close()
+
+    def is_connected(self):
+        return self.ticker is not None and self.ticker.is_connected()
+
+    # ---------- subscriptions ----------
+    def watch(self, symbol, callback=None, exchange="NFO"):
+        token = get_token_for_symbol(symbol)
+        if token is None:
+            return None
+        return self.watch_token(token, f"{exchange}:{symbol}", callback)
+
+    def watch_token(self, token, full_symbol, callback=None):
+        with self._lock:
+            new = token not in self._symbols
+            self._symbols[token] = full_symbol
+            if callback is not None:
+                self._listeners.setdefault(token, []).append(callback)
+        if new and self.is_connected():
+            self.ticker.subscribe([token])
+            self.ticker.set_mode(self.ticker.MODE_LTP, [token])
+        return token
+
+    def unwatch(self, symbol, callback=None):
+        token = get_token_for_symbol(symbol)
+        if token is None:
+            return
+        with self._lock:
+            listeners = self._listeners.get(token, [])
+            if callback in listeners:
+                listeners.remove(callback)
+            if listeners:
+                return
+            self._listeners.pop(token, None)
+            self._symbols.pop(token, None)
+        if self.is_connected():
+            self.ticker.unsubscribe([token])
+
+    # ---------- ticker callbacks ----------
+    def _on_connect(self, ws, response):
+        self.stats["connects"] += 1
+        order_tracker.set_live(self.user['user'], True)
+        with self._lock:
+            tokens = list(self._symbols)
+        if tokens:
+            ws.subscribe(tokens)
+            ws.set_mode(ws.MODE_LTP, tokens)
+        logging.info(f"✅ {self.user['user']} | Ticker stream connected, {len(tokens)} tokens subscribed")
+
+    def _on_ticks(self, ws, ticks):
+        prices = {}
+        with self._lock:
+            for tick in ticks:
+                symbol = self._symbols.get(tick.get("instrument_token"))
+                if symbol and tick.get("last_price") is not None:
+                    prices[symbol] = tick["last_price"]
+            listeners = [(tick, list(self._listeners.get(tick.get("instrument_token"), []))) for tick in ticks]
+        self.stats["ticks"] += len(ticks)
+        if prices:
+            quote_hub.update(prices)
+        for tick, callbacks in listeners:
+            for callback in callbacks:
+                try:
+                    callback(tick)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logging.error(f"{self.user['user']} | Tick listener error: {e}")
+
+    def _on_close(self, ws, code, reason):
+        order_tracker.set_live(self.user['user'], False)
+        logging.warning(f"{self.user['user']} | Ticker stream closed: {code} {reason}")
+
+    def _on_error(self, ws, code, reason):
+        self.stats["errors"] += 1
+        logging.error(f"{self.user['user']} | Ticker stream error: {code} {reason}")
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def get_ticker_stream(user, ticker_factory=None):
+    with _streams_lock:
+        stream = _streams.get(user['user'])
+        if stream is None:
+            stream = TickerStream(user, ticker_factory)
+            _streams[user['user']] = stream
+    return stream
+
+
+class PositionWatch:
+    """
+    Event-driven target / intraday-exit check for one open position.
+    Each tick on the sold option is checked against TARGET_EXIT_RATIO of the
+    entry price (and the 15:15 intraday cut-off); a hit sets `event` so the
+    trading thread wakes up immediately instead of at its next poll.
+    """
+
+    def __init__(self, stream, trade, intraday):
+        self.stream = stream
+        self.symbol = trade["OptionSymbol"]
+        self.entry_ltp = trade.get("OptionSellPrice")
+        self.intraday = str(intraday).lower() == "yes"
+        self.hedge_symbol = trade.get("hedge_option_symbol")
+        if self.hedge_symbol in (None, "-"):
+            self.hedge_symbol = None
+        self.event = threading.Event()
+        self.reason = None
+        stream.watch(self.symbol, self._on_tick)
+        if self.hedge_symbol:
+            stream.watch(self.hedge_symbol, self._on_hedge_tick)
+
+    def _on_tick(self, tick):
+        if self.reason is not None:
+            return  # fire once per position, the trading thread takes it from here
+        ltp = tick.get("last_price")
+        if ltp is not None and self.entry_ltp and ltp <= TARGET_EXIT_RATIO * self.entry_ltp:
+            self.reason = "TARGET_HIT"
+            self.event.set()
+        elif self.intraday and datetime.datetime.now().time() >= datetime.time(15, 15):
+            self.reason = "INTRADAY_EXIT"
+            self.event.set()
+
+    def _on_hedge_tick(self, tick):
+        # Hedge ticks only keep the hedge LTP fresh in the quote snapshot
+        pass
+
+    def wait(self, timeout):
+        fired = self.event.wait(max(0.0, timeout))
+        self.event.clear()
+        return fired
+
+    def close(self):
+        self.stream.unwatch(self.symbol, self._on_tick)
+        if self.hedge_symbol:
+            self.stream.unwatch(self.hedge_symbol, self._on_hedge_tick)
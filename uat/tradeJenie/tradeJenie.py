@@ -6,10 +6,17 @@ from datetime import timedelta
 import pandas as pd
 import sqlite3
 import logging
-from commonFunction import close_position_and_no_new_trade, convertIntoHeikinashi, delete_open_position, generate_god_signals, get_next_candle_time, get_optimal_option, get_trade_configs, hd_strategy, init_db, is_market_open, load_open_position, railway_track_strategy, record_trade, save_open_position, wait_until_next_candle, who_tried, will_market_open_within_minutes,get_hedge_option,get_lot_size
-from config import  HEDGE_NEAREST_LTP, SYMBOL,SEGMENT, CANDLE_DAYS as DAYS, REQUIRED_CANDLES, LOG_FILE,INSTRUMENTS_FILE, OPTION_SYMBOL, SERVER
-from kitefunction import get_historical_df, place_option_hybrid_order, get_token_for_symbol, get_quotes
-from telegrambot import send_telegram_message
+from commonFunction import close_position_and_no_new_trade, config_store, delete_open_position, get_next_candle_time, get_optimal_option, get_trade_configs, init_db, is_market_open, load_open_position, record_trade, save_open_position, wait_until_next_candle, who_tried, will_market_open_within_minutes,get_hedge_option,get_lot_size,get_option_with_hedge
+from config import  HEDGE_NEAREST_LTP, SYMBOL,SEGMENT, CANDLE_DAYS as DAYS, REQUIRED_CANDLES, LOG_FILE,INSTRUMENTS_FILE, OPTION_SYMBOL, SERVER, USE_TICKER_STREAM, STREAM_MONITOR_INTERVAL, TARGET_EXIT_RATIO, USE_INDICATOR_ENGINE, RECORD_OPTION_CHAIN
+from kitefunction import get_historical_df, place_option_hybrid_order, place_multi_leg_order, get_token_for_symbol, get_quotes
+from tickerstream import PositionWatch, get_ticker_stream
+from candlebuilder import get_candle_builder
+from indicatorengine import get_indicator_engine
+from signalbus import SignalBus
+from recorder import chain_recorder
+from supervisor import StrategySupervisor
+from strategies import get_strategy
+from telegrambot import send_telegram_message, send_telegram_message_async
 import importlib
 import threading
 import pandas as pd
@@ -31,8 +38,79 @@ if instrument_token is None:
     exit(1)
 logging.info(f"ℹ️ Instrument token for {SYMBOL}: {instrument_token} at current time {current_time}")
 
+def wait_for_next_check(position_watch, trade, config, user, next_candle_time):
+    """
+    Pause between two monitoring checks of the open position.
+    REST mode sleeps 7-15s. Streaming mode blocks on the position's ticks and
+    wakes up on the tick that hits the target / intraday exit (or at the next candle).
+    Returns the PositionWatch to reuse on the next call.
+    """
+    stream = get_ticker_stream(user) if USE_TICKER_STREAM else None
+    if stream is None or not stream.is_connected():
+        random_number = random.randint(7, 15)
+        time.sleep(random_number)
+        return position_watch
+
+    symbol = trade.get("OptionSymbol") if trade else None
+    if position_watch is not None and (symbol != position_watch.symbol or trade.get("OptionSellPrice") != position_watch.entry_ltp):
+        position_watch.close()
+        position_watch = None
+    if position_watch is None and symbol:
+        position_watch = PositionWatch(stream, trade, config['INTRADAY'])
+
+    timeout = min(STREAM_MONITOR_INTERVAL, (next_candle_time - datetime.datetime.now()).total_seconds())
+    if position_watch is not None:
+        position_watch.wait(timeout)
+    else:
+        time.sleep(max(0.0, timeout))
+    return position_watch
+
+
+def get_candles(interval, user, days=DAYS):
+    """
+    Signal candles. Bars built locally from the index ticks when the ticker
+    stream is live (closed the instant the bucket ends), otherwise the
+    REST-backed candle store.
+    """
+    if USE_TICKER_STREAM:
+        builder = get_candle_builder(instrument_token, interval, user)
+        if builder.is_live():
+            return builder.history(days, user)
+    return get_historical_df(instrument_token, interval, days, user)
+
+
+def get_next_check_time(interval, user):
+    """Exact bar end when bars are built locally, else the REST candle time (with its 5s buffer)."""
+    if USE_TICKER_STREAM:
+        builder = get_candle_builder(instrument_token, interval, user)
+        next_close = builder.next_close()
+        if next_close and builder.is_live():
+            return next_close
+    return get_next_candle_time(interval)
+
+
+def compute_signal_frame(strategy, interval, user):
+    """Candles + strategy signals for one (strategy, interval); None if there are not enough candles."""
+    spec = get_strategy(strategy)
+    df = get_candles(interval, user, spec.candle_days(interval))
+    print(f"🕵️‍♀️ {SERVER}  |  {strategy}  |  {interval} Candles available: {len(df)} / Required: {REQUIRED_CANDLES}")
+    if len(df) < REQUIRED_CANDLES:
+        return None
+
+    if USE_INDICATOR_ENGINE:
+        return get_indicator_engine(instrument_token, interval, spec.name, spec.incremental).sync(df)
+    return spec.batch(df)
+
+
+# Every config thread running the same strategy/interval shares one frame per bar
+signal_bus = SignalBus(compute=compute_signal_frame,
+                       expires_at=lambda strategy, interval, user: get_next_check_time(interval, user))
+
+
 # ====== Main Live Trading Loconfig['REAL_TRADE']op ======
-def live_trading(instruments_df, config, key, user):
+def live_trading(instruments_df, config, key, user, stop_event=None):
+    position_watch = None
+    stop_event = stop_event or threading.Event()   # set by the config supervisor to drain this key
 
     if config['REAL_TRADE'].lower() != "yes":
         print(f"🚫 {user['user']} {SERVER}  |  {key}  | TRADE mode is OFF SIMULATED_ORDER will be tracked")
@@ -61,9 +139,18 @@ def live_trading(instruments_df, config, key, user):
    
         try:
             configs = get_trade_configs(user['id'])
-            config = configs[key]
+            if key not in configs:
+                logging.warning(f"⚠️ {user['user']} {SERVER}  |  {key}  | Trade config not found, keeping the last one loaded")
+            config = dict(configs.get(key, config))   # shared snapshot is read-only; QTY is per thread
             lot_size = get_lot_size(config, instruments_df)
             config['QTY'] = lot_size*int(config['LOT'])
+            if stop_event.is_set():
+                if trade == {}:
+                    print(f"🛑 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Trade config removed and no live trade present. Stopping.")
+                    logging.info(f"🛑 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Trade config removed and no live trade present. Stopping.")
+                    send_telegram_message(f"🛑 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Trade config removed and no live trade present. Stopping.",user['telegram_chat_id'], user['telegram_token'])
+                    break
+                config['NEW_TRADE'] = "no"   # draining: manage the open trade to its exit, no new entries
             if config['NEW_TRADE'].lower() == "no" and trade == {}:   
                 print(f"🚫 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']}, There is no live trade present, No new trades allowed. So Closing the program")
                 logging.info(f"🚫{user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']}, There is no live trade present, No new trades allowed. So Closing the program")
@@ -89,22 +176,13 @@ def live_trading(instruments_df, config, key, user):
                 send_telegram_message(f"🕒 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']}, There is no live trade present, No new trades allowed. So Closing the program",user['telegram_chat_id'], user['telegram_token'])
                 break     
 
-            df = get_historical_df(instrument_token, config['INTERVAL'], DAYS, user)
-            print(f"🕵️‍♀️ {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Candles available: {len(df)} / Required: {REQUIRED_CANDLES}")
+            df = signal_bus.get(config['STRATEGY'], config['INTERVAL'], user)
 
-            if len(df) < REQUIRED_CANDLES:
+            if df is None:
                 print(f"⚠️ {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Not enough candles. Waiting...")
                 time.sleep(60)
                 continue
             
-            if config['STRATEGY'] == "GOD":
-                df = generate_god_signals(df)
-            elif config['STRATEGY'] == "HDSTRATEGY":
-                df = convertIntoHeikinashi(df)
-                df = hd_strategy(df)
-            elif config['STRATEGY'] == "RAILWAY_TRACK":
-                df = railway_track_strategy(df)
-            
             latest = df.iloc[-1]
             latest_time = pd.to_datetime(latest['date'])
             # now = datetime.now()
@@ -139,8 +217,8 @@ def live_trading(instruments_df, config, key, user):
                         print(f"📥 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exiting SELL: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting SELL: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         
-                        order_id ,avg_price,qty = place_option_hybrid_order(trade["OptionSymbol"], trade["qty"], "BUY",config, user)
-                        hedge_order_id , hedge_avg_price, hedge_qty = place_option_hybrid_order(trade["hedge_option_symbol"], trade["qty"], "SELL", config, user)
+                        (order_id, avg_price, qty), (hedge_order_id, hedge_avg_price, hedge_qty) = place_multi_leg_order(
+                            [(trade["OptionSymbol"], trade["qty"], "BUY"), (trade["hedge_option_symbol"], trade["qty"], "SELL")], config, user)
 
                         logging.info(f"{key} | order_id : {order_id} | opt_symbol : {trade['OptionSymbol']} avg_price : {avg_price} | qty : {qty}")
 
@@ -166,19 +244,15 @@ def live_trading(instruments_df, config, key, user):
                         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting SELL: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         record_trade(trade, config, user['id'])
                         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                        send_telegram_message(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit SELL\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit SELL\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
 
                     if config['NEW_TRADE'].lower() == "no":
                         print(f"🚫 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping BUY signal.")
                         logging.info(f"🚫INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping BUY signal.")
                         break
 
-                    result = get_optimal_option("BUY", close, config['NEAREST_LTP'], instruments_df, config, user)
+                    result, hedge_result = get_option_with_hedge("BUY", close, config['NEAREST_LTP'], instruments_df, config, user)
                     strike = result[1]
-                    if(config['HEDGE_TYPE'] == "H-P10" ):
-                        hedge_result = get_optimal_option("BUY", close, HEDGE_NEAREST_LTP, instruments_df, config, user)
-                    elif(config['HEDGE_TYPE'] == "H-M100" or config['HEDGE_TYPE'] == "H-M200" ):
-                        hedge_result = get_hedge_option("BUY", close, strike, instruments_df, config, user)
                     
                     
                     if result is None or result[0] is None or hedge_result is None or hedge_result[0] is None:
@@ -191,16 +265,15 @@ def live_trading(instruments_df, config, key, user):
 
                         print(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering HEDGE BUY: {hedge_opt_symbol} | Strike: {hedge_strike} | Expiry: {hedge_expiry} | LTP: ₹{hedge_ltp:.2f}")
                         logging.info(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering HEDGE BUY: {hedge_opt_symbol} | Strike: {hedge_strike} | Expiry: {hedge_expiry} | LTP: ₹{hedge_ltp:.2f}")
-                        hedge_order_id, hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_opt_symbol, config['QTY'], "BUY", config, user)
 
                         print(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering BUY: {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
                         logging.info(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering BUY: {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
 
                         
-                        order_id ,avg_price,qty = place_option_hybrid_order(opt_symbol, config['QTY'], "SELL", config, user)
+                        (hedge_order_id, hedge_avg_price, hedge_qty), (order_id, avg_price, qty) = place_multi_leg_order(
+                            [(hedge_opt_symbol, config['QTY'], "BUY"), (opt_symbol, config['QTY'], "SELL")], config, user)
                         logging.info(f"{key} | order_id : {order_id} | opt_symbol : {opt_symbol} avg_price : {avg_price} | qty : {qty}")
                         logging.info(f"📤INTERVAL {config['INTERVAL']} | Entering BUY: Selling PE {opt_symbol} | Qty: {config['QTY']}")
-                        time.sleep(2)
                         
                         if hedge_avg_price is None:
                             hedge_avg_price = hedge_ltp
@@ -224,7 +297,7 @@ def live_trading(instruments_df, config, key, user):
                         }
                         save_open_position(trade, config, user['id'])
                         position = "BUY"
-                        send_telegram_message(f"🟢INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Buy Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"🟢INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Buy Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
 
                 # ✅ SELL SIGNAL
                 elif latest['sellSignal'] and position != "SELL":
@@ -239,8 +312,8 @@ def live_trading(instruments_df, config, key, user):
                         print(f"📥 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         
-                        order_id ,avg_price,qty = place_option_hybrid_order(trade["OptionSymbol"], trade["qty"], "BUY", config, user)
-                        hedge_order_id , hedge_avg_price, hedge_qty = place_option_hybrid_order(trade["hedge_option_symbol"], trade["qty"], "SELL", config, user)
+                        (order_id, avg_price, qty), (hedge_order_id, hedge_avg_price, hedge_qty) = place_multi_leg_order(
+                            [(trade["OptionSymbol"], trade["qty"], "BUY"), (trade["hedge_option_symbol"], trade["qty"], "SELL")], config, user)
 
                         logging.info(f"{key} | order_id : {order_id} | opt_symbol : {trade['OptionSymbol']} avg_price : {avg_price} | qty : {qty}")
                         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting BUY: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
@@ -263,19 +336,15 @@ def live_trading(instruments_df, config, key, user):
                         })
                         record_trade(trade, config, user['id'])
                         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                        send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
 
                     if config['NEW_TRADE'].lower() == "no":
                         print(f"🚫INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping SELL signal.")
                         logging.info(f"🚫INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping SELL signal.")
                         break
 
-                    result = get_optimal_option("SELL", close, config['NEAREST_LTP'], instruments_df, config, user)
+                    result, hedge_result = get_option_with_hedge("SELL", close, config['NEAREST_LTP'], instruments_df, config, user)
                     strike = result[1]
-                    if(config['HEDGE_TYPE'] == "H-P10" ):
-                        hedge_result = get_optimal_option("SELL", close, HEDGE_NEAREST_LTP, instruments_df, config, user)
-                    elif(config['HEDGE_TYPE'] == "H-M100" or config['HEDGE_TYPE'] == "H-M200" ):
-                        hedge_result = get_hedge_option("SELL", close, strike, instruments_df, config, user)
                     
                     if result is None or result[0] is None or hedge_result is None or hedge_result[0] is None:
                         logging.error(f"❌INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']}: No suitable option found for SELL signal.")
@@ -287,16 +356,14 @@ def live_trading(instruments_df, config, key, user):
 
                         print(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering HEDGE BUY: {hedge_opt_symbol} | Strike: {hedge_strike} | Expiry: {hedge_expiry} | LTP: ₹{hedge_ltp:.2f}")
                         logging.info(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering HEDGE BUY: {hedge_opt_symbol} | Strike: {hedge_strike} | Expiry: {hedge_expiry} | LTP: ₹{hedge_ltp:.2f}")
-                        hedge_order_id, hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_opt_symbol, config['QTY'], "BUY", config, user)
 
                         print(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering SELL: {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
                         logging.info(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Entering SELL: {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
                         
-                        order_id ,avg_price,qty = place_option_hybrid_order(opt_symbol, config['QTY'], "SELL", config, user)
+                        (hedge_order_id, hedge_avg_price, hedge_qty), (order_id, avg_price, qty) = place_multi_leg_order(
+                            [(hedge_opt_symbol, config['QTY'], "BUY"), (opt_symbol, config['QTY'], "SELL")], config, user)
                         logging.info(f"{key} | order_id : {order_id} | opt_symbol : {opt_symbol} avg_price : {avg_price} | qty : {qty}")
-                        (opt_symbol, config['QTY'], "SELL")
                         logging.info(f"📤 Entering SELL: Selling CE {opt_symbol} | Qty: {config['QTY']}")
-                        time.sleep(2)
                     
                         if hedge_avg_price is None:
                             hedge_avg_price = hedge_ltp
@@ -319,13 +386,15 @@ def live_trading(instruments_df, config, key, user):
                         }
                         save_open_position(trade, config, user['id'])
                         position = "SELL"
-                        send_telegram_message(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Sell Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Sell Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
 
 
-                next_candle_time = get_next_candle_time(config['INTERVAL'])
+                next_candle_time = get_next_check_time(config['INTERVAL'], user)
                 # ✅ Add this flag before the while loop
                 target_hit = False
                 while datetime.datetime.now() < next_candle_time:
+                    if stop_event.is_set() and not trade:
+                        break   # config removed while flat: stop now instead of at the next candle
                     # Actively monitor current position LTP
                     if trade and "OptionSymbol" in trade:
                         current_ltp = get_quotes(trade["OptionSymbol"] ,user)
@@ -352,7 +421,7 @@ def live_trading(instruments_df, config, key, user):
 
 
                         
-                        if current_ltp != None and entry_ltp != None and entry_ltp != 0.0 and current_ltp <= 0.6 * entry_ltp:
+                        if current_ltp != None and entry_ltp != None and entry_ltp != 0.0 and current_ltp <= TARGET_EXIT_RATIO * entry_ltp:
                             
                             hedge_position = {"hedge_option_symbol": trade.get("hedge_option_symbol"),
                                             "hedge_qty": trade.get("hedge_qty"),
@@ -390,7 +459,7 @@ def live_trading(instruments_df, config, key, user):
                             })
                             record_trade(trade, config, user['id'])
                             delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                            send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit {trade['Signal']}\n{trade['OptionSymbol']} @ ₹{current_ltp:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                            send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit {trade['Signal']}\n{trade['OptionSymbol']} @ ₹{current_ltp:.2f}. Hedge Exit Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_sell_price']:.2f} | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
                             logging.info(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Target triggered for {trade['OptionSymbol']} at ₹{current_ltp:.2f}")
 
                             last_expiry = trade["Expiry"]
@@ -407,7 +476,7 @@ def live_trading(instruments_df, config, key, user):
                                 break
                             
                             
-                            result = get_optimal_option(signal, close, config['NEAREST_LTP'], instruments_df, config, user)
+                            result, rollover_hedge_result = get_option_with_hedge(signal, close, config['NEAREST_LTP'], instruments_df, config, user)
                             
                             if result is None or result[0] is None:
                                 logging.error(f"❌INTERVAL {config['INTERVAL']} | No expiry found after {last_expiry} for reentry.")
@@ -416,51 +485,29 @@ def live_trading(instruments_df, config, key, user):
                             else:
                                 opt_symbol, strike, expiry, ltp = result
 
-                                if config['HEDGE_ROLLOVER_TYPE'] == 'SEMI':
-                                    if expiry != last_expiry:
-                                        hedge_order_id , hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_position["hedge_option_symbol"], config["QTY"], "SELL", config, user)
-                                        logging.info(f" {key} | Expiry changed from {last_expiry} to {expiry}. Closing previous hedge position before reentry.")
-                                        logging.info(f" {key} | Previous hedge position {hedge_position['hedge_option_symbol']} sold at ₹{hedge_avg_price} | Qty: {hedge_qty}")
-                                        
-                                        if(config['HEDGE_TYPE'] == "H-P10" ):
-                                            hedge_result = get_optimal_option(signal, close, HEDGE_NEAREST_LTP, instruments_df, config, user)
-                                        elif(config['HEDGE_TYPE'] == "H-M100" or config['HEDGE_TYPE'] == "H-M200" ):
-                                            hedge_result = get_hedge_option(signal, close, strike, instruments_df, config, user)
-                                        
-                                        
-                                        
-                                        if hedge_result is None or hedge_result[0] is None:
-                                            logging.error(f"❌INTERVAL {config['INTERVAL']} | No expiry found after {last_expiry} for hedge reentry.")
-                                            position = None
-                                            continue
-                                        hedge_opt_symbol, hedge_strike, hedge_expiry, hedge_ltp = hedge_result
-                                        hedge_order_id, hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_opt_symbol, config['QTY'], "BUY", config, user)
-                                        if hedge_avg_price is None:
-                                            hedge_avg_price = get_quotes(hedge_opt_symbol, user)
-                                            hedge_qty = config['QTY']
-                                        hedge_position['hedge_option_buy_price'] = hedge_avg_price
-                                        hedge_position['hedge_option_symbol'] = hedge_opt_symbol
-                                        hedge_position['hedge_strike'] = hedge_strike
-                                        hedge_position['hedge_qty'] = hedge_qty
-                                        hedge_position['hedge_entry_time'] = current_time
-                                        hedge_position['expiry'] = hedge_expiry
-                                elif config['HEDGE_ROLLOVER_TYPE'] == 'FULL':
+                                roll_hedge = config['HEDGE_ROLLOVER_TYPE'] == 'FULL' or (config['HEDGE_ROLLOVER_TYPE'] == 'SEMI' and expiry != last_expiry)
+                                if roll_hedge:
                                     hedge_order_id , hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_position["hedge_option_symbol"], config["QTY"], "SELL", config, user)
-                                    logging.info(f" {key} | HEDGE_ROLLOVER_TYPE is True. Closing previous hedge position before reentry.")
+                                    if config['HEDGE_ROLLOVER_TYPE'] == 'SEMI':
+                                        logging.info(f" {key} | Expiry changed from {last_expiry} to {expiry}. Closing previous hedge position before reentry.")
+                                    else:
+                                        logging.info(f" {key} | HEDGE_ROLLOVER_TYPE is True. Closing previous hedge position before reentry.")
                                     logging.info(f" {key} | Previous hedge position {hedge_position['hedge_option_symbol']} sold at ₹{hedge_avg_price} | Qty: {hedge_qty}")
-                                    
-                                    if(config['HEDGE_TYPE'] == "H-P10" ):
-                                        hedge_result = get_optimal_option(signal, close, HEDGE_NEAREST_LTP, instruments_df, config, user)
-                                    elif(config['HEDGE_TYPE'] == "H-M100" or config['HEDGE_TYPE'] == "H-M200" ):
-                                        hedge_result = get_hedge_option(signal, close, strike, instruments_df, config, user)
-                                    
-                                    
+
+                                    hedge_result = rollover_hedge_result
                                     if hedge_result is None or hedge_result[0] is None:
                                         logging.error(f"❌INTERVAL {config['INTERVAL']} | No expiry found after {last_expiry} for hedge reentry.")
                                         position = None
                                         continue
                                     hedge_opt_symbol, hedge_strike, hedge_expiry, hedge_ltp = hedge_result
-                                    hedge_order_id, hedge_avg_price, hedge_qty = place_option_hybrid_order(hedge_opt_symbol, config['QTY'], "BUY", config, user)
+
+                                print(f"🔁 Reentry: {signal} at {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
+                                logging.info(f"🔁INTERVAL {config['INTERVAL']} | Reentry: {signal} at {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
+
+                                if roll_hedge:
+                                    # New hedge and short together, hedge first: the short is not sent unless the hedge is placed
+                                    (hedge_order_id, hedge_avg_price, hedge_qty), (order_id, avg_price, qty) = place_multi_leg_order(
+                                        [(hedge_opt_symbol, config['QTY'], "BUY"), (opt_symbol, config['QTY'], "SELL")], config, user)
                                     if hedge_avg_price is None:
                                         hedge_avg_price = get_quotes(hedge_opt_symbol, user)
                                         hedge_qty = config['QTY']
@@ -470,17 +517,12 @@ def live_trading(instruments_df, config, key, user):
                                     hedge_position['hedge_qty'] = hedge_qty
                                     hedge_position['hedge_entry_time'] = current_time
                                     hedge_position['expiry'] = hedge_expiry
-
-                                time.sleep(2)
-
-                                print(f"🔁 Reentry: {signal} at {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
-                                logging.info(f"🔁INTERVAL {config['INTERVAL']} | Reentry: {signal} at {opt_symbol} | Strike: {strike} | Expiry: {expiry} | LTP: ₹{ltp:.2f}")
-                                
-                                order_id ,avg_price,qty = place_option_hybrid_order(opt_symbol, config['QTY'], "SELL", config, user)
+                                else:
+                                    # The current hedge stays in place
+                                    order_id ,avg_price,qty = place_option_hybrid_order(opt_symbol, config['QTY'], "SELL", config, user)
 
                                 logging.info(f"{key} | order_id : {order_id} | opt_symbol : {opt_symbol} avg_price : {avg_price} | qty : {qty}")
                                 logging.info(f"🔁INTERVAL {config['INTERVAL']} | Reentry: Selling {opt_symbol} | Qty: {config['QTY']}")
-                                time.sleep(2)
 
                                 if avg_price is None:
                                     avg_price = ltp
@@ -509,12 +551,11 @@ def live_trading(instruments_df, config, key, user):
 
                                 }
                                 save_open_position(trade, config, user['id'])
-                                send_telegram_message(f"🔁 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Reentry {signal}\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty} . Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
+                                send_telegram_message_async(f"🔁 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Reentry {signal}\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty} . Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
                                 position = signal
                     
                     
-                    random_number = random.randint(7, 15)
-                    time.sleep(random_number)
+                    position_watch = wait_for_next_check(position_watch, trade, config, user, next_candle_time)
 
             elif config['HEDGE_TYPE'] == "NH":
                 
@@ -554,7 +595,7 @@ def live_trading(instruments_df, config, key, user):
                         logging.info(f"📥INTERVAL {config['INTERVAL']} | Exiting SELL: Buying back {trade['OptionSymbol']} | Qty: {trade['qty']}")
                         record_trade(trade, config, user['id'])
                         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                        send_telegram_message(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit SELL\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}.  profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"📤INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit SELL\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}.  profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
 
                     if config['NEW_TRADE'].lower() == "no":
                         print(f"🚫 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping BUY signal.")
@@ -598,7 +639,7 @@ def live_trading(instruments_df, config, key, user):
                         }
                         save_open_position(trade, config, user['id'])
                         position = "BUY"
-                        send_telegram_message(f"🟢INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Buy Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"🟢INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Buy Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}. Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
 
                 # ✅ SELL SIGNAL
                 elif latest['sellSignal'] and position != "SELL":
@@ -634,7 +675,7 @@ def live_trading(instruments_df, config, key, user):
                         })
                         record_trade(trade, config, user['id'])
                         delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                        send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit BUY\n{trade['OptionSymbol']} @ ₹{trade['OptionBuyPrice']:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
 
                     if config['NEW_TRADE'].lower() == "no":
                         print(f"🚫INTERVAL {config['INTERVAL']} | {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} No new trades allowed. Skipping SELL signal.")
@@ -677,13 +718,15 @@ def live_trading(instruments_df, config, key, user):
                         }
                         save_open_position(trade, config, user['id'])
                         position = "SELL"
-                        send_telegram_message(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Sell Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}.",user['telegram_chat_id'], user['telegram_token'])
+                        send_telegram_message_async(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Sell Signal\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty}.",user['telegram_chat_id'], user['telegram_token'])
 
 
-                next_candle_time = get_next_candle_time(config['INTERVAL'])
+                next_candle_time = get_next_check_time(config['INTERVAL'], user)
                 # ✅ Add this flag before the while loop
                 target_hit = False
                 while datetime.datetime.now() < next_candle_time:
+                    if stop_event.is_set() and not trade:
+                        break   # config removed while flat: stop now instead of at the next candle
                     # Actively monitor current position LTP
                     if trade and "OptionSymbol" in trade:
                         current_ltp = get_quotes(trade["OptionSymbol"] ,user)
@@ -708,7 +751,7 @@ def live_trading(instruments_df, config, key, user):
                         current_ltp = get_quotes(trade["OptionSymbol"] ,user)
                         entry_ltp = trade["OptionSellPrice"]
                         
-                        if current_ltp != None and entry_ltp != None and entry_ltp != 0.0 and current_ltp <= 0.6 * entry_ltp:
+                        if current_ltp != None and entry_ltp != None and entry_ltp != 0.0 and current_ltp <= TARGET_EXIT_RATIO * entry_ltp:
                             
                             target_hit = True  # Set the flag to True to avoid multiple triggers
                             trade["SpotExit"] = close
@@ -738,7 +781,7 @@ def live_trading(instruments_df, config, key, user):
                             })
                             record_trade(trade, config, user['id'])
                             delete_open_position(trade["OptionSymbol"], config, trade, user['id'])
-                            send_telegram_message(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit {trade['Signal']}\n{trade['OptionSymbol']} @ ₹{current_ltp:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
+                            send_telegram_message_async(f"📤 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Exit {trade['Signal']}\n{trade['OptionSymbol']} @ ₹{current_ltp:.2f}. | profit per quantity :{trade['total_pnl']}",user['telegram_chat_id'], user['telegram_token'])
                             logging.info(f"🔴 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Target triggered for {trade['OptionSymbol']} at ₹{current_ltp:.2f}")
 
                             last_expiry = trade["Expiry"]
@@ -802,12 +845,11 @@ def live_trading(instruments_df, config, key, user):
 
                                 }
                                 save_open_position(trade, config, user['id'])
-                                send_telegram_message(f"🔁 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Reentry {signal}\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty} . Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
+                                send_telegram_message_async(f"🔁 {user['user']} {SERVER}  |  {key}  |  {config['INTERVAL']} Reentry {signal}\n{opt_symbol} | Avg ₹{avg_price:.2f} | Qty: {qty} . Hedge Symbol {trade['hedge_option_symbol']} | @ ₹{trade['hedge_option_buy_price']:.2f}",user['telegram_chat_id'], user['telegram_token'])
                                 position = signal
                     
                     
-                    random_number = random.randint(7, 15)
-                    time.sleep(random_number)
+                    position_watch = wait_for_next_check(position_watch, trade, config, user, next_candle_time)
 
                 
         except ReadTimeout as re:
@@ -830,22 +872,22 @@ def live_trading(instruments_df, config, key, user):
 
 # ====== Run ======
 def init_and_run(user):
+    # Outlives restarts below, so a restart never starts a second thread for a running KEY
+    supervisor = StrategySupervisor(user, config_store.get)   # raises on DB errors instead of returning {}
     while True:
         try:
             who_tried(user)
+            if USE_TICKER_STREAM:
+                get_ticker_stream(user).start()
+            if RECORD_OPTION_CHAIN:
+                chain_recorder.start(user)
             
             instruments_df = pd.read_csv(INSTRUMENTS_FILE)
-            threads = []
-            configs = get_trade_configs(user['id'])
-            keys = configs.keys()
-            for key in keys:
-                config = configs[key]
-                init_db()
-                t = threading.Thread(target=live_trading, args=(instruments_df, config, key, user))
-                t.start()
-                threads.append(t)
-            for t in threads:
-                t.join()
+            init_db()
+            # One thread per config KEY; KEYs added or removed in trade_config are picked up while running
+            supervisor.supervise(
+                lambda config, key, stop_event: live_trading(instruments_df, config, key, user, stop_event),
+                keep_running=lambda: is_market_open() or will_market_open_within_minutes(60))
             break
         except Exception as e:
             logging.error(f"Fatal error: {e}")
@@ -0,0 +1,266 @@
+import os
+import json
+import fcntl
+import time
+import queue
+import atexit
+import threading
+import logging
+from config import LOG_FILE, TRADE_JOURNAL_FILE, JOURNAL_BATCH_MAX, JOURNAL_MAX_BYTES, JOURNAL_FLUSH_TIMEOUT
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+APPLY_RETRIES = 3   # attempts per event before it is set aside in <journal>.failed
+
+
+def _json_default(value):
+    # numpy scalars (spot closes, prices) and anything else without a JSON form
+    item = getattr(value, "item", None)
+    return item() if callable(item) else str(value)
+
+
+class TradeJournal:
+    """
+    Write-behind journal for trade persistence (record_trade,
+    save_open_position, delete_open_position). submit() only queues the
+    event, so the order path never waits on SQLite. A single writer thread
+    appends each batch to an append-only JSON-lines file, fsyncs it once,
+    then applies the batch to the DB in one transaction together with the
+    journal_state checkpoint, so every event is applied exactly once.
+
+    On start the events after the checkpoint are replayed (a crash between
+    the fsync and the commit loses nothing); once everything is applied and
+    the file passes JOURNAL_MAX_BYTES it is truncated. flush() is the
+    barrier for read-your-writes and shutdown.
+
+    One process owns the file: start() takes an exclusive lock on
+    <journal>.lock. Another process (manual_entry.py, manualOrder.py) that
+    finds it held does not replay or touch the journal; its submit() runs
+    the handler straight against the DB instead.
+    """
+
+    def __init__(self, db, handlers, path=TRADE_JOURNAL_FILE, batch_max=JOURNAL_BATCH_MAX,
+                 max_bytes=JOURNAL_MAX_BYTES):
+        self.db = db
+        self.handlers = handlers   # op name -> callable(*args) running the DB statement(s)
+        self.path = path
+        self.batch_max = batch_max
+        self.max_bytes = max_bytes
+
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0    # last seq handed out
+        self._applied = 0      # last seq committed to the DB (or set aside)
+        self._file = None
+        self._lock_file = None
+        self.owner = None          # None until start(); False = another process owns the journal
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"events": 0, "batches": 0, "fsyncs": 0, "replayed": 0, "failed": 0}
+
+    # ---------- checkpoint ----------
+    def _checkpoint(self):
+        row = self.db.fetchone("journal_state", "SELECT applied_seq FROM journal_state WHERE id = 1")
+        return row[0] if row else 0
+
+    def _save_checkpoint(self, seq):
+        self.db.execute("journal_state.save",
+                        "INSERT INTO journal_state (id, applied_seq) VALUES (1, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET applied_seq = excluded.applied_seq", (seq,))
+
+    def _apply(self, events):
+        """Apply events and advance the checkpoint in one transaction."""
+        with self.db.transaction():
+            for event in events:
+                self.handlers[event["op"]](*event["args"])
+            self._save_checkpoint(events[-1]["seq"])
+
+    def _apply_batch(self, events):
+        try:
+            self._apply(events)
+            return
+        except Exception as e:
+            logging.error(f"❌ Trade journal batch of {len(events)} failed, retrying one by one: {e}")
+        for event in events:
+            for attempt in range(APPLY_RETRIES):
+                try:
+                    self._apply([event])
+                    break
+                except Exception as e:
+                    if attempt < APPLY_RETRIES - 1:
+                        time.sleep(1)
+                        continue
+                    # Keep the event for manual repair, move the checkpoint past it
+                    self.stats["failed"] += 1
+                    logging.error(f"❌ Trade journal could not apply {event['op']} seq {event['seq']}: {e}")
+                    self._set_aside(event)
+
+    def _set_aside(self, event):
+        """Copy a failed event to <journal>.failed and move the checkpoint past it."""
+        try:
+            with open(self.path + ".failed", "a") as f:
+                f.write(json.dumps(event, default=_json_default) + "\n")
+        except Exception as e:
+            logging.error(f"❌ Trade journal could not write {self.path}.failed for seq {event['seq']}: {e}")
+        try:
+            self._save_checkpoint(event["seq"])
+        except Exception as e:
+            # The event is replayed (and retried) on the next start
+            logging.error(f"❌ Trade journal could not checkpoint seq {event['seq']}: {e}")
+
+    # ---------- startup ----------
+    def _acquire(self):
+        """Take the journal's exclusive lock; False if another process holds it."""
+        lock_file = open(self.path + ".lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            logging.info(f"ℹ️ Trade journal {self.path} is owned by pid {lock_file.read().strip() or '?'}; "
+                         f"writing trades straight to the DB")
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file   # held for the life of the process
+        return True
+
+    def _replay(self):
+        applied = self._checkpoint()
+        pending, last = [], applied
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # torn tail of a write that never completed its fsync
+                        logging.warning(f"⚠️ Trade journal skipped an unreadable line in {self.path}")
+                        continue
+                    last = max(last, event["seq"])
+                    if event["seq"] > applied:
+                        pending.append(event)
+        except FileNotFoundError:
+            pass
+        for i in range(0, len(pending), self.batch_max):
+            self._apply_batch(pending[i:i + self.batch_max])
+        if pending:
+            self.stats["replayed"] += len(pending)
+            logging.info(f"ℹ️ Trade journal replayed {len(pending)} events from {self.path}")
+        self._submitted = self._applied = last
+        self._file = open(self.path, "a")
+        self._truncate_if_applied(last)
+
+    def _truncate_if_applied(self, seq):
+        """Empty the journal only if the DB checkpoint covers it (a failed set-aside keeps it for replay)."""
+        try:
+            checkpoint = self._checkpoint()
+        except Exception as e:
+            logging.error(f"❌ Trade journal could not read its checkpoint, keeping {self.path}: {e}")
+            return
+        if checkpoint >= seq:
+            self._file.truncate(0)
+        else:
+            logging.warning(f"⚠️ Trade journal checkpoint {checkpoint} is behind seq {seq}, keeping {self.path} for replay")
+
+    def start(self):
+        if self.owner is False or (self._thread and self._thread.is_alive()):
+            return
+        with self._cond:
+            if self.owner is False or (self._thread and self._thread.is_alive()):
+                return
+            if self.owner is None:
+                self.owner = self._acquire()
+                if not self.owner:
+                    return
+                self._replay()
+                atexit.register(self.close)
+            else:
+                # Writer died: keep the counters and the queued events, just run it again
+                logging.error("❌ Trade journal writer was not running, restarting it")
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="TradeJournal", daemon=True)
+            self._thread.start()
+        logging.info(f"ℹ️ Trade journal started | {self.path} | replayed {self.stats['replayed']} events")
+
+    # ---------- producers ----------
+    def submit(self, op, *args):
+        """
+        Queue one event; returns its sequence number without touching disk or
+        DB. The arguments are serialized here, so callers may keep mutating
+        the trade dict. Without journal ownership the handler runs now and
+        None is returned.
+        """
+        self.start()
+        if not self.owner:
+            self.handlers[op](*args)
+            return None
+        with self._cond:
+            self._submitted += 1
+            seq = self._submitted
+            self._queue.put(json.dumps({"seq": seq, "op": op, "args": args}, default=_json_default))
+        self.stats["events"] += 1
+        return seq
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is in the DB. False on timeout."""
+        if self.owner and not self._stop.is_set() and not (self._thread and self._thread.is_alive()):
+            self.start()
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._applied >= target, timeout)
+
+    def close(self, timeout=JOURNAL_FLUSH_TIMEOUT):
+        if not self.flush(timeout):
+            logging.error(f"❌ Trade journal closed with unapplied events; they replay from {self.path} on restart")
+        self._stop.set()
+
+    # ---------- writer ----------
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                self._write_batch()
+            except Exception as e:
+                logging.error(f"❌ Trade journal writer error: {e}", exc_info=True)
+                time.sleep(1)
+
+    def _write_batch(self):
+        batch = self._take_batch()
+        if not batch:
+            return
+        try:
+            self._file.write("".join(line + "\n" for line in batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.stats["fsyncs"] += 1
+        except Exception as e:
+            logging.error(f"❌ Trade journal write failed, applying without a durable copy: {e}")
+        events = [json.loads(line) for line in batch]
+        try:
+            self._apply_batch(events)
+            self.stats["batches"] += 1
+        finally:
+            # Even if applying blew up, release flush() waiters; the file still has the events
+            with self._cond:
+                self._applied = events[-1]["seq"]
+                self._cond.notify_all()
+                idle = self._applied == self._submitted
+        if idle and os.fstat(self._file.fileno()).st_size > self.max_bytes:
+            self._truncate_if_applied(events[-1]["seq"])
@@ -1,7 +1,7 @@
 import logging
-import sqlite3
 import datetime
-from config import DB_FILE, LOG_FILE
+from config import LOG_FILE
+from dbmanager import db
 
 logging.basicConfig(
     filename=LOG_FILE,
@@ -41,8 +41,6 @@ def save_user_detail(user_detail):
     user_detail: dict with keys matching table columns.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
         sql = """
             INSERT INTO user_dtls (
                 user, kite_username, kite_password, kite_api_secret, kite_api_key,
@@ -61,9 +59,7 @@ def save_user_detail(user_detail):
             user_detail.get("active_flag", 1),
             user_detail.get("crt_dt", datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         )
-        c.execute(sql, params)
-        conn.commit()
-        conn.close()
+        db.execute("save_user_detail", sql, params)
         logging.info(f"✅ User detail saved for user: {user_detail.get('user')}")
     except Exception as e:
         print(f"❌ Error saving user detail: {e}")
@@ -77,15 +73,9 @@ def get_all_active_user():
     Each dict contains all columns including 'id'.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
         sql = "SELECT * FROM user_dtls WHERE active_flag = 1"
-        c.execute(sql)
-        rows = c.fetchall()
-        columns = [desc[0] for desc in c.description]
-        users = [dict(zip(columns, row)) for row in rows]
-        conn.close()
-        return users
+        rows, columns = db.fetchall("get_all_active_user", sql)
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         print(f"❌ Error fetching active users: {e}")
         logging.error(f"❌ Error fetching active users: {e}")